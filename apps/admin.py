@@ -1,6 +1,12 @@
+import tempfile
+
 from django.contrib import admin
 from django.db import models
+from django.http import FileResponse
+from django.utils import timezone
 from .models import *
+from .forms import UPLOAD_FIELD_OVERRIDES
+from .invoices import BATCH_SIZE, write_invoice_zip
 
 
 # ✅ Custom filter for is_low_stock
@@ -16,14 +22,28 @@ class LowStockFilter(admin.SimpleListFilter):
 
     def queryset(self, request, queryset):
         if self.value() == 'yes':
-            return queryset.filter(quantity__lte=models.F('reorder_level'))
+            return queryset.filter(is_low_stock=True)
         if self.value() == 'no':
-            return queryset.filter(quantity__gt=models.F('reorder_level'))
+            return queryset.filter(is_low_stock=False)
         return queryset
 
 
+class StockLevelInline(admin.TabularInline):
+    # Levels change through the stock service, so they are shown read-only
+    model = StockLevel
+    fields = ('location', 'quantity', 'updated_at')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
+    # Uploads over MAX_UPLOAD_SIZE are rejected by the form
+    formfield_overrides = UPLOAD_FIELD_OVERRIDES
     list_display = (
         'name',
         'sku',
@@ -39,12 +59,16 @@ class ProductAdmin(admin.ModelAdmin):
         'created_at',
     )
 
-    search_fields = ('name', 'sku', 'description')
+    search_fields = ('name', 'sku', 'barcode', 'description')
     readonly_fields = ('created_at', 'updated_at')
+    list_select_related = ('category',)
+    inlines = [StockLevelInline]
+    autocomplete_fields = ('category', 'created_by')
+    show_full_result_count = False
 
     fieldsets = (
         ('Product Information', {
-            'fields': ('name', 'sku', 'description', 'category', 'unit', 'image')
+            'fields': ('name', 'sku', 'barcode', 'description', 'category', 'unit', 'image')
         }),
         ('Pricing & Stock', {
             'fields': ('price', 'cost_price', 'quantity', 'reorder_level')
@@ -55,6 +79,32 @@ class ProductAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_readonly_fields(self, request, obj=None):
+        # The total follows the per-location levels once the product exists
+        if obj is not None:
+            return self.readonly_fields + ('quantity',)
+        return self.readonly_fields
+
+
+@admin.register(Location)
+class LocationAdmin(admin.ModelAdmin):
+    list_display = ('name', 'code', 'is_default', 'is_active', 'created_at')
+    list_filter = ('is_active',)
+    search_fields = ('name', 'code')
+
+
+@admin.register(StockLevel)
+class StockLevelAdmin(admin.ModelAdmin):
+    list_display = ('product', 'location', 'quantity', 'updated_at')
+    list_filter = ('location',)
+    search_fields = ('product__name', 'product__sku')
+    list_select_related = ('product', 'location')
+    readonly_fields = ('product', 'location', 'quantity', 'updated_at')
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -70,30 +120,176 @@ class SupplierAdmin(admin.ModelAdmin):
 
 @admin.register(StockTransaction)
 class StockTransactionAdmin(admin.ModelAdmin):
-    list_display = ('product', 'transaction_type', 'quantity', 'created_by', 'created_at')
-    list_filter = ('transaction_type', 'created_at')
+    list_display = ('product', 'location', 'transaction_type', 'quantity', 'created_by', 'created_at')
+    list_filter = ('transaction_type', 'location', 'created_at')
     search_fields = ('product__name', 'reference')
     readonly_fields = ('created_at',)
+    list_select_related = ('product', 'location', 'created_by')
+    autocomplete_fields = ('product', 'created_by')
+    show_full_result_count = False
+
+
+@admin.action(description='Download invoice PDFs of the selected sales (zip)')
+def download_invoices(modeladmin, request, queryset):
+    # Filter by date, select all, then run this: the PDFs not cached yet are
+    # rendered across a process pool
+    fileobj = tempfile.TemporaryFile()
+    write_invoice_zip(queryset.select_related('location', 'created_by').order_by('created_at', 'id')
+                      .iterator(chunk_size=BATCH_SIZE), fileobj)
+    fileobj.seek(0)
+    return FileResponse(fileobj, as_attachment=True, filename='invoices.zip', content_type='application/zip')
 
 
 @admin.register(Sale)
 class SaleAdmin(admin.ModelAdmin):
-    list_display = ('invoice_number', 'customer_name', 'total_amount', 'payment_method', 'created_at')
-    list_filter = ('payment_method', 'created_at')
+    list_display = ('invoice_number', 'customer_name', 'total_amount', 'payment_method', 'location', 'created_at')
+    list_filter = ('payment_method', 'location', 'created_at')
+    list_select_related = ('location',)
     search_fields = ('invoice_number', 'customer_name', 'customer_phone')
     readonly_fields = ('created_at',)
+    autocomplete_fields = ('created_by',)
+    show_full_result_count = False
+    actions = [download_invoices]
+
+
+class ArchiveAdmin(admin.ModelAdmin):
+    # Archived rows are moved by archive_records and never edited
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchiveRun)
+class ArchiveRunAdmin(ArchiveAdmin):
+    list_display = ('cutoff', 'sales', 'movements', 'started_at', 'completed_at')
+
+
+@admin.register(ArchivedSale)
+class ArchivedSaleAdmin(ArchiveAdmin):
+    list_display = ('invoice_number', 'customer_name', 'total_amount', 'payment_method', 'location', 'created_at')
+    list_filter = ('payment_method', 'location', 'created_at')
+    list_select_related = ('location',)
+    search_fields = ('invoice_number', 'customer_name', 'customer_phone')
+    actions = [download_invoices]
+
+
+@admin.register(ArchivedStockTransaction)
+class ArchivedStockTransactionAdmin(ArchiveAdmin):
+    list_display = ('product', 'location', 'transaction_type', 'quantity', 'created_by', 'created_at')
+    list_filter = ('transaction_type', 'location')
+    search_fields = ('product__name', 'reference')
+    list_select_related = ('product', 'location', 'created_by')
+
+
+@admin.register(ArchivedTotal)
+class ArchivedTotalAdmin(ArchiveAdmin):
+    list_display = ('location', 'kind', 'row_count', 'quantity', 'amount')
+    list_filter = ('kind', 'location')
+    list_select_related = ('location',)
+
+
+@admin.action(description='Run the selected tasks again')
+def retry_tasks(modeladmin, request, queryset):
+    retried = queryset.exclude(status='running').update(status='pending', attempts=0, run_after=timezone.now())
+    modeladmin.message_user(request, f'{retried} tasks queued again.')
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    # Queued by the app and run by run_tasks; failed ones can be retried
+    list_display = ('name', 'status', 'attempts', 'run_after', 'created_at', 'finished_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('name', 'kwargs', 'status', 'attempts', 'max_attempts', 'run_after', 'started_at',
+                       'finished_at', 'last_error', 'created_at')
+    actions = [retry_tasks]
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('product', 'date', 'quantity', 'cost_price')
+    list_filter = ('date',)
+    search_fields = ('product__name', 'product__sku')
+    list_select_related = ('product',)
+    autocomplete_fields = ('product',)
+    show_full_result_count = False
+    date_hierarchy = 'date'
+
+
+@admin.register(LowStockAlert)
+class LowStockAlertAdmin(admin.ModelAdmin):
+    list_display = ('product', 'is_low', 'quantity', 'reorder_level', 'created_at')
+    list_filter = ('is_low', 'created_at')
+    search_fields = ('product__name', 'product__sku')
+    list_select_related = ('product',)
+    autocomplete_fields = ('product',)
+    show_full_result_count = False
+
+
+@admin.register(ProductClassification)
+class ProductClassificationAdmin(admin.ModelAdmin):
+    list_display = ('product', 'abc_class', 'rank', 'revenue', 'revenue_share', 'cumulative_share', 'period_end')
+    list_filter = ('abc_class',)
+    search_fields = ('product__name', 'product__sku')
+    list_select_related = ('product',)
+    autocomplete_fields = ('product',)
+    show_full_result_count = False
+
+
+@admin.register(StockTake)
+class StockTakeAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'location', 'status', 'created_by', 'created_at', 'applied_at')
+    list_filter = ('status', 'location', 'created_at')
+    search_fields = ('reference', 'notes')
+    list_select_related = ('location', 'created_by')
+    # Applying goes through the stock service; the admin only records notes
+    readonly_fields = ('status', 'created_by', 'applied_by', 'applied_at')
+
+    def get_readonly_fields(self, request, obj=None):
+        # The lines were counted against this location's levels
+        if obj is not None:
+            return self.readonly_fields + ('location',)
+        return self.readonly_fields
+
+
+@admin.register(StockTakeLine)
+class StockTakeLineAdmin(admin.ModelAdmin):
+    list_display = ('product', 'stock_take', 'expected_quantity', 'counted_quantity', 'variance', 'cost_price')
+    list_filter = ('stock_take',)
+    search_fields = ('product__name', 'product__sku')
+    list_select_related = ('product', 'stock_take')
+    autocomplete_fields = ('product',)
+    show_full_result_count = False
 
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
-    list_display = ('user', 'phone', 'role')
+    # Uploads over MAX_UPLOAD_SIZE are rejected by the form
+    formfield_overrides = UPLOAD_FIELD_OVERRIDES
+    list_display = ('user', 'phone', 'role', 'location')
+    list_filter = ('location',)
     search_fields = ('user__username', 'phone')
+    list_select_related = ('user', 'location')
+    autocomplete_fields = ('user',)
+    # Maintained by the writes; reconcile_activity recomputes them
+    readonly_fields = ('sales_count', 'products_count', 'transactions_count')
 
 
 
 
 from django.contrib import admin
-from .models import ExpenseCategory, Expense, ProfitLossReport
+from django.db.models import Count
+from .models import ExpenseCategory, Expense, ExpenseMonthlySummary, ProfitLossReport
 from django.utils.html import format_html
 
 @admin.register(ExpenseCategory)
@@ -103,12 +299,18 @@ class ExpenseCategoryAdmin(admin.ModelAdmin):
     search_fields = ['name', 'description']
     ordering = ['name']
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(num_expenses=Count('expense'))
+    
     def expense_count(self, obj):
-        return obj.expense_set.count()
+        return obj.num_expenses
     expense_count.short_description = 'No. of Expenses'
+    expense_count.admin_order_field = 'num_expenses'
 
 @admin.register(Expense)
 class ExpenseAdmin(admin.ModelAdmin):
+    # Uploads over MAX_UPLOAD_SIZE are rejected by the form
+    formfield_overrides = UPLOAD_FIELD_OVERRIDES
     list_display = [
         'date', 
         'category_display', 
@@ -133,6 +335,9 @@ class ExpenseAdmin(admin.ModelAdmin):
     list_per_page = 25
     date_hierarchy = 'date'
     readonly_fields = ['created_at', 'updated_at']
+    list_select_related = ['category', 'created_by']
+    autocomplete_fields = ['category', 'created_by']
+    show_full_result_count = False
     fieldsets = (
         ('Basic Information', {
             'fields': ('category', 'expense_type', 'description', 'amount', 'date')
@@ -211,6 +416,23 @@ class ExpenseAdmin(admin.ModelAdmin):
             obj.created_by = request.user
         super().save_model(request, obj, form, change)
 
+@admin.register(ExpenseMonthlySummary)
+class ExpenseMonthlySummaryAdmin(admin.ModelAdmin):
+    # Kept by Expense saves and deletes; rebuild_expense_summary recomputes it
+    list_display = ['month', 'category', 'expense_type', 'payment_method', 'total', 'count']
+    list_filter = ['expense_type', 'payment_method', 'category']
+    list_select_related = ['category']
+    date_hierarchy = 'month'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 @admin.register(ProfitLossReport)
 class ProfitLossReportAdmin(admin.ModelAdmin):
     list_display = [
@@ -231,6 +453,8 @@ class ProfitLossReportAdmin(admin.ModelAdmin):
     ]
     list_per_page = 20
     date_hierarchy = 'start_date'
+    list_select_related = ['generated_by']
+    show_full_result_count = False
     
     def period_display(self, obj):
         colors = {
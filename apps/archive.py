@@ -0,0 +1,176 @@
+"""
+Archive tables for closed periods of sales and stock movements.
+
+``archive_records`` moves Sale and StockTransaction rows created before a
+cutoff into ArchivedSale and ArchivedStockTransaction, keeping their ids, and
+adds them to the per-location ArchivedTotal rows. The cutoff is recorded
+before any row moves and each chunk moves in one transaction, so at any
+moment every row is in exactly one of the two tables and a reader that adds
+the archive for ranges starting before the cutoff sees each row once.
+
+Day-to-day pages read only the hot tables. Reports ask ``sale_sources`` /
+``ledger_sources`` for the querysets covering their range and get the archive
+as well only when the range starts before the cutoff.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import F, Max, Sum
+from django.utils import timezone
+
+from .models import ArchivedSale, ArchivedStockTransaction, ArchivedTotal, ArchiveRun, Sale, StockTransaction
+
+SALE_FIELDS = ['id', 'invoice_number', 'customer_name', 'customer_phone', 'items', 'total_amount',
+               'payment_method', 'payment_status', 'idempotency_key', 'location_id', 'created_by_id', 'created_at']
+LEDGER_FIELDS = ['id', 'product_id', 'location_id', 'transaction_type', 'quantity', 'reference', 'notes',
+                 'created_by_id', 'created_at']
+CHUNK_SIZE = 1000
+
+
+def archive_cutoff():
+    """Rows created before this instant may be in the archive; None if nothing was archived."""
+    return ArchiveRun.objects.aggregate(cutoff=Max('cutoff'))['cutoff']
+
+
+def needs_archive(start=None):
+    """Whether rows created at or after ``start`` (None: all time) may include archived ones."""
+    cutoff = archive_cutoff()
+    return cutoff is not None and (start is None or start < cutoff)
+
+
+def sale_sources(start=None):
+    """The sale querysets a report over rows from ``start`` on has to read, newest first."""
+    if needs_archive(start):
+        return [Sale.objects.all(), ArchivedSale.objects.all()]
+    return [Sale.objects.all()]
+
+
+def ledger_sources(start=None):
+    """The stock ledger querysets a report over rows from ``start`` on has to read, newest first."""
+    if needs_archive(start):
+        return [StockTransaction.objects.all(), ArchivedStockTransaction.objects.all()]
+    return [StockTransaction.objects.all()]
+
+
+def combined_aggregate(querysets, **aggregates):
+    """Add up the same Sum/Count aggregates over several querysets."""
+    totals = dict.fromkeys(aggregates, 0)
+    for queryset in querysets:
+        for name, value in queryset.aggregate(**aggregates).items():
+            totals[name] += value or 0
+    return totals
+
+
+def archived_totals(kind, location=None):
+    """All-time archived row count, quantity and amount of one kind ('sale' or a ledger type)."""
+    totals = ArchivedTotal.objects.filter(kind=kind)
+    if location is not None:
+        totals = totals.filter(location=location)
+    totals = totals.aggregate(rows=Sum('row_count'), quantity=Sum('quantity'), amount=Sum('amount'))
+    return {name: value or 0 for name, value in totals.items()}
+
+
+class ChainedRows:
+    """
+    Hot rows followed by archived ones as one sliceable sequence, for Paginator.
+
+    Everything archived is older than everything hot, so two newest-first
+    querysets chained keep the combined order.
+    """
+
+    def __init__(self, *querysets):
+        self.querysets = querysets
+        self._counts = None
+
+    def counts(self):
+        if self._counts is None:
+            self._counts = [queryset.count() for queryset in self.querysets]
+        return self._counts
+
+    def count(self):
+        return sum(self.counts())
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError('ChainedRows only supports slicing')
+        start, stop = index.start or 0, index.stop
+        rows = []
+        offset = 0
+        for queryset, count in zip(self.querysets, self.counts()):
+            if stop is not None and offset >= stop:
+                break
+            low = max(start - offset, 0)
+            high = count if stop is None else min(stop - offset, count)
+            if low < high:
+                rows.extend(queryset[low:high])
+            offset += count
+        return rows
+
+
+def _delete_ids(model, ids):
+    # Raw DELETE: QuerySet.delete() would load every row to send post_delete,
+    # bumping the fragment cache version once per archived row
+    table = connection.ops.quote_name(model._meta.db_table)
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE id IN ({placeholders})', ids)
+
+
+def _add_totals(totals):
+    for (location_id, kind), (rows, quantity, amount) in totals.items():
+        total, created = ArchivedTotal.objects.get_or_create(location_id=location_id, kind=kind)
+        ArchivedTotal.objects.filter(pk=total.pk).update(
+            row_count=F('row_count') + rows, quantity=F('quantity') + quantity, amount=F('amount') + amount)
+
+
+def _move_chunk(model, archive_model, fields, cutoff, chunk_size, total_key):
+    with transaction.atomic():
+        rows = list(model.objects.select_for_update().filter(created_at__lt=cutoff)
+                    .order_by('id').values(*fields)[:chunk_size])
+        if not rows:
+            return 0
+        archive_model.objects.bulk_create([archive_model(**row) for row in rows])
+        _delete_ids(model, [row['id'] for row in rows])
+        totals = defaultdict(lambda: [0, 0, Decimal('0')])
+        for row in rows:
+            key, quantity, amount = total_key(row)
+            totals[key][0] += 1
+            totals[key][1] += quantity
+            totals[key][2] += amount
+        _add_totals(totals)
+    return len(rows)
+
+
+def archive_before(cutoff, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Move every sale and ledger row created before ``cutoff`` into the archive.
+
+    Safe to interrupt and run again with the same cutoff. Returns the run.
+    """
+    current = archive_cutoff()
+    if current is not None and cutoff < current:
+        raise ValueError(f'Rows before {timezone.localtime(current):%Y-%m-%d %H:%M} are already archived; the cutoff cannot move back')
+    # Readers start including the archive for this range before rows move
+    run, created = ArchiveRun.objects.get_or_create(cutoff=cutoff)
+
+    for label, model, archive_model, fields, total_key in (
+        ('sales', Sale, ArchivedSale, SALE_FIELDS,
+         lambda row: ((row['location_id'], 'sale'), sum(item['quantity'] for item in row['items']), row['total_amount'])),
+        ('movements', StockTransaction, ArchivedStockTransaction, LEDGER_FIELDS,
+         lambda row: ((row['location_id'], row['transaction_type']), row['quantity'], Decimal('0'))),
+    ):
+        while True:
+            moved = _move_chunk(model, archive_model, fields, cutoff, chunk_size, total_key)
+            if not moved:
+                break
+            ArchiveRun.objects.filter(pk=run.pk).update(**{label: F(label) + moved})
+            if progress is not None:
+                progress(label, moved)
+
+    ArchiveRun.objects.filter(pk=run.pk).update(completed_at=timezone.now())
+    run.refresh_from_db()
+    return run
@@ -0,0 +1,171 @@
+"""
+Async versions of the read-heavy JSON endpoints.
+
+Served under ASGI (see inv/asgi.py), a POS or dashboard client waiting on one
+of these holds a coroutine instead of a worker thread. The async ORM still
+hands each query to a thread for the duration of that query, so the saving
+is the thread that a sync view pins for the whole request.
+"""
+from datetime import datetime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from . import live, views
+from .conditional import conditional_record
+from .models import LowStockAlert, Product, Sale, UserProfile
+from .valuation import end_of_day, inventory_value_at, stock_levels_at
+from .views import alert_feed_params, product_updated_at
+
+
+@login_required
+@conditional_record(product_updated_at)
+async def product_info(request, product_id):
+    try:
+        product = await Product.objects.aget(pk=product_id)
+    except Product.DoesNotExist:
+        return JsonResponse({'error': 'Product not found'}, status=404)
+    return JsonResponse({
+        'id': product.id,
+        'name': product.name,
+        'price': float(product.price),
+        'stock': product.quantity,
+        'unit': product.unit,
+        'locations': [
+            {'id': pk, 'name': name, 'stock': quantity}
+            async for pk, name, quantity in product.stock_levels.order_by('location__name')
+            .values_list('location_id', 'location__name', 'quantity')
+        ],
+    })
+
+
+@login_required
+async def product_search(request):
+    page, rows = views.search_products(request)
+    return views.product_search_response(page, [row async for row in rows])
+
+
+@login_required
+async def low_stock_alerts(request):
+    try:
+        since, limit = alert_feed_params(request)
+    except ValueError:
+        return JsonResponse({'error': 'since and limit must be integers'}, status=400)
+
+    alerts = [
+        alert async for alert in LowStockAlert.objects.filter(id__gt=since)
+        .select_related('product')
+        .order_by('id')[:limit]
+    ]
+    return JsonResponse({
+        'alerts': [{
+            'id': alert.id,
+            'product_id': alert.product_id,
+            'product_name': alert.product.name,
+            'sku': alert.product.sku,
+            'is_low': alert.is_low,
+            'quantity': alert.quantity,
+            'reorder_level': alert.reorder_level,
+            'created_at': alert.created_at.isoformat(),
+        } for alert in alerts],
+        'next': alerts[-1].id if alerts else since,
+        'low_stock_count': await Product.objects.filter(is_low_stock=True).acount(),
+    })
+
+
+@login_required
+async def stock_valuation(request):
+    date_str = request.GET.get('date')
+    try:
+        day = datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else timezone.localdate()
+    except ValueError:
+        return JsonResponse({'error': 'date must be YYYY-MM-DD'}, status=400)
+
+    # The snapshot replay is several dependent queries plus Python work, so it
+    # runs as one unit in a worker thread
+    product_id = request.GET.get('product')
+    if product_id:
+        try:
+            product_id = int(product_id)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid product id'}, status=400)
+        levels = await sync_to_async(stock_levels_at)(day, product_ids=[product_id])
+        if product_id not in levels:
+            return JsonResponse({'error': 'Product not found at this date'}, status=404)
+        quantity, cost_price = levels[product_id]
+        return JsonResponse({
+            'date': day.strftime('%Y-%m-%d'),
+            'product_id': product_id,
+            'quantity': quantity,
+            'cost_price': float(cost_price),
+            'value': float(quantity * cost_price),
+        })
+
+    valuation = await sync_to_async(inventory_value_at)(day)
+    return JsonResponse({
+        'date': day.strftime('%Y-%m-%d'),
+        'total_quantity': valuation['total_quantity'],
+        'total_value': float(valuation['total_value']),
+        'by_category': {name: float(value) for name, value in valuation['by_category'].items()},
+    })
+
+
+@login_required
+async def dashboard_stats(request):
+    # The numbers behind the dashboard cards and sales chart, for clients that
+    # refresh them without reloading the page
+    user = await request.auser()
+    today = timezone.localdate()
+    week_start = today - timedelta(days=6)
+
+    daily = {
+        row['day']: row['total']
+        async for row in Sale.objects.filter(created_at__gte=end_of_day(week_start - timedelta(days=1)))
+        .annotate(day=TruncDate('created_at'))
+        .values('day')
+        .annotate(total=Sum('total_amount'))
+        .order_by()
+    }
+    days = [week_start + timedelta(days=offset) for offset in range(7)]
+    activity = await UserProfile.objects.filter(user=user).values('sales_count', 'transactions_count').afirst() or {}
+
+    return JsonResponse({
+        'total_products': await Product.objects.acount(),
+        'low_stock_products': await Product.objects.filter(is_low_stock=True).acount(),
+        'today_sales': float(daily.get(today) or 0),
+        'sales_chart': {
+            'labels': [day.strftime('%a') for day in days],
+            'data': [float(daily.get(day) or 0) for day in days],
+        },
+        'low_stock_items': [
+            {'id': pk, 'name': name, 'sku': sku, 'quantity': quantity, 'reorder_level': reorder_level}
+            async for pk, name, sku, quantity, reorder_level in Product.objects.filter(is_low_stock=True)
+            .order_by('quantity')
+            .values_list('id', 'name', 'sku', 'quantity', 'reorder_level')[:5]
+        ],
+        'user_sales_count': activity.get('sales_count', 0),
+        'user_transactions_count': activity.get('transactions_count', 0),
+        'generated_at': timezone.now().isoformat(),
+    })
+
+
+@login_required
+async def dashboard_stream(request):
+    # Server-Sent Events for the dashboard. EventSource sends Last-Event-ID
+    # when it reconnects; the page passes the id it was rendered at
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    if isinstance(request, ASGIRequest):
+        stream = live.event_stream(last_event_id)
+    else:
+        # WSGI would buffer an endless async stream, so answer with what is
+        # new and let the client reconnect, i.e. poll
+        stream = live.replay_stream(last_event_id)
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
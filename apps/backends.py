@@ -0,0 +1,73 @@
+"""
+Authentication backend that loads request.user from the cache.
+
+With cached_db sessions this takes both the django_session and the auth_user
+query out of every authenticated request. Only the User row is cached:
+permissions are still read by ModelBackend when a view checks them. Cached
+users are dropped when the row is saved or deleted and when their groups or
+direct permissions change (see signals.py).
+
+The password hash stays out of the cache, which lives on disk. A cached
+user is rebuilt with the password deferred: reading it loads it, and save()
+writes only the other fields. The session verification hashes, which
+sessions store anyway, are cached in its place.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.db import router
+
+from . import metrics
+
+USER_CACHE_KEY = 'auth-user:v2:{}'
+
+
+def user_cache():
+    return caches[settings.SESSION_CACHE_ALIAS]
+
+
+def forget_user(user_id):
+    user_cache().delete(USER_CACHE_KEY.format(user_id))
+
+
+def cached_fields():
+    return [field.attname for field in get_user_model()._meta.concrete_fields if field.name != 'password']
+
+
+def user_to_cache(user):
+    return {
+        'values': [getattr(user, name) for name in cached_fields()],
+        'session_hashes': [user.get_session_auth_hash(), *user.get_session_auth_fallback_hash()],
+    }
+
+
+def user_from_cache(data):
+    model = get_user_model()
+    user = model.from_db(router.db_for_read(model), cached_fields(), data['values'])
+    # Computing these would load the deferred password
+    current, *fallbacks = data['session_hashes']
+    user.get_session_auth_hash = lambda: current
+    user.get_session_auth_fallback_hash = lambda: iter(fallbacks)
+    return user
+
+
+class CachedModelBackend(ModelBackend):
+
+    def get_user(self, user_id):
+        cache = user_cache()
+        key = USER_CACHE_KEY.format(user_id)
+        data = cache.get(key)
+        metrics.record_cache('auth_user', data is not None)
+        if data is not None:
+            user = user_from_cache(data)
+        else:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            cache.set(key, user_to_cache(user), settings.AUTH_USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        return await sync_to_async(self.get_user)(user_id)
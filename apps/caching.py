@@ -0,0 +1,53 @@
+"""
+Per-model version counters for template fragment caching.
+
+Fragments are keyed on the version of every model they display. Updating or
+deleting a row through the ORM bumps its model's version (see signals.py), so
+the next render misses the cache and every other cached fragment stays valid.
+New rows get their own keys and don't need a bump. Code that changes rows
+with ``QuerySet.update()`` or ``bulk_*`` must call ``bump_model_version``
+itself because those paths send no signals.
+
+The fragments themselves live in the 'template_fragments' cache, whose
+FragmentCache backend counts hits and misses per fragment in /metrics.
+"""
+import uuid
+
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+
+from . import metrics
+
+VERSION_KEY = 'model-version:{}'
+
+
+def model_version(label):
+    key = VERSION_KEY.format(label)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        # add() so concurrent first readers agree on one value
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_model_version(*labels):
+    for label in labels:
+        cache.set(VERSION_KEY.format(label), uuid.uuid4().hex, timeout=None)
+
+
+def fragment_name(key):
+    # {% cache %} keys are template.cache.<fragment name>.<hash>
+    if not key.startswith('template.cache.'):
+        return 'other'
+    name, dot, digest = key[len('template.cache.'):].rpartition('.')
+    return name or 'other'
+
+
+class FragmentCache(FileBasedCache):
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, default, version)
+        metrics.record_cache(fragment_name(key), value is not default)
+        return value
@@ -0,0 +1,80 @@
+"""
+Catalogue feed for POS clients.
+
+A client loads the gzipped snapshot once, keeps the products locally and
+from then on asks only for what changed since the cursor it was given:
+products whose updated_at is at or after the cursor, and the ids of
+products deleted since (ProductTombstone). Saves and stock changes both
+touch Product.updated_at, so the delta carries new prices and stock levels.
+
+The snapshot is rebuilt when the 'inventory' model version moves, i.e.
+after any product or stock change, and otherwise served from the cache.
+"""
+import gzip
+import json
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .caching import model_version
+from .models import Product, ProductTombstone, StockLevel
+
+SNAPSHOT_CACHE_KEY = 'catalogue-snapshot:{}'
+FIELDS = ('id', 'name', 'sku', 'barcode', 'price', 'unit', 'updated_at')
+# A product saved in a transaction that commits late carries an updated_at
+# from before it became visible; changes reach this far behind the cursor
+SYNC_OVERLAP = timedelta(minutes=5)
+CHUNK_SIZE = 2000
+
+
+def _product_rows(products):
+    rows = []
+    for values in products.order_by('id').values_list(*FIELDS).iterator(chunk_size=CHUNK_SIZE):
+        row = dict(zip(FIELDS, values))
+        rows.append({
+            'id': row['id'],
+            'name': row['name'],
+            'sku': row['sku'],
+            'barcode': row['barcode'] or '',
+            'price': float(row['price']),
+            'unit': row['unit'],
+            'stock': {},
+        })
+    # Per-location stock, keyed by location id as a string like any JSON key
+    by_id = {row['id']: row for row in rows}
+    ids = list(by_id)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        levels = StockLevel.objects.filter(product_id__in=ids[start:start + CHUNK_SIZE])
+        for product_id, location_id, quantity in levels.values_list('product_id', 'location_id', 'quantity'):
+            by_id[product_id]['stock'][str(location_id)] = quantity
+    return rows
+
+
+def gzip_json(data):
+    return gzip.compress(json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode(), compresslevel=6)
+
+
+def catalogue_snapshot():
+    """(version, gzipped JSON) of every product, with the cursor to sync changes from."""
+    version = model_version('inventory')
+    key = SNAPSHOT_CACHE_KEY.format(version)
+    body = cache.get(key)
+    if body is None:
+        cursor = timezone.now()
+        body = gzip_json({'version': version, 'cursor': cursor, 'products': _product_rows(Product.objects.all())})
+        cache.set(key, body)
+    return version, body
+
+
+def catalogue_changes(since):
+    """Products changed and ids of products deleted since the cursor ``since``, with the next cursor."""
+    cursor = timezone.now()
+    after = since - SYNC_OVERLAP
+    return {
+        'cursor': cursor,
+        'products': _product_rows(Product.objects.filter(updated_at__gte=after)),
+        'deleted': list(ProductTombstone.objects.filter(deleted_at__gte=after)
+                        .values_list('product_id', flat=True).distinct()),
+    }
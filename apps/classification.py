@@ -0,0 +1,102 @@
+"""
+ABC (Pareto) classification of products by revenue over a period.
+
+Class A products make up the first 80% of revenue, B the next 15% and C the
+rest, including products that did not sell. Shares and classes are computed
+for the whole catalogue with sorted NumPy arrays.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from itertools import chain
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from .archive import sale_sources
+from .caching import bump_model_version
+from .models import Product, ProductClassification
+from .valuation import end_of_day
+
+A_THRESHOLD = 0.80
+B_THRESHOLD = 0.95
+
+
+def revenue_by_product(start, end):
+    """Revenue and units sold per product id for sales in [start, end]."""
+    revenue = defaultdict(Decimal)
+    quantity = defaultdict(int)
+    since = end_of_day(start - timedelta(days=1))
+    sales = chain.from_iterable(
+        source.filter(created_at__gte=since, created_at__lt=end_of_day(end))
+        .values_list('items', flat=True).iterator(chunk_size=2000)
+        for source in sale_sources(since)
+    )
+    for items in sales:
+        for item in items:
+            product_id = item.get('product_id')
+            if product_id is None:
+                continue
+            revenue[product_id] += Decimal(str(item['total']))
+            quantity[product_id] += item['quantity']
+    return revenue, quantity
+
+
+def classify(revenues):
+    """
+    Rank, revenue share, cumulative share and class for an array of revenues.
+
+    A product's class is decided by the cumulative share *before* it, so the
+    product that crosses a threshold still belongs to the higher class.
+    """
+    order = np.argsort(-revenues, kind='stable')
+    ranks = np.empty(len(revenues), dtype=np.int64)
+    ranks[order] = np.arange(1, len(revenues) + 1)
+
+    total = revenues.sum()
+    shares = revenues / total if total > 0 else np.zeros(len(revenues))
+    cumulative = np.empty(len(revenues))
+    cumulative[order] = np.cumsum(shares[order])
+    preceding = cumulative - shares
+
+    classes = np.where(preceding < A_THRESHOLD, 'A', np.where(preceding < B_THRESHOLD, 'B', 'C'))
+    classes[revenues <= 0] = 'C'
+    return ranks, shares, cumulative, classes
+
+
+def refresh_classification(days=90, end=None):
+    """Recompute and store the class of every product; returns {class: count}."""
+    end = end or timezone.localdate()
+    start = end - timedelta(days=days - 1)
+    revenue, quantity = revenue_by_product(start, end)
+
+    product_ids = np.array(list(Product.objects.order_by('id').values_list('id', flat=True)), dtype=np.int64)
+    revenues = np.array([float(revenue.get(pk, 0)) for pk in product_ids.tolist()], dtype=np.float64)
+    ranks, shares, cumulative, classes = classify(revenues)
+
+    rows = [
+        ProductClassification(
+            product_id=pk,
+            abc_class=abc_class,
+            rank=rank,
+            revenue=revenue.get(pk, Decimal('0')),
+            quantity_sold=quantity.get(pk, 0),
+            revenue_share=share,
+            cumulative_share=cumulative_share,
+            period_start=start,
+            period_end=end,
+        )
+        for pk, abc_class, rank, share, cumulative_share in zip(
+            product_ids.tolist(), classes.tolist(), ranks.tolist(), shares.tolist(), cumulative.tolist()
+        )
+    ]
+    with transaction.atomic():
+        ProductClassification.objects.all().delete()
+        ProductClassification.objects.bulk_create(rows, batch_size=1000)
+    bump_model_version('product')
+
+    counts = defaultdict(int)
+    for abc_class in classes.tolist():
+        counts[abc_class] += 1
+    return dict(counts)
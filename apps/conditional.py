@@ -0,0 +1,96 @@
+"""
+Conditional GET for responses that only change when their stored rows do.
+
+``conditional_record`` wraps a view with a function returning the timestamp
+its response is derived from (None if the record doesn't exist) and the
+model versions (see caching.py) covering edits the timestamp doesn't show.
+The ETag is built from those, the URL and the user, since every page shows
+who is logged in. A browser revalidating a copy it already has gets a 304
+without the view running; otherwise the body is served from the page cache
+under its ETag, and only rendered on a miss.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .caching import model_version
+
+# Bump when the templates of these pages change so cached bodies are dropped
+LAYOUT_VERSION = 1
+BODY_CACHE_KEY = 'conditional-body:{}'
+BODY_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def record_etag(request, modified, versions):
+    parts = [LAYOUT_VERSION, request.get_full_path(), request.user.pk, request.user.is_staff,
+             modified.isoformat(), *(model_version(label) for label in versions)]
+    return quote_etag(hashlib.sha256(repr(parts).encode()).hexdigest()[:32])
+
+
+def _set_validators(response, etag, modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(modified.timestamp())
+    # The body shows the user's name, so shared caches must not keep it
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def _respond(request, args, kwargs, last_modified, versions):
+    # -> (response, None), or (None, (etag, modified)) when the view must render
+    modified = last_modified(*args, **kwargs)
+    # A pending flash message belongs in the page, which then can't be reused
+    if modified is None or request.method not in ('GET', 'HEAD') or len(messages.get_messages(request)):
+        return None, None
+    # The ETag sees edits within the same second; Last-Modified can't
+    etag = record_etag(request, modified, versions)
+    modified = modified.replace(microsecond=0)
+    response = get_conditional_response(request, etag=etag, last_modified=modified.timestamp())
+    if response is None:
+        cached = cache.get(BODY_CACHE_KEY.format(etag))
+        if cached is None:
+            return None, (etag, modified)
+        content, content_type = cached
+        response = HttpResponse(content, content_type=content_type)
+    return _set_validators(response, etag, modified), None
+
+
+def _store(response, validators):
+    if validators is None or response.status_code != 200 or response.streaming:
+        return response
+    etag, modified = validators
+    cache.set(BODY_CACHE_KEY.format(etag), (response.content, response['Content-Type']), BODY_CACHE_TIMEOUT)
+    return _set_validators(response, etag, modified)
+
+
+def conditional_record(last_modified, versions=()):
+    """
+    Decorator adding ETag / Last-Modified validation and a body cache to a view.
+
+    ``last_modified`` takes the view's URL arguments and returns the stored
+    timestamp of what the response shows, or None to run the view as is
+    (e.g. to let it answer 404). Put it inside ``login_required``.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                response, validators = await sync_to_async(_respond)(request, args, kwargs, last_modified, versions)
+                if response is not None:
+                    return response
+                return await sync_to_async(_store)(await view(request, *args, **kwargs), validators)
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                response, validators = _respond(request, args, kwargs, last_modified, versions)
+                if response is not None:
+                    return response
+                return _store(view(request, *args, **kwargs), validators)
+        return wrapper
+    return decorator
@@ -0,0 +1,113 @@
+"""
+Expense totals served from the ExpenseMonthlySummary rollup.
+
+The rollup holds one row per month, category, expense type and payment
+method. ``expense_totals`` answers any combination of those filters and a
+date range from it: whole months in the range come from the rollup, and only
+the days of a partial first or last month are summed from Expense rows.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import Expense, ExpenseMonthlySummary
+
+GROUP_FIELDS = ('month', 'category__name', 'expense_type', 'payment_method')
+
+
+def next_month(day):
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def whole_months(start_date=None, end_date=None):
+    """
+    The months [first, stop) lying wholly inside [start_date, end_date].
+
+    Either bound is None when the range is open on that side; returns None
+    if the range contains no whole month.
+    """
+    first = start_date if start_date is None or start_date.day == 1 else next_month(start_date)
+    stop = None
+    if end_date is not None:
+        stop = next_month(end_date) if next_month(end_date) - timedelta(days=1) == end_date else end_date.replace(day=1)
+    if first is not None and stop is not None and first >= stop:
+        return None
+    return first, stop
+
+
+def expense_totals(category=None, expense_type=None, payment_method=None, start_date=None, end_date=None,
+                   group_by=None):
+    """
+    Total amount and count of the expenses matching the filters.
+
+    With ``group_by`` (one of GROUP_FIELDS) also returns ``rows``: one dict
+    per value with the same keys a ``values(group_by).annotate(total=...)``
+    query on Expense would give, largest total first.
+    """
+    filters = {}
+    if category:
+        filters['category'] = category
+    if expense_type:
+        filters['expense_type'] = expense_type
+    if payment_method:
+        filters['payment_method'] = payment_method
+
+    querysets = []
+    months = whole_months(start_date, end_date)
+    expenses = Expense.objects.filter(**filters).order_by()
+    if months is None:
+        querysets.append(expenses.filter(date__range=[start_date, end_date]))
+    else:
+        first, stop = months
+        summaries = ExpenseMonthlySummary.objects.filter(**filters).order_by()
+        if first is not None:
+            summaries = summaries.filter(month__gte=first)
+        if stop is not None:
+            summaries = summaries.filter(month__lt=stop)
+        querysets.append(summaries)
+        # The days of a partial first or last month
+        if start_date is not None and start_date < first:
+            querysets.append(expenses.filter(date__gte=start_date, date__lt=first))
+        if end_date is not None and end_date >= stop:
+            querysets.append(expenses.filter(date__gte=stop, date__lte=end_date))
+
+    total, count, grouped = 0, 0, {}
+    for queryset in querysets:
+        if queryset.model is Expense:
+            amount, rows = Sum('amount'), Count('id')
+            if group_by == 'month':
+                queryset = queryset.annotate(month=TruncMonth('date'))
+        else:
+            amount, rows = Sum('total'), Sum('count')
+        if group_by is None:
+            totals = queryset.aggregate(total=amount, count=rows)
+            total += totals['total'] or 0
+            count += totals['count'] or 0
+            continue
+        for row in queryset.values(group_by).annotate(total=amount, count=rows):
+            entry = grouped.setdefault(row[group_by], {group_by: row[group_by], 'total': 0, 'count': 0})
+            entry['total'] += row['total'] or 0
+            entry['count'] += row['count'] or 0
+            total += row['total'] or 0
+            count += row['count'] or 0
+
+    result = {'total': total, 'count': count}
+    if group_by is not None:
+        result['rows'] = sorted((row for row in grouped.values() if row['count']), key=lambda row: -row['total'])
+    return result
+
+
+def rebuild_expense_summary():
+    """Recompute the whole rollup from the Expense rows; returns the number of summary rows."""
+    rows = (
+        Expense.objects.annotate(month=TruncMonth('date'))
+        .values('month', 'category_id', 'expense_type', 'payment_method')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+    with transaction.atomic():
+        ExpenseMonthlySummary.objects.all().delete()
+        ExpenseMonthlySummary.objects.bulk_create([ExpenseMonthlySummary(**row) for row in rows], batch_size=500)
+    return ExpenseMonthlySummary.objects.count()
@@ -0,0 +1,175 @@
+"""
+Demand forecasting and reorder suggestions for the whole catalogue.
+
+Daily sales per product are loaded from the stock ledger in one query and
+bucketed into a products x days NumPy matrix; every statistic below is then
+computed for all products at once.
+"""
+import math
+from datetime import timedelta
+from itertools import chain, islice
+from statistics import NormalDist
+
+import numpy as np
+from django.utils import timezone
+
+from .archive import ledger_sources
+from .models import Product
+from .valuation import end_of_day
+
+DEFAULTS = {
+    'history_days': 90,
+    'window': 28,
+    'alpha': 0.3,
+    'lead_time_days': 7,
+    'review_days': 7,
+    'service_level': 0.95,
+    'method': 'ses',
+}
+# The demand matrix is products x history_days, so the history is bounded
+MAX_HISTORY_DAYS = 730
+
+
+def load_catalogue():
+    rows = list(Product.objects.order_by('id').values_list('id', 'sku', 'name', 'quantity', 'reorder_level'))
+    if not rows:
+        return np.array([], dtype=np.int64), [], [], np.array([]), np.array([])
+    ids, skus, names, quantities, reorder_levels = zip(*rows)
+    return (
+        np.array(ids, dtype=np.int64), list(skus), list(names),
+        np.array(quantities, dtype=np.float64), np.array(reorder_levels, dtype=np.float64),
+    )
+
+
+def load_daily_sales(product_ids, history_days, end=None, chunk_size=50000):
+    """Units sold per product per day as a (len(product_ids), history_days) matrix ending at ``end``."""
+    end = end or timezone.localdate()
+    start = end - timedelta(days=history_days - 1)
+    demand = np.zeros((len(product_ids), history_days), dtype=np.float64)
+    if not len(product_ids):
+        return demand
+
+    # Local midnights bounding each day; bucketing timestamps against them in
+    # NumPy is much cheaper than truncating every row to a date in SQL on SQLite
+    boundaries = np.array([end_of_day(start + timedelta(days=offset)).timestamp()
+                           for offset in range(-1, history_days)])
+    since = end_of_day(start - timedelta(days=1))
+    rows = chain.from_iterable(
+        ledger
+        .filter(
+            transaction_type='out',
+            reference__startswith='Sale:',
+            created_at__gte=since,
+            created_at__lt=end_of_day(end),
+        )
+        .values_list('product_id', 'created_at', 'quantity')
+        .order_by()
+        .iterator(chunk_size=5000)
+        for ledger in ledger_sources(since)
+    )
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        pids = np.fromiter((row[0] for row in chunk), dtype=np.int64, count=len(chunk))
+        stamps = np.fromiter((row[1].timestamp() for row in chunk), dtype=np.float64, count=len(chunk))
+        units = np.fromiter((row[2] for row in chunk), dtype=np.float64, count=len(chunk))
+
+        days = np.searchsorted(boundaries, stamps, side='right') - 1
+        positions = np.searchsorted(product_ids, pids)
+        known = (positions < len(product_ids)) & (product_ids[np.minimum(positions, len(product_ids) - 1)] == pids)
+        known &= (days >= 0) & (days < history_days)
+        np.add.at(demand, (positions[known], days[known]), units[known])
+    return demand
+
+
+def exponential_smoothing(demand, alpha):
+    """Simple exponential smoothing along the day axis for every product at once."""
+    level = demand[:, 0].copy()
+    for day in range(1, demand.shape[1]):
+        level = alpha * demand[:, day] + (1 - alpha) * level
+    return level
+
+
+def check_params(params):
+    """Raise ValueError if a forecast parameter is out of range."""
+    if not 1 <= int(params['history_days']) <= MAX_HISTORY_DAYS:
+        raise ValueError(f'history_days must be between 1 and {MAX_HISTORY_DAYS}')
+    if not 1 <= int(params['window']) <= MAX_HISTORY_DAYS:
+        raise ValueError(f'window must be between 1 and {MAX_HISTORY_DAYS}')
+    if not 0 <= float(params['alpha']) <= 1:
+        raise ValueError('alpha must be between 0 and 1')
+    if not 0 < float(params['service_level']) < 1:
+        raise ValueError('service_level must be between 0 and 1, exclusive')
+    for name in ('lead_time_days', 'review_days'):
+        if not 0 <= float(params[name]) <= MAX_HISTORY_DAYS:
+            raise ValueError(f'{name} must be between 0 and {MAX_HISTORY_DAYS}')
+
+
+def forecast_reorder(**options):
+    """
+    Forecast daily demand and suggest reorder points and quantities.
+
+    Uses a periodic-review order-up-to policy: reorder when stock is at or
+    below the reorder point (lead-time demand plus safety stock) and order
+    enough to cover another review period. Raises ValueError if a
+    parameter is out of range (see ``check_params``).
+    """
+    params = dict(DEFAULTS, **{k: v for k, v in options.items() if v is not None})
+    check_params(params)
+    history_days = int(params['history_days'])
+    window = min(int(params['window']), history_days)
+    lead_time = float(params['lead_time_days'])
+    review = float(params['review_days'])
+
+    ids, skus, names, quantities, reorder_levels = load_catalogue()
+    demand = load_daily_sales(ids, history_days)
+    recent = demand[:, -window:]
+
+    if params['method'] == 'ma':
+        daily_demand = recent.mean(axis=1)
+    else:
+        daily_demand = exponential_smoothing(demand, float(params['alpha']))
+    sigma = recent.std(axis=1, ddof=1) if window > 1 else np.zeros(len(ids))
+
+    z = NormalDist().inv_cdf(float(params['service_level']))
+    safety_stock = np.ceil(z * sigma * math.sqrt(lead_time))
+    reorder_point = np.ceil(daily_demand * lead_time + safety_stock)
+    order_up_to = reorder_point + np.ceil(daily_demand * review)
+    suggested = np.where(quantities <= reorder_point, np.maximum(order_up_to - quantities, 0), 0)
+    days_of_cover = np.divide(quantities, daily_demand, out=np.full(len(ids), np.inf), where=daily_demand > 0)
+
+    return {
+        'params': params,
+        'product_ids': ids,
+        'skus': skus,
+        'names': names,
+        'quantity': quantities,
+        'current_reorder_level': reorder_levels,
+        'daily_demand': daily_demand,
+        'safety_stock': safety_stock,
+        'reorder_point': reorder_point,
+        'suggested_quantity': suggested,
+        'days_of_cover': days_of_cover,
+    }
+
+
+def forecast_rows(forecast, only_reorder=True, limit=None):
+    """Rows for display or export, most urgent (fewest days of cover) first."""
+    order = np.argsort(forecast['days_of_cover'], kind='stable')
+    if only_reorder:
+        order = order[forecast['suggested_quantity'][order] > 0]
+    if limit is not None:
+        order = order[:limit]
+    return [{
+        'product_id': int(forecast['product_ids'][i]),
+        'sku': forecast['skus'][i],
+        'name': forecast['names'][i],
+        'quantity': int(forecast['quantity'][i]),
+        'current_reorder_level': int(forecast['current_reorder_level'][i]),
+        'daily_demand': round(float(forecast['daily_demand'][i]), 2),
+        'safety_stock': int(forecast['safety_stock'][i]),
+        'reorder_point': int(forecast['reorder_point'][i]),
+        'suggested_quantity': int(forecast['suggested_quantity'][i]),
+        'days_of_cover': None if np.isinf(forecast['days_of_cover'][i]) else round(float(forecast['days_of_cover'][i]), 1),
+    } for i in order]
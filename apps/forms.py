@@ -1,8 +1,38 @@
+import csv
+import io
+
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.models import User
-from .models import Product, Category, Supplier, StockTransaction, Sale, UserProfile
+from django.db import models
+from django.urls import reverse
+from .models import Product, Category, Supplier, StockTransaction, Sale, UserProfile, ProductClassification, Location
 from .models import ExpenseCategory, Expense, ProfitLossReport
+from .storage import OversizedUpload, too_large_message, upload_limit
+
+
+class UploadSizeLimitMixin:
+    # SizeLimitUploadHandler leaves an OversizedUpload in place of a file it
+    # cut off; checked before ImageField tries to open the image
+    def to_python(self, data):
+        if isinstance(data, OversizedUpload) or getattr(data, 'size', 0) > upload_limit():
+            raise forms.ValidationError(too_large_message(), code='file_too_large')
+        return super().to_python(data)
+
+
+class LimitedFileField(UploadSizeLimitMixin, forms.FileField):
+    pass
+
+
+class LimitedImageField(UploadSizeLimitMixin, forms.ImageField):
+    pass
+
+
+# For ModelAdmin.formfield_overrides
+UPLOAD_FIELD_OVERRIDES = {
+    models.FileField: {'form_class': LimitedFileField},
+    models.ImageField: {'form_class': LimitedImageField},
+}
 
 class CustomLoginForm(AuthenticationForm):
     username = forms.CharField(widget=forms.TextInput(attrs={
@@ -31,11 +61,13 @@ class CustomUserCreationForm(UserCreationForm):
 class ProductForm(forms.ModelForm):
     class Meta:
         model = Product
-        fields = ['name', 'sku', 'description', 'category', 'unit', 
+        fields = ['name', 'sku', 'barcode', 'description', 'category', 'unit', 
                   'price', 'cost_price', 'quantity', 'reorder_level', 'image']
+        field_classes = {'image': LimitedImageField}
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control'}),
             'sku': forms.TextInput(attrs={'class': 'form-control'}),
+            'barcode': forms.TextInput(attrs={'class': 'form-control'}),
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
             'category': forms.Select(attrs={'class': 'form-control'}),
             'unit': forms.Select(attrs={'class': 'form-control'}),
@@ -44,6 +76,14 @@ class ProductForm(forms.ModelForm):
             'quantity': forms.NumberInput(attrs={'class': 'form-control'}),
             'reorder_level': forms.NumberInput(attrs={'class': 'form-control'}),
         }
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            # The total is kept in step with the per-location levels, so
+            # existing stock changes through stock in/out or a stock take
+            self.fields['quantity'].disabled = True
+            self.fields['quantity'].help_text = 'Total over all locations; use Stock In/Out or a stock take to change it.'
 
 class CategoryForm(forms.ModelForm):
     class Meta:
@@ -66,17 +106,94 @@ class SupplierForm(forms.ModelForm):
             'address': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
         }
 
+class ProductAutocompleteWidget(forms.Select):
+    # Renders only the selected product; the rest are fetched from the
+    # product search endpoint as the user types
+    def get_context(self, name, value, attrs):
+        attrs = dict(attrs or {}, **{'data-autocomplete-url': reverse('product_search_api')})
+        return super().get_context(name, value, attrs)
+    
+    def optgroups(self, name, value, attrs=None):
+        selected = [v for v in value if str(v).isdigit()]
+        self.choices = [('', '---------')] + [
+            (product.pk, str(product)) for product in Product.objects.filter(pk__in=selected)
+        ]
+        return super().optgroups(name, value, attrs)
+
 class StockTransactionForm(forms.ModelForm):
     class Meta:
         model = StockTransaction
-        fields = ['product', 'transaction_type', 'quantity', 'reference', 'notes']
+        fields = ['product', 'location', 'transaction_type', 'quantity', 'reference', 'notes']
         widgets = {
-            'product': forms.Select(attrs={'class': 'form-control'}),
+            'product': ProductAutocompleteWidget(attrs={'class': 'form-control'}),
+            'location': forms.Select(attrs={'class': 'form-control'}),
             'transaction_type': forms.Select(attrs={'class': 'form-control'}),
             'quantity': forms.NumberInput(attrs={'class': 'form-control'}),
             'reference': forms.TextInput(attrs={'class': 'form-control'}),
             'notes': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
         }
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['location'].queryset = Location.objects.filter(is_active=True)
+        self.fields['location'].empty_label = None
+
+class StockTakeForm(forms.Form):
+    location = forms.ModelChoiceField(
+        queryset=Location.objects.filter(is_active=True),
+        empty_label=None,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    reference = forms.CharField(max_length=100, required=False, widget=forms.TextInput(attrs={'class': 'form-control'}))
+    notes = forms.CharField(required=False, widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 2}))
+    counts_file = LimitedFileField(
+        required=False,
+        label='Counts file (CSV)',
+        help_text='One "SKU,counted quantity" per line; a header row is ignored.',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,text/csv,text/plain'})
+    )
+    counts_text = forms.CharField(
+        required=False,
+        label='Or enter counts',
+        widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 8, 'placeholder': 'SKU001,12'})
+    )
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        upload = cleaned_data.get('counts_file')
+        if upload:
+            try:
+                text = upload.read().decode('utf-8-sig')
+            except UnicodeDecodeError:
+                raise forms.ValidationError('The counts file must be UTF-8 encoded text.')
+        else:
+            text = cleaned_data.get('counts_text') or ''
+        
+        counts = {}
+        errors = []
+        for number, row in enumerate(csv.reader(io.StringIO(text)), start=1):
+            if not row or not ''.join(row).strip():
+                continue
+            sku = row[0].strip()
+            try:
+                quantity = int((row[1] if len(row) > 1 else '').strip())
+            except ValueError:
+                if number == 1:
+                    continue  # header row
+                errors.append(f'Line {number}: "{",".join(row)}" needs a SKU and a whole number.')
+                continue
+            if quantity < 0:
+                errors.append(f'Line {number}: counted quantity cannot be negative.')
+                continue
+            # The same SKU counted in several places adds up
+            counts[sku] = counts.get(sku, 0) + quantity
+        
+        if errors:
+            raise forms.ValidationError(errors[:10])
+        if not counts:
+            raise forms.ValidationError('Upload a counts file or enter at least one count.')
+        cleaned_data['counts'] = counts
+        return cleaned_data
 
 class SaleForm(forms.ModelForm):
     class Meta:
@@ -92,6 +209,7 @@ class UserProfileForm(forms.ModelForm):
     class Meta:
         model = UserProfile
         fields = ['phone', 'address', 'role', 'profile_picture']
+        field_classes = {'profile_picture': LimitedImageField}
         widgets = {
             'phone': forms.TextInput(attrs={'class': 'form-control'}),
             'address': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
@@ -104,6 +222,26 @@ class SearchForm(forms.Form):
         'placeholder': 'Search...'
     }))
 
+class ProductFilterForm(SearchForm):
+    SORT_CHOICES = [
+        ('', 'Default order'),
+        ('abc', 'ABC class (A first)'),
+        ('name', 'Name'),
+        ('-quantity', 'Stock (high to low)'),
+        ('quantity', 'Stock (low to high)'),
+    ]
+    
+    abc_class = forms.ChoiceField(
+        choices=[('', 'All Classes')] + ProductClassification.ABC_CLASSES,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    sort = forms.ChoiceField(
+        choices=SORT_CHOICES,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+
 
 # Add these forms to your existing forms.py
 
@@ -121,6 +259,7 @@ class ExpenseForm(forms.ModelForm):
         model = Expense
         fields = ['category', 'expense_type', 'description', 'amount', 
                   'payment_method', 'reference_number', 'date', 'receipt']
+        field_classes = {'receipt': LimitedFileField}
         widgets = {
             'category': forms.Select(attrs={'class': 'form-control'}),
             'expense_type': forms.Select(attrs={'class': 'form-control'}),
@@ -0,0 +1,139 @@
+"""
+Invoice PDFs.
+
+A sale's PDF is rendered once and kept in the 'invoices' cache under its
+invoice number; sales only change through the admin, and saving or
+deleting one drops its PDF (signals.py). Batches render the invoices
+missing from the cache across a process pool: the renderer (pdf.py) is pure
+Python and CPU bound, so threads would only take turns on the GIL. Workers
+are spawned rather than forked, since the pool may be started inside a
+threaded web server process.
+"""
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from itertools import islice
+
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.dateformat import format as format_date
+
+from .archive import sale_sources
+from .models import Sale
+from .pdf import render_invoice
+from .tasks import task
+from .valuation import end_of_day
+
+# Bump the layout version when pdf.render_invoice changes so cached PDFs are
+# rendered again
+PDF_CACHE_KEY = 'invoice-pdf:v1:{}'
+BATCH_SIZE = 500
+# Smaller batches render in this process; starting workers costs more
+POOL_THRESHOLD = 20
+
+
+def invoice_cache():
+    return caches['invoices']
+
+
+def invoice_data(sale):
+    """What the PDF shows of a Sale or ArchivedSale, as plain values a worker process can take."""
+    created_at = timezone.localtime(sale.created_at)
+    return {
+        'invoice_number': sale.invoice_number,
+        'date': format_date(created_at, 'd/m/Y'),
+        'time': format_date(created_at, 'H:i'),
+        'long_date': format_date(created_at, 'F d, Y'),
+        'customer_name': sale.customer_name,
+        'customer_phone': sale.customer_phone,
+        'cashier': sale.created_by.username if sale.created_by else '',
+        'payment_method': sale.get_payment_method_display(),
+        'paid': sale.payment_status,
+        'location': sale.location.name if sale.location_id else '',
+        'total_amount': str(sale.total_amount),
+        'items': sale.items,
+    }
+
+
+def invoice_pdf(sale):
+    """One sale's invoice PDF, from the cache when it was rendered before."""
+    key = PDF_CACHE_KEY.format(sale.invoice_number)
+    pdf = invoice_cache().get(key)
+    if pdf is None:
+        pdf = render_invoice(invoice_data(sale))
+        invoice_cache().set(key, pdf, None)
+    return pdf
+
+
+def forget_invoice_pdf(invoice_number):
+    invoice_cache().delete(PDF_CACHE_KEY.format(invoice_number))
+
+
+def invoice_pdfs(sales, workers=None):
+    """
+    Yield (invoice_number, pdf) for each sale in order.
+
+    Sales are taken BATCH_SIZE at a time; the PDFs of a batch missing from
+    the cache are rendered across a pool of ``workers`` processes (default:
+    one per CPU) and cached.
+    """
+    cache = invoice_cache()
+    sales = iter(sales)
+    pool = None
+    try:
+        while True:
+            batch = list(islice(sales, BATCH_SIZE))
+            if not batch:
+                break
+            keys = {PDF_CACHE_KEY.format(sale.invoice_number): sale.invoice_number for sale in batch}
+            pdfs = {keys[key]: pdf for key, pdf in cache.get_many(list(keys)).items()}
+            missing = [invoice_data(sale) for sale in batch if sale.invoice_number not in pdfs]
+            if len(missing) >= POOL_THRESHOLD and workers != 1:
+                if pool is None:
+                    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+                chunksize = max(1, len(missing) // ((workers or os.cpu_count() or 1) * 4))
+                rendered = pool.map(render_invoice, missing, chunksize=chunksize)
+            else:
+                rendered = map(render_invoice, missing)
+            new = {invoice['invoice_number']: pdf for invoice, pdf in zip(missing, rendered)}
+            if new:
+                cache.set_many({PDF_CACHE_KEY.format(number): pdf for number, pdf in new.items()}, None)
+                pdfs.update(new)
+            for sale in batch:
+                yield sale.invoice_number, pdfs[sale.invoice_number]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+@task
+def prerender_invoices(invoice_numbers):
+    """Render new sales' PDFs ahead of the first print, off the checkout path; returns how many."""
+    sales = Sale.objects.filter(invoice_number__in=invoice_numbers).select_related('location', 'created_by')
+    rendered = 0
+    for number, pdf in invoice_pdfs(sales.order_by('id'), workers=1):
+        rendered += 1
+    return rendered
+
+
+def write_invoice_zip(sales, fileobj, workers=None):
+    """Write one PDF per sale into a zip; returns the number of invoices."""
+    count = 0
+    # PDF streams are already compressed
+    with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_STORED) as archive:
+        for number, pdf in invoice_pdfs(sales, workers=workers):
+            archive.writestr(f'{number}.pdf', pdf)
+            count += 1
+    return count
+
+
+def sales_between(start_date, end_date):
+    """Sales of the days start_date to end_date, archived ones included, oldest first."""
+    after, until = end_of_day(start_date - timedelta(days=1)), end_of_day(end_date)
+    # Archived sales are older than every hot one
+    for queryset in reversed(sale_sources(after)):
+        yield from (queryset.filter(created_at__gte=after, created_at__lt=until)
+                    .select_related('location', 'created_by').order_by('created_at', 'id')
+                    .iterator(chunk_size=BATCH_SIZE))
@@ -0,0 +1,246 @@
+"""
+Live dashboard updates over Server-Sent Events.
+
+Writers record a DashboardEvent once the sale or stock movement commits,
+with the delta already computed. Snapshots after bulk changes and expense
+totals have to be computed from the database, so they are queued for the
+task worker instead (see tasks.py). Each server process runs one EventHub
+per event loop that polls the table for new rows and fans them out to the
+asyncio queues of its subscribers, so any number of open dashboards costs
+one small query per poll interval instead of a full dashboard reload each.
+"""
+import asyncio
+import json
+import time
+import weakref
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from .models import DashboardEvent, Expense, Product, Sale, StockTransaction
+from .tasks import enqueue, task
+from .valuation import end_of_day
+
+POLL_INTERVAL = getattr(settings, 'DASHBOARD_POLL_INTERVAL', 1.0)
+KEEPALIVE_INTERVAL = 15
+STREAM_SECONDS = getattr(settings, 'DASHBOARD_STREAM_SECONDS', 300)
+RETRY_MS = 3000
+REPLAY_LIMIT = 200
+QUEUE_SIZE = 200
+RETENTION = timedelta(days=1)
+PRUNE_INTERVAL = 3600
+
+
+# Publishing
+
+def record_event(kind, payload):
+    DashboardEvent.objects.create(kind=kind, payload=payload)
+
+
+def publish(kind, payload):
+    """Record an event once the current transaction commits."""
+    transaction.on_commit(lambda: record_event(kind, payload))
+
+
+def transaction_row(movement):
+    return {
+        'id': movement.id,
+        'product': movement.product.name,
+        'type': movement.transaction_type,
+        'quantity': movement.quantity,
+        'reference': movement.reference,
+        'user': movement.created_by.username if movement.created_by else '',
+        'created_at': movement.created_at.isoformat(),
+    }
+
+
+def low_stock_items():
+    return [
+        {'id': pk, 'name': name, 'quantity': quantity, 'reorder_level': reorder_level}
+        for pk, name, quantity, reorder_level in Product.objects.filter(is_low_stock=True)
+        .order_by('quantity').values_list('id', 'name', 'quantity', 'reorder_level')[:5]
+    ]
+
+
+def today_expenses():
+    return Expense.objects.filter(date=timezone.localdate()).aggregate(total=Sum('amount'))['total'] or 0
+
+
+def dashboard_snapshot():
+    """Every live dashboard number, for bulk changes that are too many to send as deltas."""
+    today = timezone.localdate()
+    today_sales = Sale.objects.filter(
+        created_at__gte=end_of_day(today - timedelta(days=1)), created_at__lt=end_of_day(today),
+    ).aggregate(total=Sum('total_amount'))['total'] or 0
+    recent = StockTransaction.objects.select_related('product', 'created_by').order_by('-created_at')[:10]
+    return {
+        'date': today.isoformat(),
+        'today_sales': float(today_sales),
+        'today_expenses': float(today_expenses()),
+        'low_stock_count': Product.objects.filter(is_low_stock=True).count(),
+        'low_stock_items': low_stock_items(),
+        'recent_transactions': [transaction_row(movement) for movement in recent],
+    }
+
+
+@task
+def record_snapshot():
+    # Computed by the worker, so it sees everything committed before it
+    record_event('snapshot', dashboard_snapshot())
+
+
+def publish_snapshot():
+    enqueue(record_snapshot)
+
+
+@task
+def record_expense_total():
+    record_event('expense', {
+        'date': timezone.localdate().isoformat(),
+        'today_expenses': float(today_expenses()),
+    })
+
+
+def publish_expense_total():
+    # Edits can move an expense in or out of today, so send the total
+    enqueue(record_expense_total)
+
+
+def latest_event_id():
+    return DashboardEvent.objects.aggregate(last=Max('id'))['last'] or 0
+
+
+# Streaming
+
+def format_event(event):
+    return f'id: {event.id}\nevent: {event.kind}\ndata: {json.dumps(event.payload)}\n\n'
+
+
+def format_cursor(event_id):
+    # An id without data dispatches nothing but moves the id EventSource
+    # sends back as Last-Event-ID when it reconnects
+    return f'id: {event_id}\n\n'
+
+
+def _parse_event_id(value):
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _replay_query(after):
+    return DashboardEvent.objects.filter(id__gt=after).order_by('id')[:REPLAY_LIMIT]
+
+
+class EventHub:
+    """Polls for new events and hands each one to every subscriber's queue."""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.last_id = None
+        self.task = None
+        self.last_prune = 0.0
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.subscribers.add(queue)
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    async def run(self):
+        if self.last_id is None:
+            self.last_id = (await DashboardEvent.objects.aaggregate(last=Max('id')))['last'] or 0
+        # Stops with the last subscriber; the next one starts it again
+        while self.subscribers:
+            events = [event async for event in _replay_query(self.last_id)]
+            for event in events:
+                for queue in list(self.subscribers):
+                    try:
+                        queue.put_nowait(event)
+                    except asyncio.QueueFull:
+                        # Too slow to keep up: end its stream, the client
+                        # reconnects and replays from the last id it saw
+                        self.subscribers.discard(queue)
+                        while not queue.empty():
+                            queue.get_nowait()
+                        queue.put_nowait(None)
+            if events:
+                self.last_id = events[-1].id
+            if len(events) < REPLAY_LIMIT:
+                await self.prune()
+                await asyncio.sleep(POLL_INTERVAL)
+
+    async def prune(self):
+        now = time.monotonic()
+        if now - self.last_prune >= PRUNE_INTERVAL:
+            self.last_prune = now
+            await DashboardEvent.objects.filter(created_at__lt=timezone.now() - RETENTION).adelete()
+
+
+# One hub per event loop: under ASGI that is one per process
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_hub():
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = EventHub()
+    return hub
+
+
+async def event_stream(last_event_id=None):
+    """SSE body for ASGI: replay what the client missed, then follow the hub."""
+    hub = get_hub()
+    queue = hub.subscribe()
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        seen = _parse_event_id(last_event_id)
+        if seen is None:
+            seen = (await DashboardEvent.objects.aaggregate(last=Max('id')))['last'] or 0
+        else:
+            async for event in _replay_query(seen):
+                seen = event.id
+                yield format_event(event)
+        yield format_cursor(seen)
+
+        loop = asyncio.get_running_loop()
+        # Reconnecting now and then lets load balancers rebalance connections
+        deadline = loop.time() + STREAM_SECONDS
+        while loop.time() < deadline:
+            try:
+                event = await asyncio.wait_for(queue.get(), KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if event is None:
+                break
+            if event.id > seen:
+                seen = event.id
+                yield format_event(event)
+    finally:
+        hub.unsubscribe(queue)
+
+
+def replay_stream(last_event_id=None):
+    """
+    SSE body for WSGI, where a long-lived response would pin a worker thread:
+    send what the client missed and close; EventSource reconnects after RETRY_MS.
+    """
+    yield f'retry: {RETRY_MS}\n\n'
+    seen = _parse_event_id(last_event_id)
+    if seen is None:
+        seen = latest_event_id()
+    else:
+        for event in _replay_query(seen):
+            seen = event.id
+            yield format_event(event)
+    yield format_cursor(seen)
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.archive import CHUNK_SIZE, archive_before
+from apps.models import Sale, StockTransaction
+from apps.valuation import end_of_day
+
+
+class Command(BaseCommand):
+    help = (
+        'Move sales and stock movements of closed periods into the archive tables '
+        '(run monthly from cron). By default everything before the first day of '
+        'the month --keep-months back is archived.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', help='Archive rows created before this date, YYYY-MM-DD')
+        parser.add_argument('--keep-months', type=int, default=12, help='Whole months to keep in the hot tables')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows moved per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows that would move')
+
+    def handle(self, *args, **options):
+        if options['before']:
+            try:
+                day = datetime.strptime(options['before'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--before must be YYYY-MM-DD')
+        else:
+            day = timezone.localdate().replace(day=1)
+            for _ in range(options['keep_months']):
+                day = (day - timedelta(days=1)).replace(day=1)
+        # Local midnight at the start of ``day``
+        cutoff = end_of_day(day - timedelta(days=1))
+
+        if options['dry_run']:
+            sales = Sale.objects.filter(created_at__lt=cutoff).count()
+            movements = StockTransaction.objects.filter(created_at__lt=cutoff).count()
+            self.stdout.write(f'Would archive {sales} sales and {movements} stock movements before {day}')
+            return
+
+        def progress(label, moved):
+            self.stdout.write(f'  moved {moved} {label}')
+
+        try:
+            run = archive_before(cutoff, chunk_size=options['chunk_size'], progress=progress if options['verbosity'] > 1 else None)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {run.sales} sales and {run.movements} stock movements created before {day}'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from apps.classification import refresh_classification
+
+
+class Command(BaseCommand):
+    help = 'Recompute the ABC (Pareto) revenue class of every product (run nightly from cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help='Length of the sales period ending today')
+
+    def handle(self, *args, **options):
+        counts = refresh_classification(days=options['days'])
+        summary = ', '.join(f'{abc_class}: {counts.get(abc_class, 0)}' for abc_class in 'ABC')
+        self.stdout.write(self.style.SUCCESS(f'Classified products over {options["days"]} days ({summary})'))
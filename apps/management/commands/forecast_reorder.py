@@ -0,0 +1,54 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.forecasting import DEFAULTS, forecast_reorder, forecast_rows
+from apps.services import set_reorder_levels
+
+COLUMNS = ['sku', 'name', 'quantity', 'current_reorder_level', 'daily_demand',
+           'safety_stock', 'reorder_point', 'suggested_quantity', 'days_of_cover']
+
+
+class Command(BaseCommand):
+    help = 'Forecast demand for every product and print reorder suggestions as CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=DEFAULTS['history_days'], help='Days of sales history to load')
+        parser.add_argument('--window', type=int, default=DEFAULTS['window'], help='Days used for the moving average and variability')
+        parser.add_argument('--method', choices=['ses', 'ma'], default=DEFAULTS['method'],
+                            help='ses: exponential smoothing, ma: moving average')
+        parser.add_argument('--alpha', type=float, default=DEFAULTS['alpha'], help='Smoothing factor for ses')
+        parser.add_argument('--lead-time', type=float, default=DEFAULTS['lead_time_days'], help='Supplier lead time in days')
+        parser.add_argument('--review', type=float, default=DEFAULTS['review_days'], help='Days between orders')
+        parser.add_argument('--service-level', type=float, default=DEFAULTS['service_level'])
+        parser.add_argument('--all', action='store_true', help='Include products that need no reorder')
+        parser.add_argument('--apply', action='store_true', help='Store the forecast reorder points as reorder levels')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            forecast = forecast_reorder(
+                history_days=options['days'],
+                window=options['window'],
+                method=options['method'],
+                alpha=options['alpha'],
+                lead_time_days=options['lead_time'],
+                review_days=options['review'],
+                service_level=options['service_level'],
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - started
+
+        writer = csv.DictWriter(self.stdout, fieldnames=COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        for row in forecast_rows(forecast, only_reorder=not options['all']):
+            writer.writerow(row)
+
+        self.stderr.write(f"Forecast {len(forecast['product_ids'])} products in {elapsed:.2f}s")
+
+        if options['apply']:
+            levels = dict(zip(forecast['product_ids'].tolist(), forecast['reorder_point'].astype(int).tolist()))
+            updated = set_reorder_levels(levels)
+            self.stderr.write(self.style.SUCCESS(f'Updated reorder level for {updated} products'))
@@ -0,0 +1,137 @@
+import asyncio
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from apps.models import Product
+
+ENDPOINTS = ['product_info', 'product_search', 'low_stock_alerts', 'stock_valuation']
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare throughput of the sync JSON endpoints with their async versions. '
+        'By default both go through Django in-process (test Client in threads vs '
+        'AsyncClient on one event loop); with --base-url they are fetched over HTTP '
+        'from a running server, e.g. gunicorn (WSGI) vs uvicorn (ASGI).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint and mode')
+        parser.add_argument('--concurrency', type=int, default=20, help='Requests in flight at once')
+        parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=ENDPOINTS[:3])
+        parser.add_argument('--username', help='User to authenticate as (default: first superuser)')
+        parser.add_argument('--host', default='localhost', help='Host header for in-process requests')
+        parser.add_argument('--base-url', help='Load a running server instead, e.g. http://127.0.0.1:8000')
+
+    def handle(self, *args, **options):
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+        else:
+            user = User.objects.filter(is_superuser=True).order_by('id').first()
+        if user is None:
+            raise CommandError('No user to authenticate as; pass --username')
+        product = Product.objects.order_by('id').first()
+        if product is None:
+            raise CommandError('Load testing needs at least one product')
+
+        paths = {
+            'product_info': (reverse('get_product_info', args=[product.pk]),
+                             reverse('async_product_info', args=[product.pk])),
+            'product_search': (reverse('product_search_api') + '?q=a',
+                               reverse('async_product_search') + '?q=a'),
+            'low_stock_alerts': (reverse('low_stock_alerts_api') + '?limit=50',
+                                 reverse('async_low_stock_alerts') + '?limit=50'),
+            'stock_valuation': (reverse('stock_valuation_api'), reverse('async_stock_valuation')),
+        }
+
+        login = Client(HTTP_HOST=options['host'])
+        login.force_login(user)
+        cookie = login.cookies[settings.SESSION_COOKIE_NAME].value
+        total, concurrency = options['requests'], options['concurrency']
+
+        self.stdout.write(f"{'endpoint':<18}{'mode':<7}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}")
+        try:
+            for name in options['endpoints']:
+                sync_path, async_path = paths[name]
+                for mode, path in (('sync', sync_path), ('async', async_path)):
+                    if options['base_url']:
+                        elapsed, results = self.run_http(options['base_url'].rstrip('/') + path, cookie, total, concurrency)
+                    elif mode == 'sync':
+                        elapsed, results = self.run_sync(path, cookie, total, concurrency, options['host'])
+                    else:
+                        elapsed, results = asyncio.run(self.run_async(path, cookie, total, concurrency, options['host']))
+                    self.report(name, mode, elapsed, results)
+        finally:
+            login.logout()
+
+    def run_sync(self, path, cookie, total, concurrency, host):
+        local = threading.local()
+
+        def fetch(_):
+            client = getattr(local, 'client', None)
+            if client is None:
+                client = local.client = Client(HTTP_HOST=host)
+                client.cookies = SimpleCookie({settings.SESSION_COOKIE_NAME: cookie})
+            start = time.perf_counter()
+            response = client.get(path)
+            return time.perf_counter() - start, response.status_code
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(fetch, range(total)))
+        return time.perf_counter() - start, results
+
+    async def run_async(self, path, cookie, total, concurrency, host):
+        client = AsyncClient(HTTP_HOST=host)
+        client.cookies = SimpleCookie({settings.SESSION_COOKIE_NAME: cookie})
+        slots = asyncio.Semaphore(concurrency)
+
+        async def fetch():
+            async with slots:
+                start = time.perf_counter()
+                response = await client.get(path)
+                return time.perf_counter() - start, response.status_code
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(fetch() for _ in range(total)))
+        return time.perf_counter() - start, results
+
+    def run_http(self, url, cookie, total, concurrency):
+        headers = {'Cookie': f'{settings.SESSION_COOKIE_NAME}={cookie}'}
+
+        def fetch(_):
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=30) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as exc:
+                status = exc.code
+            except OSError:
+                status = 0
+            return time.perf_counter() - start, status
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(fetch, range(total)))
+        return time.perf_counter() - start, results
+
+    def report(self, name, mode, elapsed, results):
+        latencies = sorted(duration * 1000 for duration, status in results)
+        errors = sum(1 for duration, status in results if status != 200)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        self.stdout.write(
+            f'{name:<18}{mode:<7}{len(results):>9}{errors:>8}{len(results) / elapsed:>9.1f}'
+            f'{statistics.median(latencies):>9.1f}{p95:>9.1f}'
+        )
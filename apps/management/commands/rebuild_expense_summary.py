@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.expense_summary import rebuild_expense_summary
+
+
+class Command(BaseCommand):
+    help = 'Recompute the monthly expense rollup from the expense rows (e.g. after a bulk update).'
+
+    def handle(self, *args, **options):
+        rows = rebuild_expense_summary()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the expense summary ({rows} rows)'))
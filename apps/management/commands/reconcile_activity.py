@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.services import reconcile_activity
+
+
+class Command(BaseCommand):
+    help = "Recompute every user's sales, products and stock movement counters from the rows."
+
+    def handle(self, *args, **options):
+        corrected = reconcile_activity()
+        self.stdout.write(self.style.SUCCESS(f'Reconciled activity counters ({corrected} profiles corrected)'))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.models import Location, Product
+from apps.reconciliation import find_drift, fix_drift
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare every stock level with the net of its ledger rows (archive included) and every '
+        'product total with its levels. With --fix, set the drifting levels to the ledger and '
+        'recompute the totals; read the report first, since the ledger is taken as right.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Write the ledger quantities to the drifting levels')
+        parser.add_argument('--show', type=int, default=20, help='Drifting rows to list, largest first')
+
+    def handle(self, *args, **options):
+        try:
+            drift = find_drift()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        levels, products = drift['levels'], drift['products']
+
+        shown, shown_products = levels[:options['show']], products[:options['show']]
+        names = dict(Product.objects.filter(pk__in=[row[0] for row in shown + shown_products]).values_list('pk', 'sku'))
+        locations = dict(Location.objects.values_list('pk', 'code'))
+        net = sum(stored - ledger for _, _, stored, ledger in levels)
+        self.stdout.write(f'{len(levels)} stock levels differ from the ledger (net {net:+d} units)')
+        for product_id, location_id, stored, ledger in shown:
+            self.stdout.write(f'  {names.get(product_id, product_id)} @ {locations.get(location_id, location_id)}: '
+                              f'stored {stored}, ledger {ledger} ({stored - ledger:+d})')
+        self.stdout.write(f'{len(products)} product totals differ from their levels')
+        for product_id, stored, total in shown_products:
+            self.stdout.write(f'  {names.get(product_id, product_id)}: stored {stored}, levels {total} ({stored - total:+d})')
+
+        if not options['fix']:
+            return
+        written = fix_drift(drift)
+        resynced = len({row[0] for row in levels} | {row[0] for row in products})
+        self.stdout.write(self.style.SUCCESS(f'Fixed {written} stock levels and recomputed {resynced} product totals'))
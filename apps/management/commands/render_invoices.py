@@ -0,0 +1,30 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.invoices import sales_between, write_invoice_zip
+
+
+class Command(BaseCommand):
+    help = 'Render the invoice PDFs of a date range into one zip, in parallel across worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First day, YYYY-MM-DD (default: today)')
+        parser.add_argument('--end', help='Last day, YYYY-MM-DD (default: the start day)')
+        parser.add_argument('--output', help='Zip file to write (default: invoices-<start>-<end>.zip)')
+        parser.add_argument('--workers', type=int, help='Worker processes (default: one per CPU)')
+
+    def handle(self, *args, **options):
+        try:
+            start = datetime.strptime(options['start'], '%Y-%m-%d').date() if options['start'] else timezone.localdate()
+            end = datetime.strptime(options['end'], '%Y-%m-%d').date() if options['end'] else start
+        except ValueError:
+            raise CommandError('--start and --end must be YYYY-MM-DD')
+        if end < start:
+            raise CommandError('--end is before --start')
+        output = options['output'] or f'invoices-{start:%Y%m%d}-{end:%Y%m%d}.zip'
+
+        with open(output, 'wb') as fileobj:
+            count = write_invoice_zip(sales_between(start, end), fileobj, workers=options['workers'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {count} invoices from {start} to {end} to {output}'))
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.tasks import prune_done, requeue_stale, run_due_tasks
+
+HOUSEKEEPING_INTERVAL = 300
+
+
+class Command(BaseCommand):
+    help = (
+        'Run queued follow-up tasks (dashboard snapshots, invoice pre-rendering). Keep one or more '
+        'running next to the web servers, or run with --once from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run the tasks that are due, then exit')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait when no task is due')
+
+    def handle(self, *args, **options):
+        last_housekeeping = 0.0
+        try:
+            while True:
+                if time.monotonic() - last_housekeeping > HOUSEKEEPING_INTERVAL:
+                    requeued, pruned = requeue_stale(), prune_done()
+                    if requeued or pruned:
+                        self.stdout.write(f'Requeued {requeued} stale tasks, pruned {pruned} finished ones')
+                    last_housekeeping = time.monotonic()
+
+                succeeded, failed = run_due_tasks()
+                if (succeeded or failed) and (options['once'] or options['verbosity'] > 1):
+                    self.stdout.write(f'Ran {succeeded + failed} tasks ({failed} failed)')
+                if options['once']:
+                    break
+                # Drop connections the database has closed while idle
+                close_old_connections()
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.valuation import take_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Store closing stock quantity and cost price per product (run daily or monthly from cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Closing date YYYY-MM-DD (default: yesterday, or end of last month with --period monthly)')
+        parser.add_argument('--period', choices=['daily', 'monthly'], default='daily',
+                            help='Only picks the default date; a snapshot is the same whichever period takes it')
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                day = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--date must be YYYY-MM-DD')
+        elif options['period'] == 'monthly':
+            day = timezone.localdate().replace(day=1) - timedelta(days=1)
+        else:
+            day = timezone.localdate() - timedelta(days=1)
+
+        try:
+            count = take_snapshot(day)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(f'Stored {count} snapshots for {day}'))
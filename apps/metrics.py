@@ -0,0 +1,248 @@
+"""
+Process-local metrics exposed in the Prometheus text format.
+
+Every worker keeps its counters and histograms in memory and writes them to
+``<METRICS_DIR>/<pid>-<start>.json`` at most once per
+``METRICS_FLUSH_INTERVAL`` seconds. The start time in the name keeps a new
+worker that reuses a dead one's pid from overwriting its totals. The
+``/metrics`` view merges all files in that directory, so the numbers add up
+across gunicorn workers no matter which one serves the scrape. On POSIX a
+scrape also folds the files of exited workers into ``retired.json`` and
+deletes them, so worker restarts don't add to the files each scrape reads.
+"""
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: exited workers' files are kept
+    fcntl = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+WORKER_FILE = re.compile(r'^(\d+)-\d+\.json$')
+RETIRED_FILE = 'retired.json'
+
+# name -> (type, help, buckets)
+METRICS = {
+    'inventory_http_requests_total': (
+        'counter', 'HTTP requests by URL name, method and status.', None),
+    'inventory_http_request_duration_seconds': (
+        'histogram', 'Request latency by URL name.', LATENCY_BUCKETS),
+    'inventory_db_queries_per_request': (
+        'histogram', 'Database queries executed per request by URL name.', QUERY_BUCKETS),
+    'inventory_sales_created_total': (
+        'counter', 'Sales created. Use rate() for sales per minute.', None),
+    'inventory_sales_amount_total': (
+        'counter', 'Sum of total_amount over created sales.', None),
+    'inventory_stock_movements_total': (
+        'counter', 'Stock ledger rows written by transaction type.', None),
+    'inventory_stock_movement_units_total': (
+        'counter', 'Units moved through the stock ledger by transaction type.', None),
+    'inventory_cache_requests_total': (
+        'counter', 'Cache lookups by cache name and result (hit/miss).', None),
+}
+
+_lock = threading.Lock()
+_values = {}
+_pid = None
+_filename = None
+_last_flush = 0.0
+
+
+def _state():
+    # Workers forked from a preloaded master must not report the master's numbers.
+    global _pid, _filename, _values, _last_flush
+    if _pid != os.getpid():
+        _pid = os.getpid()
+        _filename = f'{_pid}-{time.time_ns()}.json'
+        _values = {}
+        _last_flush = 0.0
+    return _values
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    with _lock:
+        values = _state()
+        key = _key(name, labels)
+        values[key] = values.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    buckets = METRICS[name][2]
+    with _lock:
+        values = _state()
+        key = _key(name, labels)
+        series = values.get(key)
+        if series is None:
+            # one slot per bucket plus +Inf, then sum and count
+            series = values[key] = [0] * (len(buckets) + 1) + [0.0, 0]
+        series[bisect_left(buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+
+def record_cache(cache_name, hit):
+    inc('inventory_cache_requests_total', cache=cache_name, result='hit' if hit else 'miss')
+
+
+def _metrics_dir():
+    return getattr(settings, 'METRICS_DIR', None)
+
+
+def _serialize(values):
+    return [[name, list(labels), value] for (name, labels), value in values.items()]
+
+
+def flush(force=False):
+    global _last_flush
+    directory = _metrics_dir()
+    if not directory:
+        return
+    now = time.monotonic()
+    interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0)
+    with _lock:
+        values = _state()
+        if not force and now - _last_flush < interval:
+            return
+        _last_flush = now
+        filename = _filename
+        payload = json.dumps(_serialize(values))
+    os.makedirs(directory, exist_ok=True)
+    _write(os.path.join(directory, filename), payload)
+
+
+def _write(path, payload):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    with os.fdopen(fd, 'w') as fh:
+        fh.write(payload)
+    os.replace(tmp_path, path)
+
+
+def _read(path, default=None):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return default
+
+
+def _exited(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+@contextmanager
+def _directory_lock(directory):
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directory, '.lock'), 'a') as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _retire_exited(directory):
+    """Fold the files of workers that have exited into RETIRED_FILE and delete them."""
+    path = os.path.join(directory, RETIRED_FILE)
+    retired = _read(path, {'files': [], 'values': []})
+    # Listed files were merged by a run that stopped before deleting them
+    exited = [filename for filename in os.listdir(directory)
+              if (match := WORKER_FILE.match(filename)) and _exited(int(match.group(1)))]
+    new = [filename for filename in exited if filename not in retired['files']]
+    if new:
+        merged = {}
+        _merge(merged, retired['values'])
+        for filename in new:
+            _merge(merged, _read(os.path.join(directory, filename), []))
+        retired = {'files': exited, 'values': _serialize(merged)}
+        _write(path, json.dumps(retired))
+    for filename in exited:
+        os.remove(os.path.join(directory, filename))
+    return retired
+
+
+def _merge(into, rows):
+    for name, labels, value in rows:
+        key = (name, tuple(tuple(pair) for pair in labels))
+        if isinstance(value, list):
+            current = into.get(key)
+            into[key] = value if current is None else [a + b for a, b in zip(current, value)]
+        else:
+            into[key] = into.get(key, 0) + value
+
+
+def collect():
+    """Merged values of every worker, including this one's unflushed numbers."""
+    flush(force=True)
+    merged = {}
+    directory = _metrics_dir()
+    if directory and os.path.isdir(directory):
+        with _directory_lock(directory):
+            if fcntl is not None:
+                _merge(merged, _retire_exited(directory)['values'])
+            for filename in os.listdir(directory):
+                if WORKER_FILE.match(filename):
+                    _merge(merged, _read(os.path.join(directory, filename), []))
+    else:
+        with _lock:
+            _merge(merged, _serialize(_state()))
+    return merged
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render():
+    merged = collect()
+    lines = []
+    for name, (metric_type, help_text, buckets) in METRICS.items():
+        series = sorted((labels, value) for (n, labels), value in merged.items() if n == name)
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        for labels, value in series:
+            if metric_type == 'histogram':
+                cumulative = 0
+                for bound, count in zip(list(buckets) + ['+Inf'], value[:-2]):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else _format_number(float(bound))
+                    lines.append(f'{name}_bucket{_format_labels(labels, [("le", le)])} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {_format_number(float(value[-2]))}')
+                lines.append(f'{name}_count{_format_labels(labels)} {value[-1]}')
+            else:
+                lines.append(f'{name}{_format_labels(labels)} {_format_number(value)}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,83 @@
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from . import metrics
+
+# Queries of the current request. Under ASGI the ORM runs in a worker thread
+# with its own connection, so the counter travels with the request context
+# rather than being attached to one connection.
+_request_queries = ContextVar('request_queries', default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    counter = _request_queries.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+@receiver(connection_created, dispatch_uid='metrics-count-queries')
+def install_query_counter(sender, connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+class MetricsMiddleware:
+    """Records latency and query count per URL name for the /metrics endpoint."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # This thread's connection may predate the middleware being loaded
+        install_query_counter(None, connection)
+        counter = [0]
+        token = _request_queries.set(counter)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self._record(request, response, time.perf_counter() - start, counter[0])
+        return response
+
+    async def __acall__(self, request):
+        counter = [0]
+        token = _request_queries.set(counter)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self._record(request, response, time.perf_counter() - start, counter[0])
+        return response
+
+    def _record(self, request, response, duration, queries):
+        view = self._view_name(request)
+        metrics.inc('inventory_http_requests_total', view=view,
+                    method=request.method, status=response.status_code)
+        metrics.observe('inventory_http_request_duration_seconds', duration, view=view)
+        metrics.observe('inventory_db_queries_per_request', queries, view=view)
+        # Rate-limited to one small file write per METRICS_FLUSH_INTERVAL
+        metrics.flush()
+
+    @staticmethod
+    def _view_name(request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'unmatched'
+        # Admin and other namespaced URLs are grouped by namespace to keep label cardinality bounded
+        if match.namespace:
+            return match.namespace
+        return match.url_name or 'unnamed'
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.15 on 2026-10-19 06:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0004_low_stock_flag'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductClassification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('abc_class', models.CharField(choices=[('A', 'A - top revenue'), ('B', 'B - middle revenue'), ('C', 'C - long tail')], db_index=True, max_length=1)),
+                ('rank', models.PositiveIntegerField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('quantity_sold', models.IntegerField(default=0)),
+                ('revenue_share', models.FloatField(default=0)),
+                ('cumulative_share', models.FloatField(default=0)),
+                ('period_start', models.DateField()),
+                ('period_end', models.DateField()),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='classification', to='apps.product')),
+            ],
+            options={
+                'ordering': ['rank'],
+            },
+        ),
+    ]
@@ -0,0 +1,148 @@
+# Generated by Django 5.1.15 on 2026-10-19 06:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, F, OuterRef, Subquery, Sum, When
+
+
+def record_opening_stock(apps, location):
+    # Stock added by creating or editing a product never reached the ledger:
+    # record what the ledger misses of each level as an opening adjustment,
+    # dated when the product was created, so the ledger adds up to the level
+    Product = apps.get_model('apps', 'Product')
+    StockLevel = apps.get_model('apps', 'StockLevel')
+    StockTransaction = apps.get_model('apps', 'StockTransaction')
+    signed = Case(When(transaction_type='out', then=-F('quantity')), default=F('quantity'))
+    ledger = dict(StockTransaction.objects.filter(location=location).values('product_id')
+                  .annotate(net=Sum(signed)).order_by().values_list('product_id', 'net'))
+
+    openings = []
+    for product_id, quantity in (StockLevel.objects.filter(location=location)
+                                 .values_list('product_id', 'quantity').iterator(chunk_size=2000)):
+        opening = quantity - (ledger.get(product_id) or 0)
+        if opening:
+            openings.append(StockTransaction(product_id=product_id, location=location, transaction_type='adjust',
+                                             quantity=opening, reference='Opening stock'))
+    StockTransaction.objects.bulk_create(openings, batch_size=1000)
+    # created_at is auto_now_add, so it is set afterwards
+    StockTransaction.objects.filter(location=location, transaction_type='adjust', reference='Opening stock').update(
+        created_at=Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('created_at')))
+
+
+def create_default_location(apps, schema_editor):
+    # Everything so far happened at one store: make it the default location,
+    # give it each product's current quantity and file the history under it
+    Location = apps.get_model('apps', 'Location')
+    Product = apps.get_model('apps', 'Product')
+    StockLevel = apps.get_model('apps', 'StockLevel')
+    location = Location.objects.create(name='Main Store', code='MAIN', is_default=True)
+
+    levels = []
+    for product_id, quantity in Product.objects.values_list('id', 'quantity').iterator(chunk_size=2000):
+        levels.append(StockLevel(product_id=product_id, location=location, quantity=quantity))
+        if len(levels) >= 1000:
+            StockLevel.objects.bulk_create(levels)
+            levels = []
+    StockLevel.objects.bulk_create(levels)
+
+    for name in ('Sale', 'StockTransaction', 'StockTake'):
+        apps.get_model('apps', name).objects.update(location=location)
+    record_opening_stock(apps, location)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0009_dashboardevent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockLevel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('code', models.CharField(max_length=20, unique=True)),
+                ('address', models.TextField(blank=True)),
+                ('is_default', models.BooleanField(default=False)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['name'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('is_default', True)), fields=('is_default',), name='single_default_location')],
+            },
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='location',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='sales', to='apps.location'),
+        ),
+        migrations.AddField(
+            model_name='stocktake',
+            name='location',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='stock_takes', to='apps.location'),
+        ),
+        migrations.AddField(
+            model_name='stocktransaction',
+            name='location',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='stock_transactions', to='apps.location'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='location',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='apps.location'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['location', 'created_at'], name='sale_location_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stocktransaction',
+            index=models.Index(fields=['created_at'], name='stocktx_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stocktransaction',
+            index=models.Index(fields=['location', 'created_at'], name='stocktx_location_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='stocklevel',
+            name='location',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='stock_levels', to='apps.location'),
+        ),
+        migrations.AddField(
+            model_name='stocklevel',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_levels', to='apps.product'),
+        ),
+        migrations.AddConstraint(
+            model_name='stocklevel',
+            constraint=models.UniqueConstraint(fields=('location', 'product'), name='unique_stock_level'),
+        ),
+        migrations.RunPython(create_default_location, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='sale',
+            name='location',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='sales', to='apps.location'),
+        ),
+        migrations.AlterField(
+            model_name='stocktake',
+            name='location',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='stock_takes', to='apps.location'),
+        ),
+        migrations.AlterField(
+            model_name='stocktransaction',
+            name='location',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='stock_transactions', to='apps.location'),
+        ),
+    ]
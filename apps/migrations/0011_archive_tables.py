@@ -0,0 +1,83 @@
+# Generated by Django 5.1.15 on 2026-10-19 06:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0010_locations'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cutoff', models.DateTimeField(unique=True)),
+                ('sales', models.IntegerField(default=0)),
+                ('movements', models.IntegerField(default=0)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-cutoff'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedSale',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('invoice_number', models.CharField(max_length=50, unique=True)),
+                ('customer_name', models.CharField(blank=True, max_length=200)),
+                ('customer_phone', models.CharField(blank=True, max_length=20)),
+                ('items', models.JSONField()),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('payment_method', models.CharField(choices=[('cash', 'Cash'), ('card', 'Card'), ('transfer', 'Bank Transfer'), ('credit', 'Credit')], max_length=20)),
+                ('payment_status', models.BooleanField(default=True)),
+                ('idempotency_key', models.CharField(blank=True, max_length=64, null=True, unique=True)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_sales', to=settings.AUTH_USER_MODEL)),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_sales', to='apps.location')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='archsale_created_idx'), models.Index(fields=['location', 'created_at'], name='archsale_location_created_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedStockTransaction',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('transaction_type', models.CharField(choices=[('in', 'Stock In'), ('out', 'Stock Out'), ('adjust', 'Adjustment')], max_length=20)),
+                ('quantity', models.IntegerField()),
+                ('reference', models.CharField(blank=True, max_length=100)),
+                ('notes', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_transactions', to=settings.AUTH_USER_MODEL)),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_transactions', to='apps.location')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_transactions', to='apps.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='archtx_created_idx'), models.Index(fields=['location', 'created_at'], name='archtx_location_created_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('sale', 'Sales'), ('in', 'Stock In'), ('out', 'Stock Out'), ('adjust', 'Adjustment')], max_length=20)),
+                ('row_count', models.IntegerField(default=0)),
+                ('quantity', models.BigIntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_totals', to='apps.location')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('location', 'kind'), name='unique_archived_total')],
+            },
+        ),
+    ]
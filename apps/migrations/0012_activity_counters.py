@@ -0,0 +1,57 @@
+# Generated by Django 5.1.15 on 2026-10-19 06:32
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_existing_activity(apps, schema_editor):
+    # Start the counters from the rows already there. Profiles were created
+    # on the first profile page visit, so add the missing ones first
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    UserProfile = apps.get_model('apps', 'UserProfile')
+    UserProfile.objects.bulk_create([
+        UserProfile(user_id=pk)
+        for pk in User.objects.exclude(pk__in=UserProfile.objects.values('user_id')).values_list('pk', flat=True)
+    ])
+
+    def created_by_user(name):
+        model = apps.get_model('apps', name)
+        return Coalesce(Subquery(
+            model.objects.filter(created_by=OuterRef('user_id')).order_by()
+            .values('created_by').annotate(count=Count('id')).values('count')
+        ), 0)
+
+    UserProfile.objects.update(
+        sales_count=created_by_user('Sale') + created_by_user('ArchivedSale'),
+        products_count=created_by_user('Product'),
+        transactions_count=created_by_user('StockTransaction') + created_by_user('ArchivedStockTransaction'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0011_archive_tables'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='products_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='sales_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='transactions_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_existing_activity, migrations.RunPython.noop),
+    ]
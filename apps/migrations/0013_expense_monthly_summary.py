@@ -0,0 +1,44 @@
+# Generated by Django 5.1.15 on 2026-10-19 06:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def summarize_expenses(apps, schema_editor):
+    Expense = apps.get_model('apps', 'Expense')
+    ExpenseMonthlySummary = apps.get_model('apps', 'ExpenseMonthlySummary')
+    rows = (
+        Expense.objects.annotate(month=TruncMonth('date'))
+        .values('month', 'category_id', 'expense_type', 'payment_method')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+    ExpenseMonthlySummary.objects.bulk_create([ExpenseMonthlySummary(**row) for row in rows], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0012_activity_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpenseMonthlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('expense_type', models.CharField(max_length=50)),
+                ('payment_method', models.CharField(max_length=50)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='monthly_summaries', to='apps.expensecategory')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('month', 'category', 'expense_type', 'payment_method'), name='unique_expense_summary'), models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('month', 'expense_type', 'payment_method'), name='unique_uncategorized_expense_summary')],
+            },
+        ),
+        migrations.RunPython(summarize_expenses, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.15 on 2026-10-19 07:03
+
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0016_task_queue'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(django.db.models.functions.comparison.Collate('name', 'NOCASE'), name='product_name_nocase_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(django.db.models.functions.comparison.Collate('sku', 'NOCASE'), name='product_sku_nocase_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.15 on 2026-10-19 07:03
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0017_product_search_nocase_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='stocksnapshot',
+            name='period',
+        ),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Collate
 from django.contrib.auth.models import User
 from django.utils import timezone
 
@@ -24,8 +25,10 @@ class Product(models.Model):
         ('box', 'Box'),
     ]
     
-    name = models.CharField(max_length=200)
+    name = models.CharField(max_length=200, db_index=True)
     sku = models.CharField(max_length=50, unique=True)
+    # Null rather than blank when unset, so the unique constraint allows many
+    barcode = models.CharField(max_length=64, unique=True, null=True, blank=True)
     description = models.TextField(blank=True)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True)
     unit = models.CharField(max_length=20, choices=UNIT_CHOICES, default='piece')
@@ -33,21 +36,94 @@ class Product(models.Model):
     cost_price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.IntegerField(default=0)
     reorder_level = models.IntegerField(default=10)
+    # Maintained on save so low stock can be found through an index instead
+    # of comparing quantity with reorder_level row by row
+    is_low_stock = models.BooleanField(default=False, editable=False)
     image = models.ImageField(upload_to='products/', blank=True, null=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_low_stock', 'quantity'], name='product_low_stock_idx'),
+            # SQLite's LIKE ignores ASCII case, so only NOCASE indexes can
+            # serve the prefix search (product_search_api)
+            models.Index(Collate('name', 'NOCASE'), name='product_name_nocase_idx'),
+            models.Index(Collate('sku', 'NOCASE'), name='product_sku_nocase_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.name} ({self.sku})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_low_stock = instance.__dict__.get('is_low_stock')
+        return instance
+    
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        was_low = getattr(self, '_loaded_low_stock', None)
+        self.is_low_stock = self.quantity <= self.reorder_level
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'quantity', 'reorder_level'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'is_low_stock'}
+        super().save(*args, **kwargs)
+        
+        if (adding and self.is_low_stock) or (was_low is not None and was_low != self.is_low_stock):
+            LowStockAlert.objects.create(
+                product=self,
+                is_low=self.is_low_stock,
+                quantity=self.quantity,
+                reorder_level=self.reorder_level,
+            )
+        self._loaded_low_stock = self.is_low_stock
+    
     @property
     def total_value(self):
         return self.quantity * self.cost_price
-    
-    @property
-    def is_low_stock(self):
-        return self.quantity <= self.reorder_level
+
+class Location(models.Model):
+    """A branch or warehouse that holds its own stock."""
+    name = models.CharField(max_length=100, unique=True)
+    code = models.CharField(max_length=20, unique=True)
+    address = models.TextField(blank=True)
+    # Where stock goes when no location is given, e.g. the original single store
+    is_default = models.BooleanField(default=False)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def get_default(cls):
+        return cls.objects.filter(is_default=True).first() or cls.objects.order_by('id').first()
+
+    class Meta:
+        ordering = ['name']
+        constraints = [
+            models.UniqueConstraint(fields=['is_default'], condition=models.Q(is_default=True),
+                                    name='single_default_location'),
+        ]
+
+class StockLevel(models.Model):
+    # Quantity of a product at one location. Product.quantity is the total
+    # over all locations, recomputed by the stock service after each change.
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_levels')
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='stock_levels')
+    quantity = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.product.name} @ {self.location.name}: {self.quantity}"
+
+    class Meta:
+        constraints = [
+            # Location first, so a branch's rows are one range of the index
+            models.UniqueConstraint(fields=['location', 'product'], name='unique_stock_level'),
+        ]
 
 class Supplier(models.Model):
     name = models.CharField(max_length=200)
@@ -68,6 +144,7 @@ class StockTransaction(models.Model):
     ]
     
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='stock_transactions')
     transaction_type = models.CharField(max_length=20, choices=TRANSACTION_TYPES)
     quantity = models.IntegerField()
     reference = models.CharField(max_length=100, blank=True)
@@ -77,6 +154,12 @@ class StockTransaction(models.Model):
     
     def __str__(self):
         return f"{self.transaction_type} - {self.product.name} ({self.quantity})"
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='stocktx_created_idx'),
+            models.Index(fields=['location', 'created_at'], name='stocktx_location_created_idx'),
+        ]
 
 class Sale(models.Model):
     PAYMENT_METHODS = [
@@ -93,23 +176,50 @@ class Sale(models.Model):
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHODS)
     payment_status = models.BooleanField(default=True)
+    # Client-generated key so a retried submission can't record the sale twice
+    idempotency_key = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='sales')
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
         return self.invoice_number
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['location', 'created_at'], name='sale_location_created_idx'),
+        ]
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     phone = models.CharField(max_length=20, blank=True)
     address = models.TextField(blank=True)
     role = models.CharField(max_length=50, default='staff')
+    # Branch the user works at; their sales and stock forms default to it
+    location = models.ForeignKey(Location, on_delete=models.SET_NULL, null=True, blank=True)
     profile_picture = models.ImageField(upload_to='profiles/', blank=True, null=True)
+    # Rows created_by this user, kept by the writes themselves (see
+    # services.count_activity); reconcile_activity recomputes them
+    sales_count = models.IntegerField(default=0)
+    products_count = models.IntegerField(default=0)
+    transactions_count = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    ACTIVITY_FIELDS = ('sales_count', 'products_count', 'transactions_count')
     
     def __str__(self):
         return self.user.username
 
+    def save(self, *args, **kwargs):
+        # The counters only change through F() updates: saving a profile
+        # loaded earlier (profile form, admin) must not write them back
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.ACTIVITY_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 
 # Add these models to your existing models.py
@@ -159,9 +269,76 @@ class Expense(models.Model):
     def __str__(self):
         return f"{self.description} - TZS{self.amount}"
     
+    def summary_key(self):
+        return (self.date.replace(day=1), self.category_id, self.expense_type, self.payment_method)
+    
+    def save(self, *args, **kwargs):
+        # Move the amount between ExpenseMonthlySummary rows in the same
+        # transaction, reading the stored row so a stale instance can't
+        # subtract values that were already changed
+        with transaction.atomic():
+            old = None
+            if not self._state.adding:
+                old = Expense.objects.select_for_update().filter(pk=self.pk).values_list(
+                    'date', 'category_id', 'expense_type', 'payment_method', 'amount').first()
+            super().save(*args, **kwargs)
+            key = self.summary_key()
+            if old is None:
+                ExpenseMonthlySummary.add(key, self.amount, 1)
+                return
+            old_key = (old[0].replace(day=1),) + old[1:4]
+            if old_key == key:
+                ExpenseMonthlySummary.add(key, self.amount - old[4], 0)
+            else:
+                ExpenseMonthlySummary.add(old_key, -old[4], -1)
+                ExpenseMonthlySummary.add(key, self.amount, 1)
+    
     class Meta:
         ordering = ['-date', '-created_at']
 
+
+class ExpenseMonthlySummary(models.Model):
+    """
+    Expense totals per month, category, type and payment method.
+
+    Kept by Expense.save and the Expense post_delete receiver; expense reports
+    read whole months from here (see expense_summary.py). QuerySet.update()
+    on expenses bypasses it: run rebuild_expense_summary after one.
+    """
+    month = models.DateField()
+    category = models.ForeignKey(ExpenseCategory, on_delete=models.CASCADE, null=True, related_name='monthly_summaries')
+    expense_type = models.CharField(max_length=50)
+    payment_method = models.CharField(max_length=50)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['month', 'category', 'expense_type', 'payment_method'],
+                                    name='unique_expense_summary'),
+            # NULLs are distinct in the constraint above
+            models.UniqueConstraint(fields=['month', 'expense_type', 'payment_method'],
+                                    condition=models.Q(category__isnull=True),
+                                    name='unique_uncategorized_expense_summary'),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%b %Y} {self.category or 'Uncategorized'} {self.expense_type}/{self.payment_method}"
+
+    @classmethod
+    def add(cls, key, amount, count):
+        """Add ``amount`` and ``count`` to the row for key (month, category_id, expense_type, payment_method)."""
+        month, category_id, expense_type, payment_method = key
+        rows = cls.objects.filter(month=month, category_id=category_id,
+                                  expense_type=expense_type, payment_method=payment_method)
+        changes = {'total': models.F('total') + amount, 'count': models.F('count') + count}
+        if not rows.update(**changes):
+            cls.objects.get_or_create(month=month, category_id=category_id,
+                                      expense_type=expense_type, payment_method=payment_method)
+            rows.update(**changes)
+        if count < 0:
+            rows.filter(count=0).delete()
+
 class ProfitLossReport(models.Model):
     REPORT_PERIODS = [
         ('daily', 'Daily'),
@@ -188,4 +365,259 @@ class ProfitLossReport(models.Model):
         return f"PL Report {self.start_date} to {self.end_date}"
     
     class Meta:
-        ordering = ['-start_date']
\ No newline at end of file
+        ordering = ['-start_date']
+
+class StockSnapshot(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='snapshots')
+    date = models.DateField()  # closing quantity at the end of this day
+    quantity = models.IntegerField()
+    cost_price = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.product.name} @ {self.date}: {self.quantity}"
+
+    @property
+    def total_value(self):
+        return self.quantity * self.cost_price
+
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'date'], name='unique_product_snapshot_date'),
+        ]
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+
+
+
+class LowStockAlert(models.Model):
+    # One row per transition: is_low=True when a product drops to its reorder
+    # level, False when it is restocked above it
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='low_stock_alerts')
+    is_low = models.BooleanField()
+    quantity = models.IntegerField()
+    reorder_level = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        state = 'low' if self.is_low else 'restocked'
+        return f"{self.product.name} {state} ({self.quantity}/{self.reorder_level})"
+
+    class Meta:
+        ordering = ['-id']
+
+
+class ProductClassification(models.Model):
+    ABC_CLASSES = [
+        ('A', 'A - top revenue'),
+        ('B', 'B - middle revenue'),
+        ('C', 'C - long tail'),
+    ]
+
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='classification')
+    abc_class = models.CharField(max_length=1, choices=ABC_CLASSES, db_index=True)
+    rank = models.PositiveIntegerField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    quantity_sold = models.IntegerField(default=0)
+    revenue_share = models.FloatField(default=0)
+    cumulative_share = models.FloatField(default=0)
+    period_start = models.DateField()
+    period_end = models.DateField()
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.product.name}: {self.abc_class}"
+
+    class Meta:
+        ordering = ['rank']
+
+
+class StockTake(models.Model):
+    STATUS_CHOICES = [
+        ('draft', 'Draft'),
+        ('applied', 'Applied'),
+    ]
+
+    reference = models.CharField(max_length=100, blank=True)
+    notes = models.TextField(blank=True)
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='stock_takes')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='stock_takes')
+    created_at = models.DateTimeField(auto_now_add=True)
+    applied_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='applied_stock_takes')
+    applied_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.reference or f"Stock take #{self.pk}"
+
+    class Meta:
+        ordering = ['-created_at']
+
+
+class StockTakeLine(models.Model):
+    stock_take = models.ForeignKey(StockTake, on_delete=models.CASCADE, related_name='lines')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    counted_quantity = models.IntegerField()
+    # System quantity at the take's location when the count was entered,
+    # refreshed when it is applied
+    expected_quantity = models.IntegerField()
+    variance = models.IntegerField()
+    cost_price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.product.name}: {self.counted_quantity} counted"
+
+    @property
+    def variance_value(self):
+        return self.variance * self.cost_price
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['stock_take', 'product'], name='unique_stock_take_product'),
+        ]
+
+
+class DashboardEvent(models.Model):
+    """A change pushed to open dashboards; the payload is computed once when it is recorded."""
+    KINDS = [
+        ('sale', 'Sale'),
+        ('stock', 'Stock movement'),
+        ('low_stock', 'Low stock change'),
+        ('expense', 'Expense'),
+        ('snapshot', 'Snapshot'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KINDS)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk}"
+
+    class Meta:
+        ordering = ['id']
+
+
+class Task(models.Model):
+    """Work queued to run after the request, by the run_tasks worker (see tasks.py)."""
+    STATUSES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    name = models.CharField(max_length=200)
+    kwargs = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUSES, default='pending')
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='task_due_idx'),
+        ]
+
+
+class ProductTombstone(models.Model):
+    """Left behind by a deleted product so catalogue clients syncing changes drop it too."""
+    product_id = models.IntegerField()
+    sku = models.CharField(max_length=50)
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.sku} deleted {self.deleted_at:%Y-%m-%d %H:%M}"
+
+
+class ArchiveRun(models.Model):
+    """Rows created before ``cutoff`` are in the archive tables; recorded before any row moves."""
+    cutoff = models.DateTimeField(unique=True)
+    sales = models.IntegerField(default=0)
+    movements = models.IntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Archive before {self.cutoff:%Y-%m-%d}"
+
+    class Meta:
+        ordering = ['-cutoff']
+
+
+class ArchivedSale(models.Model):
+    # Same columns as Sale; ids are kept so links to old sales still resolve
+    id = models.BigIntegerField(primary_key=True)
+    invoice_number = models.CharField(max_length=50, unique=True)
+    customer_name = models.CharField(max_length=200, blank=True)
+    customer_phone = models.CharField(max_length=20, blank=True)
+    items = models.JSONField()
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    payment_method = models.CharField(max_length=20, choices=Sale.PAYMENT_METHODS)
+    payment_status = models.BooleanField(default=True)
+    idempotency_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='archived_sales')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='archived_sales')
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.invoice_number
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='archsale_created_idx'),
+            models.Index(fields=['location', 'created_at'], name='archsale_location_created_idx'),
+        ]
+
+
+class ArchivedStockTransaction(models.Model):
+    # Same columns as StockTransaction, ids kept
+    id = models.BigIntegerField(primary_key=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='archived_transactions')
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='archived_transactions')
+    transaction_type = models.CharField(max_length=20, choices=StockTransaction.TRANSACTION_TYPES)
+    quantity = models.IntegerField()
+    reference = models.CharField(max_length=100, blank=True)
+    notes = models.TextField(blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='archived_transactions')
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.transaction_type} - {self.product.name} ({self.quantity})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='archtx_created_idx'),
+            models.Index(fields=['location', 'created_at'], name='archtx_location_created_idx'),
+        ]
+
+
+class ArchivedTotal(models.Model):
+    # Running totals of everything archived per location, so all-time figures
+    # don't have to read the archive tables
+    KINDS = [('sale', 'Sales')] + StockTransaction.TRANSACTION_TYPES
+
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='archived_totals')
+    kind = models.CharField(max_length=20, choices=KINDS)
+    row_count = models.IntegerField(default=0)
+    quantity = models.BigIntegerField(default=0)
+    amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.location.name} {self.kind}: {self.row_count}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['location', 'kind'], name='unique_archived_total'),
+        ]
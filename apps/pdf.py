@@ -0,0 +1,216 @@
+"""
+A small pure-Python PDF writer for invoices.
+
+Uses only the standard Helvetica fonts, which every PDF reader has, so
+nothing is embedded and no third-party library is needed. The module does
+not import Django: ``render_invoice`` takes a plain dict and returns bytes,
+so it can run in worker processes (see invoices.py).
+"""
+import zlib
+from decimal import Decimal
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+MARGIN = 50
+NAVY = (0.102, 0.137, 0.494)
+GREY = (0.4, 0.4, 0.4)
+LIGHT = (0.973, 0.976, 0.98)
+RULE = (0.871, 0.886, 0.902)
+
+# Advance widths (1/1000 em) of characters 32-126, from the Adobe AFM files
+HELVETICA = (
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+)
+HELVETICA_BOLD = (
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+)
+
+
+def text_width(text, size, bold=False):
+    widths = HELVETICA_BOLD if bold else HELVETICA
+    return sum(widths[ord(char) - 32] if 32 <= ord(char) < 127 else 556 for char in text) * size / 1000
+
+
+def fit(text, width, size, bold=False):
+    """``text`` cut down with an ellipsis to at most ``width`` points."""
+    if text_width(text, size, bold) <= width:
+        return text
+    while text and text_width(text + '...', size, bold) > width:
+        text = text[:-1]
+    return text + '...'
+
+
+def _pdf_string(text):
+    data = str(text).encode('cp1252', errors='replace')
+    return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+class Page:
+    """Drawing operations for one page, in points from the bottom left."""
+
+    def __init__(self):
+        self.ops = []
+
+    def text(self, x, y, text, size=10, bold=False, color=(0, 0, 0), align='left'):
+        text = str(text)
+        if align == 'right':
+            x -= text_width(text, size, bold)
+        elif align == 'center':
+            x -= text_width(text, size, bold) / 2
+        self.ops.append(b'BT /%s %d Tf %.3f %.3f %.3f rg %.2f %.2f Td %s Tj ET' % (
+            b'F2' if bold else b'F1', size, *color, x, y, _pdf_string(text)))
+
+    def rect(self, x, y, width, height, color):
+        self.ops.append(b'%.3f %.3f %.3f rg %.2f %.2f %.2f %.2f re f' % (*color, x, y, width, height))
+
+    def line(self, x1, y1, x2, y2, color=RULE, width=1):
+        self.ops.append(b'%.3f %.3f %.3f RG %.2f w %.2f %.2f m %.2f %.2f l S' % (*color, width, x1, y1, x2, y2))
+
+    def stream(self):
+        return zlib.compress(b'\n'.join(self.ops))
+
+
+def build_pdf(pages, title=''):
+    """Assemble pages into a complete PDF file."""
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        None,  # page tree, filled in below
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+        b'<< /Title %s /Producer (Inventory System) >>' % _pdf_string(title),
+    ]
+    kids = []
+    for page in pages:
+        stream = page.stream()
+        objects.append(b'<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream' % (len(stream), stream))
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R '
+            b'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> >>' % (PAGE_WIDTH, PAGE_HEIGHT, len(objects)))
+        kids.append(b'%d 0 R' % len(objects))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(kids), len(kids))
+
+    out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        out += b'%010d 00000 n \n' % offset
+    out += b'trailer\n<< /Size %d /Root 1 0 R /Info 5 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def money(value):
+    return f'TZS {Decimal(str(value)):.2f}'
+
+
+# Invoice layout: table columns as (heading, x, align)
+COLUMNS = (('#', MARGIN + 6, 'left'), ('Product', MARGIN + 30, 'left'), ('Qty', 360, 'right'),
+           ('Unit Price', 455, 'right'), ('Total', PAGE_WIDTH - MARGIN - 6, 'right'))
+ROW_HEIGHT = 20
+FOOTER_SPACE = 70
+TOTALS_SPACE = 80
+
+
+def _table_header(page, y):
+    page.rect(MARGIN, y - 6, PAGE_WIDTH - 2 * MARGIN, ROW_HEIGHT, NAVY)
+    for heading, x, align in COLUMNS:
+        page.text(x, y, heading, size=10, bold=True, color=(1, 1, 1), align=align)
+    return y - ROW_HEIGHT
+
+
+def _footer(page, number, count):
+    page.line(MARGIN, FOOTER_SPACE - 10, PAGE_WIDTH - MARGIN, FOOTER_SPACE - 10)
+    page.text(PAGE_WIDTH / 2, FOOTER_SPACE - 28,
+              'Inventory Management System | Oasis Office Park | P.O.BOX 5591 | Phone: +255 757 823 982',
+              size=8, color=GREY, align='center')
+    page.text(PAGE_WIDTH / 2, FOOTER_SPACE - 40, 'Thank you for your business!', size=8, color=GREY, align='center')
+    if count > 1:
+        page.text(PAGE_WIDTH - MARGIN, FOOTER_SPACE - 52, f'Page {number} of {count}', size=8, color=GREY, align='right')
+
+
+def render_invoice(invoice):
+    """
+    One sale's invoice as PDF bytes.
+
+    ``invoice`` is a dict with invoice_number, date, time, long_date,
+    customer_name, customer_phone, cashier, payment_method, paid,
+    location, total_amount and items (product_name, quantity, price, total).
+    """
+    page = Page()
+    pages = [page]
+    top = PAGE_HEIGHT - MARGIN
+
+    page.text(MARGIN, top - 24, 'INVOICE', size=26, bold=True, color=NAVY)
+    page.text(MARGIN, top - 42, 'Generated automatically from Inventory System', size=10, color=GREY)
+    box_x = PAGE_WIDTH - MARGIN - 190
+    page.rect(box_x, top - 62, 190, 66, LIGHT)
+    page.rect(box_x, top - 62, 3, 66, NAVY)
+    for offset, (label, value) in enumerate((('Invoice #:', invoice['invoice_number']),
+                                             ('Date:', invoice['date']), ('Time:', invoice['time']))):
+        y = top - 12 - offset * 18
+        page.text(box_x + 12, y, label, size=10, bold=True)
+        page.text(PAGE_WIDTH - MARGIN - 10, y, value, size=10, align='right')
+    page.line(MARGIN, top - 76, PAGE_WIDTH - MARGIN, top - 76, color=NAVY, width=2)
+
+    y = top - 100
+    page.text(MARGIN, y, 'Customer Details', size=11, bold=True, color=NAVY)
+    page.text(PAGE_WIDTH / 2 + 10, y, 'Sale Information', size=11, bold=True, color=NAVY)
+    customer = [('Name:', invoice['customer_name'] or 'Walk-in Customer')]
+    if invoice['customer_phone']:
+        customer.append(('Phone:', invoice['customer_phone']))
+    customer.append(('Invoice Date:', invoice['long_date']))
+    sale_info = [('Sold By:', invoice['cashier']), ('Payment Method:', invoice['payment_method']),
+                 ('Status:', 'PAID' if invoice['paid'] else 'UNPAID')]
+    if invoice.get('location'):
+        sale_info.append(('Location:', invoice['location']))
+    for column_x, rows in ((MARGIN, customer), (PAGE_WIDTH / 2 + 10, sale_info)):
+        row_y = y - 18
+        for label, value in rows:
+            page.text(column_x, row_y, label, size=10, bold=True)
+            value_x = column_x + text_width(label, 10, bold=True) + 5
+            page.text(value_x, row_y, fit(str(value), PAGE_WIDTH / 2 - 70, 10), size=10)
+            row_y -= 15
+
+    y = _table_header(page, y - 100)
+    product_width = COLUMNS[2][1] - COLUMNS[1][1] - 40
+    for index, item in enumerate(invoice['items'], start=1):
+        if y < FOOTER_SPACE + ROW_HEIGHT:
+            page = Page()
+            pages.append(page)
+            y = _table_header(page, top - 20)
+        page.text(COLUMNS[0][1], y, str(index), size=10)
+        page.text(COLUMNS[1][1], y, fit(str(item['product_name']), product_width, 10), size=10)
+        page.text(COLUMNS[2][1], y, str(item['quantity']), size=10, align='right')
+        page.text(COLUMNS[3][1], y, money(item['price']), size=10, align='right')
+        page.text(COLUMNS[4][1], y, money(item['total']), size=10, align='right')
+        page.line(MARGIN, y - 6, PAGE_WIDTH - MARGIN, y - 6)
+        y -= ROW_HEIGHT
+
+    if y < FOOTER_SPACE + TOTALS_SPACE:
+        page = Page()
+        pages.append(page)
+        y = top - 20
+    page.line(MARGIN, y + 14, PAGE_WIDTH - MARGIN, y + 14, color=NAVY, width=2)
+    for label, value, size in (('Subtotal:', money(invoice['total_amount']), 10), ('Tax (0%):', money(0), 10),
+                               ('TOTAL:', money(invoice['total_amount']), 13)):
+        y -= 4
+        page.text(COLUMNS[3][1], y, label, size=size, bold=True, align='right')
+        page.text(COLUMNS[4][1], y, value, size=size, bold=size > 10, color=NAVY if size > 10 else (0, 0, 0),
+                  align='right')
+        y -= 16
+
+    for number, each in enumerate(pages, start=1):
+        _footer(each, number, len(pages))
+    return build_pdf(pages, title=f"Invoice {invoice['invoice_number']}")
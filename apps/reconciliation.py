@@ -0,0 +1,137 @@
+"""
+Stock ledger reconciliation.
+
+Each stock level should equal the net of its ledger rows, hot and archived,
+and Product.quantity the sum of its levels. The stock service keeps them in
+step, but admin edits of a product's quantity or of a ledger row leave them
+apart, as do products whose opening stock predates it being recorded in the
+ledger. ``find_drift`` compares the whole catalogue in NumPy arrays built
+from grouped queries: the database sums the ledger, so memory grows with the
+number of stock levels, not with the number of ledger rows.
+"""
+import numpy as np
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .archive import ledger_sources
+from .models import Product, StockLevel
+from .services import BULK_BATCH_SIZE, sync_product_totals
+from .valuation import signed_quantity
+
+CHUNK_SIZE = 5000
+# Levels are keyed product_id << LOCATION_BITS | location_id in one int64
+LOCATION_BITS = 20
+LOCATION_MASK = (1 << LOCATION_BITS) - 1
+
+
+def _columns(rows, width):
+    data = np.fromiter((value or 0 for row in rows for value in row), dtype=np.int64)
+    return data.reshape(-1, width).T
+
+
+def _keyed(rows):
+    product_ids, location_ids, quantities = _columns(rows, 3)
+    return (product_ids << LOCATION_BITS) | location_ids, quantities
+
+
+def _summed(keys, quantities):
+    # Adds up the quantities of repeated keys; returns sorted unique keys
+    unique, inverse = np.unique(keys, return_inverse=True)
+    totals = np.zeros(len(unique), dtype=np.int64)
+    np.add.at(totals, inverse, quantities)
+    return unique, totals
+
+
+def _spread(keys, values, onto):
+    # ``values`` placed at the positions of ``keys`` in the sorted array ``onto``; zero elsewhere
+    out = np.zeros(len(onto), dtype=np.int64)
+    out[np.searchsorted(onto, keys)] = values
+    return out
+
+
+def ledger_totals(product_ids=None):
+    """(keys, quantities): the net ledger quantity of each product at each location."""
+    parts = []
+    for ledger in ledger_sources():
+        if product_ids is not None:
+            ledger = ledger.filter(product_id__in=product_ids)
+        rows = (ledger.values('product_id', 'location_id').annotate(total=Sum(signed_quantity()))
+                .order_by().values_list('product_id', 'location_id', 'total'))
+        parts.append(_keyed(rows.iterator(chunk_size=CHUNK_SIZE)))
+    return _summed(np.concatenate([keys for keys, _ in parts]), np.concatenate([totals for _, totals in parts]))
+
+
+def stored_levels():
+    rows = StockLevel.objects.order_by().values_list('product_id', 'location_id', 'quantity')
+    return _summed(*_keyed(rows.iterator(chunk_size=CHUNK_SIZE)))
+
+
+def find_drift():
+    """
+    Stock levels that differ from the ledger and product totals that differ from their levels.
+
+    Returns ``{'levels': [(product_id, location_id, stored, ledger)],
+    'products': [(product_id, stored, sum_of_levels)]}``, largest drift first.
+    """
+    if StockLevel.objects.filter(location_id__gt=LOCATION_MASK).exists():
+        raise ValueError(f'Location ids above {LOCATION_MASK} are not supported')
+    ledger_keys, ledger = ledger_totals()
+    level_keys, stored = stored_levels()
+
+    keys = np.union1d(ledger_keys, level_keys)
+    expected = _spread(ledger_keys, ledger, keys)
+    actual = _spread(level_keys, stored, keys)
+    drifting = np.flatnonzero(expected != actual)
+    drifting = drifting[np.argsort(-np.abs(actual[drifting] - expected[drifting]), kind='stable')]
+
+    # Product totals against the levels as stored
+    level_products, level_sums = _summed(level_keys >> LOCATION_BITS, stored)
+    product_ids, quantities = _columns(Product.objects.order_by('id').values_list('id', 'quantity')
+                                       .iterator(chunk_size=CHUNK_SIZE), 2)
+    known = np.isin(level_products, product_ids)
+    sums = _spread(level_products[known], level_sums[known], product_ids)
+    off = np.flatnonzero(quantities != sums)
+    off = off[np.argsort(-np.abs(quantities[off] - sums[off]), kind='stable')]
+
+    return {
+        'levels': list(zip((keys[drifting] >> LOCATION_BITS).tolist(), (keys[drifting] & LOCATION_MASK).tolist(),
+                           actual[drifting].tolist(), expected[drifting].tolist())),
+        'products': list(zip(product_ids[off].tolist(), quantities[off].tolist(), sums[off].tolist())),
+    }
+
+
+def fix_drift(drift):
+    """
+    Set the stock levels of the drifting products to their ledger totals.
+
+    Each batch of products is locked and compared again first, so movements
+    recorded since ``find_drift`` are kept. Product totals are then
+    recomputed. Returns the number of levels written.
+    """
+    product_ids = sorted({row[0] for row in drift['levels']})
+    written = 0
+    now = timezone.now()
+    with transaction.atomic():
+        for start in range(0, len(product_ids), BULK_BATCH_SIZE):
+            ids = product_ids[start:start + BULK_BATCH_SIZE]
+            levels = {(level.product_id, level.location_id): level
+                      for level in StockLevel.objects.select_for_update().filter(product_id__in=ids)}
+            ledger_keys, ledger = ledger_totals(ids)
+            expected = {(key >> LOCATION_BITS, key & LOCATION_MASK): quantity
+                        for key, quantity in zip(ledger_keys.tolist(), ledger.tolist())}
+            updates, creates = [], []
+            for pair in expected.keys() | levels.keys():
+                quantity, level = expected.get(pair, 0), levels.get(pair)
+                if level is None and quantity:
+                    creates.append(StockLevel(product_id=pair[0], location_id=pair[1], quantity=quantity))
+                elif level is not None and level.quantity != quantity:
+                    level.quantity, level.updated_at = quantity, now
+                    updates.append(level)
+            StockLevel.objects.bulk_update(updates, ['quantity', 'updated_at'], batch_size=BULK_BATCH_SIZE)
+            StockLevel.objects.bulk_create(creates, batch_size=BULK_BATCH_SIZE)
+            written += len(updates) + len(creates)
+    resync = set(product_ids) | {row[0] for row in drift['products']}
+    if resync:
+        sync_product_totals(sorted(resync))
+    return written
@@ -0,0 +1,109 @@
+"""
+In-memory SKU / barcode index for scanner lookups.
+
+Each server process keeps every product's till fields in a dict keyed by
+barcode and by SKU, so a scan is a hash lookup instead of a query. The
+index follows the 'inventory' model version (see caching.py), which is
+bumped whenever a product is saved or deleted and after every stock change:
+when the version moved, the next lookup first reloads the products updated
+since the last load and drops those deleted since (their tombstones).
+
+inv/wsgi.py and inv/asgi.py warm the index at startup so the first scan
+doesn't pay for the full load.
+"""
+import logging
+import threading
+
+from django.db import DatabaseError
+from django.utils import timezone
+
+from .caching import model_version
+from .catalogue import SYNC_OVERLAP
+from .models import Product, ProductTombstone
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('id', 'name', 'sku', 'barcode', 'price', 'quantity', 'unit', 'updated_at')
+
+
+class ScanIndex:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.loaded_at = None
+        self.products = {}
+        self.by_barcode = {}
+        self.by_sku = {}
+
+    def _remove(self, product_id):
+        product = self.products.pop(product_id, None)
+        if product is not None:
+            self.by_sku.pop(product['sku'], None)
+            self.by_barcode.pop(product['barcode'], None)
+
+    def _add(self, row):
+        row = dict(zip(FIELDS, row))
+        self._remove(row['id'])
+        product = {
+            'id': row['id'],
+            'name': row['name'],
+            'sku': row['sku'],
+            'barcode': row['barcode'] or '',
+            'price': float(row['price']),
+            'stock': row['quantity'],
+            'unit': row['unit'],
+        }
+        self.products[row['id']] = product
+        self.by_sku[row['sku']] = product
+        if row['barcode']:
+            self.by_barcode[row['barcode']] = product
+
+    def load(self):
+        """Read every product; returns the number indexed."""
+        with self.lock:
+            version, started = model_version('inventory'), timezone.now()
+            # Built aside and swapped in, so lookups meanwhile use the old one
+            fresh = ScanIndex()
+            for row in Product.objects.values_list(*FIELDS).iterator(chunk_size=2000):
+                fresh._add(row)
+            self.products, self.by_barcode, self.by_sku = fresh.products, fresh.by_barcode, fresh.by_sku
+            self.version, self.loaded_at = version, started
+            return len(self.products)
+
+    def refresh(self):
+        if self.version is None:
+            self.load()
+            return
+        version = model_version('inventory')
+        if version == self.version:
+            return
+        with self.lock:
+            if version == self.version:
+                return
+            started, after = timezone.now(), self.loaded_at - SYNC_OVERLAP
+            for row in Product.objects.filter(updated_at__gte=after).values_list(*FIELDS):
+                self._add(row)
+            for product_id in ProductTombstone.objects.filter(deleted_at__gte=after).values_list('product_id', flat=True):
+                self._remove(product_id)
+            self.version, self.loaded_at = version, started
+
+    def lookup(self, code):
+        """The indexed product with this barcode, else with this SKU, or None."""
+        self.refresh()
+        code = code.strip()
+        return self.by_barcode.get(code) or self.by_sku.get(code)
+
+
+scan_index = ScanIndex()
+
+
+def warm_scan_index():
+    # Before migrations have run there is nothing to load; the first scan
+    # loads the index instead
+    try:
+        count = scan_index.load()
+    except DatabaseError:
+        logger.warning('Scan index not warmed: products could not be read', exc_info=True)
+    else:
+        logger.info('Scan index warmed with %d products', count)
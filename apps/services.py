@@ -0,0 +1,485 @@
+"""
+Stock service: the one place that changes stock quantities.
+
+Stock is held per location in StockLevel. Every movement locks only the
+product's level at its location, writes the ledger row and updates that level
+in the same transaction, so tills at different branches never wait on each
+other. Product.quantity, the total over all locations, and with it the
+low-stock flag are recomputed from the levels once the transaction commits,
+in a short transaction of their own.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.contrib.auth.models import User
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import live, metrics
+from .archive import archived_totals, sale_sources
+from .caching import bump_model_version
+from .invoices import prerender_invoices
+from .models import (
+    ArchivedSale, ArchivedStockTransaction, Location, LowStockAlert, Product, Sale, StockLevel, StockTake,
+    StockTakeLine, StockTransaction, UserProfile,
+)
+from .tasks import enqueue
+
+BULK_BATCH_SIZE = 500
+MAX_SALES_BATCH = 500
+# Low-stock changes beyond this many go out in the caller's dashboard snapshot
+LIVE_DELTA_LIMIT = 20
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product, requested, available, location=None):
+        self.product = product
+        self.requested = requested
+        self.available = available
+        self.location = location
+        where = f' at {location}' if location else ''
+        super().__init__(f'Insufficient stock for {product.name}{where}: {available} available, {requested} requested')
+
+
+def user_location(user):
+    """The location a user works at, falling back to the default location."""
+    profile = getattr(user, 'userprofile', None) if user is not None else None
+    if profile is not None and profile.location_id and profile.location.is_active:
+        return profile.location
+    return Location.get_default()
+
+
+def count_activity(user_id, **deltas):
+    """
+    Add to a user's activity counters, e.g. ``count_activity(user.pk, sales_count=3)``.
+
+    Runs in the caller's transaction, so the counters commit or roll back with
+    the rows they count.
+    """
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if user_id is None or not changes:
+        return
+    if not UserProfile.objects.filter(user_id=user_id).update(**changes):
+        UserProfile.objects.get_or_create(user_id=user_id)
+        UserProfile.objects.filter(user_id=user_id).update(**changes)
+
+
+def reconcile_activity():
+    """Recompute every user's activity counters from the rows; returns the number of profiles corrected."""
+    UserProfile.objects.bulk_create(
+        [UserProfile(user_id=pk) for pk in User.objects.filter(userprofile__isnull=True).values_list('pk', flat=True)],
+        batch_size=BULK_BATCH_SIZE, ignore_conflicts=True,
+    )
+
+    def created_by_user(model):
+        return Coalesce(Subquery(
+            model.objects.filter(created_by=OuterRef('user_id')).order_by()
+            .values('created_by').annotate(count=Count('id')).values('count')
+        ), 0)
+
+    fields = ('sales_count', 'products_count', 'transactions_count')
+    before = {row[0]: row[1:] for row in UserProfile.objects.values_list('pk', *fields)}
+    # Archived sales and movements still count as the user's activity
+    UserProfile.objects.update(
+        sales_count=created_by_user(Sale) + created_by_user(ArchivedSale),
+        products_count=created_by_user(Product),
+        transactions_count=created_by_user(StockTransaction) + created_by_user(ArchivedStockTransaction),
+    )
+    after = UserProfile.objects.values_list('pk', *fields)
+    return sum(1 for row in after if before.get(row[0]) != row[1:])
+
+
+def record_stock_movement(product, transaction_type, quantity, user=None, reference='', notes='', location=None):
+    """
+    Apply one stock movement at ``location`` (default: the default location) and return its ledger row.
+
+    ``quantity`` is positive for 'in' and 'out'; 'adjust' quantities are signed.
+    Raises InsufficientStock if an 'out' would take the location below zero.
+    """
+    if location is None:
+        location = Location.get_default()
+    with transaction.atomic():
+        level, created = StockLevel.objects.select_for_update().get_or_create(product=product, location=location)
+        if transaction_type == 'out':
+            if level.quantity < quantity:
+                raise InsufficientStock(product, quantity, level.quantity, location)
+            delta = -quantity
+        else:
+            delta = quantity
+
+        movement = StockTransaction.objects.create(
+            product=product,
+            location=location,
+            transaction_type=transaction_type,
+            quantity=quantity,
+            reference=reference,
+            notes=notes,
+            created_by=user,
+        )
+        StockLevel.objects.filter(pk=level.pk).update(quantity=F('quantity') + delta, updated_at=timezone.now())
+        transaction.on_commit(lambda: sync_product_totals([product.pk]))
+    return movement
+
+
+def sync_product_totals(product_ids=None):
+    """
+    Set Product.quantity to the sum of its stock levels and refresh the low-stock flags.
+
+    Recomputing rather than adding deltas makes it safe to run any number of
+    times, in any order, after the movements have committed.
+    """
+    total = (StockLevel.objects.filter(product=OuterRef('pk')).order_by()
+             .values('product').annotate(total=Sum('quantity')).values('total'))
+    now = timezone.now()
+    with transaction.atomic():
+        if product_ids is None:
+            Product.objects.update(quantity=Coalesce(Subquery(total), 0), updated_at=now)
+        else:
+            ids = list(product_ids)
+            for start in range(0, len(ids), BULK_BATCH_SIZE):
+                Product.objects.filter(pk__in=ids[start:start + BULK_BATCH_SIZE]).update(
+                    quantity=Coalesce(Subquery(total), 0), updated_at=now)
+        refresh_low_stock_flags(product_ids)
+    # Quantities show in the product rows and the valuation
+    bump_model_version('product', 'inventory')
+
+
+def refresh_low_stock_flags(product_ids=None):
+    """
+    Recompute is_low_stock after bulk changes that bypassed Product.save().
+
+    Writes a LowStockAlert for every product that crossed its reorder level
+    and returns the number of transitions.
+    """
+    products = Product.objects.all()
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+    fields = ('id', 'quantity', 'reorder_level', 'name')
+    became_low = list(products.filter(is_low_stock=False, quantity__lte=F('reorder_level')).values_list(*fields))
+    recovered = list(products.filter(is_low_stock=True, quantity__gt=F('reorder_level')).values_list(*fields))
+
+    with transaction.atomic():
+        for rows, is_low in ((became_low, True), (recovered, False)):
+            ids = [row[0] for row in rows]
+            for start in range(0, len(ids), BULK_BATCH_SIZE):
+                Product.objects.filter(pk__in=ids[start:start + BULK_BATCH_SIZE]).update(is_low_stock=is_low)
+            LowStockAlert.objects.bulk_create([
+                LowStockAlert(product_id=pk, is_low=is_low, quantity=quantity, reorder_level=reorder_level)
+                for pk, quantity, reorder_level, name in rows
+            ], batch_size=BULK_BATCH_SIZE)
+            # bulk_create skips the receiver that sends these to the dashboard
+            if len(became_low) + len(recovered) <= LIVE_DELTA_LIMIT:
+                for pk, quantity, reorder_level, name in rows:
+                    live.publish('low_stock', {
+                        'product_id': pk,
+                        'name': name,
+                        'is_low': is_low,
+                        'quantity': quantity,
+                        'reorder_level': reorder_level,
+                    })
+    if became_low or recovered:
+        bump_model_version('product', 'inventory')
+    return len(became_low) + len(recovered)
+
+
+def set_reorder_levels(levels):
+    """Bulk update reorder levels from ``{product_id: level}`` and refresh the low-stock flags."""
+    # Forecast levels repeat a lot, so one UPDATE per distinct level beats a
+    # per-row CASE expression
+    by_level = defaultdict(list)
+    for pk, level in levels.items():
+        by_level[level].append(pk)
+    with transaction.atomic():
+        for level, ids in by_level.items():
+            for start in range(0, len(ids), BULK_BATCH_SIZE):
+                Product.objects.filter(pk__in=ids[start:start + BULK_BATCH_SIZE]).update(reorder_level=level)
+        refresh_low_stock_flags()
+        live.publish_snapshot()
+    bump_model_version('product', 'inventory')
+    return len(levels)
+
+
+def create_stock_take(counts, user=None, reference='', notes='', location=None):
+    """
+    Create a draft stock take of ``location`` from ``{sku: counted_quantity}``.
+
+    Returns the stock take and the SKUs that matched no product.
+    """
+    if location is None:
+        location = Location.get_default()
+    skus = list(counts)
+    products = {}
+    for start in range(0, len(skus), BULK_BATCH_SIZE):
+        rows = Product.objects.filter(sku__in=skus[start:start + BULK_BATCH_SIZE]).values_list('sku', 'id', 'cost_price')
+        products.update((sku, (pk, cost)) for sku, pk, cost in rows)
+    ids = [pk for pk, cost in products.values()]
+    on_hand = {}
+    for start in range(0, len(ids), BULK_BATCH_SIZE):
+        on_hand.update(StockLevel.objects.filter(location=location, product_id__in=ids[start:start + BULK_BATCH_SIZE])
+                       .values_list('product_id', 'quantity'))
+
+    with transaction.atomic():
+        take = StockTake.objects.create(reference=reference, notes=notes, location=location, created_by=user)
+        StockTakeLine.objects.bulk_create([
+            StockTakeLine(
+                stock_take=take,
+                product_id=pk,
+                counted_quantity=counts[sku],
+                expected_quantity=on_hand.get(pk, 0),
+                variance=counts[sku] - on_hand.get(pk, 0),
+                cost_price=cost,
+            )
+            for sku, (pk, cost) in products.items()
+        ], batch_size=BULK_BATCH_SIZE)
+    unknown = [sku for sku in skus if sku not in products]
+    return take, unknown
+
+
+def apply_stock_take(take, user=None):
+    """
+    Set every counted product at the take's location to its counted quantity in one transaction.
+
+    Variances are recomputed against the locked stock levels, the levels are
+    updated with a single UPDATE and one signed 'adjust' ledger row is written
+    per product whose count differs. Returns the number of adjustments.
+    """
+    with transaction.atomic():
+        # Claim the take first so a second apply waits and then sees it applied
+        claimed = StockTake.objects.filter(pk=take.pk, status='draft').update(
+            status='applied', applied_by=user, applied_at=timezone.now())
+        if not claimed:
+            raise ValueError(f'{take} has already been applied')
+
+        lines = StockTakeLine.objects.filter(stock_take=take)
+        # Counted products never stocked here get an empty level to count against
+        StockLevel.objects.bulk_create([
+            StockLevel(product_id=product_id, location_id=take.location_id)
+            for product_id in lines.exclude(
+                product__stock_levels__location_id=take.location_id).values_list('product_id', flat=True)
+        ], batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+        counted_levels = StockLevel.objects.filter(location_id=take.location_id, product__in=lines.values('product_id'))
+        list(counted_levels.select_for_update().values_list('id'))
+
+        # Variances against the locked levels, computed in the database
+        on_hand = StockLevel.objects.filter(location_id=take.location_id, product=OuterRef('product_id')).values('quantity')
+        lines.update(expected_quantity=Subquery(on_hand))
+        lines.update(variance=F('counted_quantity') - F('expected_quantity'))
+
+        reference = f'Stock take: {take}'[:100]
+        adjustments = [
+            StockTransaction(
+                product_id=product_id,
+                location_id=take.location_id,
+                transaction_type='adjust',
+                quantity=variance,
+                reference=reference,
+                created_by=user,
+            )
+            for product_id, variance in lines.exclude(variance=0).values_list('product_id', 'variance')
+        ]
+
+        counted = lines.filter(product=OuterRef('product_id')).values('counted_quantity')
+        counted_levels.filter(product__in=lines.exclude(variance=0).values('product_id')).update(
+            quantity=Subquery(counted), updated_at=timezone.now())
+        adjusted_ids = [movement.product_id for movement in adjustments]
+        StockTransaction.objects.bulk_create(adjustments, batch_size=BULK_BATCH_SIZE)
+        count_activity(user.pk if user else None, transactions_count=len(adjustments))
+        # Registered before the snapshot so it sees the new totals
+        transaction.on_commit(lambda: sync_product_totals(adjusted_ids))
+        live.publish_snapshot()
+
+    if adjustments:
+        # Bulk writes skip the post_save receivers
+        metrics.inc('inventory_stock_movements_total', len(adjustments), type='adjust')
+        metrics.inc('inventory_stock_movement_units_total', sum(m.quantity for m in adjustments), type='adjust')
+    take.refresh_from_db()
+    return len(adjustments)
+
+
+def invoice_numbers(count):
+    """The next ``count`` invoice numbers; call inside the transaction that creates the sales."""
+    prefix = f"INV-{timezone.now().strftime('%Y%m%d')}"
+    # Archived sales keep their numbers, so they still count
+    start = Sale.objects.count() + archived_totals('sale')['rows'] + 1
+    return [f"{prefix}-{number:04d}" for number in range(start, start + count)]
+
+
+def _parse_sale_lines(sale):
+    items = sale.get('items')
+    if not isinstance(items, list) or not items:
+        return None, ['items must be a non-empty list']
+    lines = []
+    errors = []
+    for position, item in enumerate(items, start=1):
+        try:
+            product_id = int(item['product_id'])
+            quantity = int(item['quantity'])
+        except (KeyError, TypeError, ValueError):
+            errors.append(f'item {position}: product_id and quantity must be integers')
+            continue
+        if quantity <= 0:
+            errors.append(f'item {position}: quantity must be positive')
+            continue
+        lines.append((product_id, quantity))
+    return lines, errors
+
+
+def record_sales_batch(sales, user=None, location=None):
+    """
+    Record a batch of queued POS sales made at ``location``, skipping those already recorded.
+
+    Each sale is a dict with a client-generated ``idempotency_key``, ``items``
+    (``[{'product_id': ..., 'quantity': ...}]``) and optionally
+    ``customer_name``, ``customer_phone``, ``payment_method`` and
+    ``payment_status``. Sales are checked in order against the location's
+    locked stock levels; the accepted ones are written in one transaction with
+    bulk inserts and one stock UPDATE per distinct decrement. Returns one
+    result per submitted sale.
+    """
+    if location is None:
+        location = user_location(user)
+    results = [None] * len(sales)
+    keys = [str(sale.get('idempotency_key') or '').strip() if isinstance(sale, dict) else '' for sale in sales]
+    recorded = {
+        key: (pk, invoice_number)
+        for source in sale_sources()
+        for key, pk, invoice_number in source.filter(idempotency_key__in=[k for k in keys if k])
+        .values_list('idempotency_key', 'id', 'invoice_number')
+    }
+
+    pending = []
+    first_seen = {}
+    for index, (sale, key) in enumerate(zip(sales, keys)):
+        if not key or len(key) > 64:
+            results[index] = {'idempotency_key': key, 'status': 'rejected',
+                              'errors': ['idempotency_key is required (at most 64 characters)']}
+        elif key in recorded:
+            pk, invoice_number = recorded[key]
+            results[index] = {'idempotency_key': key, 'status': 'duplicate',
+                              'sale_id': pk, 'invoice_number': invoice_number}
+        elif key in first_seen:
+            first_seen[key].append(index)
+        else:
+            first_seen[key] = [index]
+            pending.append((index, key, sale))
+
+    # Retrying an already recorded batch stops here after one query
+    if not pending:
+        return results
+
+    payment_methods = dict(Sale.PAYMENT_METHODS)
+    accepted = []
+    with transaction.atomic():
+        parsed = {index: _parse_sale_lines(sale) for index, key, sale in pending}
+        product_ids = {pk for lines, errors in parsed.values() if lines for pk, quantity in lines}
+        products = {}
+        ids = list(product_ids)
+        for start in range(0, len(ids), BULK_BATCH_SIZE):
+            chunk = ids[start:start + BULK_BATCH_SIZE]
+            products.update((pk, [name, price, 0]) for pk, name, price
+                            in Product.objects.filter(pk__in=chunk).values_list('id', 'name', 'price'))
+            levels = StockLevel.objects.select_for_update().filter(location=location, product_id__in=chunk)
+            for pk, quantity in levels.values_list('product_id', 'quantity'):
+                products[pk][2] = quantity
+
+        for index, key, sale in pending:
+            lines, errors = parsed[index]
+            needed = defaultdict(int)
+            for product_id, quantity in lines or ():
+                if product_id not in products:
+                    errors.append(f'product {product_id} does not exist')
+                else:
+                    needed[product_id] += quantity
+            for product_id, quantity in needed.items():
+                name, price, available = products[product_id]
+                if available < quantity:
+                    errors.append(f'insufficient stock for {name} at {location}: {available} available, {quantity} requested')
+            if errors:
+                results[index] = {'idempotency_key': key, 'status': 'rejected', 'errors': errors}
+                continue
+
+            for product_id, quantity in needed.items():
+                products[product_id][2] -= quantity
+            items = []
+            total_amount = 0
+            for product_id, quantity in lines:
+                name, price, available = products[product_id]
+                total_amount += quantity * price
+                items.append({
+                    'product_id': product_id,
+                    'product_name': name,
+                    'quantity': quantity,
+                    'price': float(price),
+                    'total': float(quantity * price),
+                })
+            payment_method = sale.get('payment_method')
+            accepted.append((index, key, needed, Sale(
+                customer_name=str(sale.get('customer_name') or '')[:200],
+                customer_phone=str(sale.get('customer_phone') or '')[:20],
+                items=items,
+                total_amount=total_amount,
+                payment_method=payment_method if payment_method in payment_methods else 'cash',
+                payment_status=sale.get('payment_status', True) is not False,
+                idempotency_key=key,
+                location=location,
+                created_by=user,
+            )))
+
+        if accepted:
+            for (index, key, needed, sale), number in zip(accepted, invoice_numbers(len(accepted))):
+                sale.invoice_number = number
+            Sale.objects.bulk_create([sale for index, key, needed, sale in accepted], batch_size=BULK_BATCH_SIZE)
+
+            # Products sold in the same amount share one UPDATE
+            sold = defaultdict(int)
+            for index, key, needed, sale in accepted:
+                for product_id, quantity in needed.items():
+                    sold[product_id] += quantity
+            by_amount = defaultdict(list)
+            for product_id, quantity in sold.items():
+                by_amount[quantity].append(product_id)
+            now = timezone.now()
+            for quantity, ids in by_amount.items():
+                for start in range(0, len(ids), BULK_BATCH_SIZE):
+                    StockLevel.objects.filter(location=location, product_id__in=ids[start:start + BULK_BATCH_SIZE]).update(
+                        quantity=F('quantity') - quantity, updated_at=now)
+
+            StockTransaction.objects.bulk_create([
+                StockTransaction(
+                    product_id=item['product_id'],
+                    location=location,
+                    transaction_type='out',
+                    quantity=item['quantity'],
+                    reference=f"Sale: {sale.invoice_number}",
+                    notes=f"Sold to {sale.customer_name}",
+                    created_by=user,
+                )
+                for index, key, needed, sale in accepted for item in sale.items
+            ], batch_size=BULK_BATCH_SIZE)
+            count_activity(user.pk if user else None, sales_count=len(accepted),
+                           transactions_count=sum(len(sale.items) for index, key, needed, sale in accepted))
+            # Registered before the snapshot so it sees the new totals
+            transaction.on_commit(lambda: sync_product_totals(list(sold)))
+            live.publish_snapshot()
+            enqueue(prerender_invoices, invoice_numbers=[sale.invoice_number for index, key, needed, sale in accepted])
+
+    created_ids = dict(Sale.objects.filter(idempotency_key__in=[key for index, key, needed, sale in accepted])
+                       .values_list('idempotency_key', 'id'))
+    for index, key, needed, sale in accepted:
+        results[index] = {'idempotency_key': key, 'status': 'created',
+                          'sale_id': created_ids[key], 'invoice_number': sale.invoice_number}
+    # A key repeated within the batch reports the outcome of its first occurrence
+    for key, indexes in first_seen.items():
+        first = results[indexes[0]]
+        for index in indexes[1:]:
+            results[index] = dict(first, status='duplicate') if first['status'] == 'created' else dict(first)
+
+    if accepted:
+        # Bulk writes skip the post_save receivers
+        metrics.inc('inventory_sales_created_total', len(accepted))
+        metrics.inc('inventory_sales_amount_total', float(sum(sale.total_amount for index, key, needed, sale in accepted)))
+        units = sum(item['quantity'] for index, key, needed, sale in accepted for item in sale.items)
+        metrics.inc('inventory_stock_movements_total', sum(len(sale.items) for index, key, needed, sale in accepted), type='out')
+        metrics.inc('inventory_stock_movement_units_total', units, type='out')
+    return results
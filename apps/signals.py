@@ -0,0 +1,197 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import live, metrics
+from .backends import forget_user
+from .caching import bump_model_version
+from .invoices import forget_invoice_pdf
+from .models import (
+    ArchivedSale, ArchivedStockTransaction, Category, Expense, ExpenseCategory, ExpenseMonthlySummary, Location,
+    LowStockAlert, Product, ProductTombstone, Sale, StockLevel, StockTransaction,
+)
+from .services import count_activity
+
+
+@receiver(post_save, sender=Sale)
+def count_sale(sender, instance, created, **kwargs):
+    if created:
+        metrics.inc('inventory_sales_created_total')
+        metrics.inc('inventory_sales_amount_total', float(instance.total_amount))
+
+
+@receiver(post_save, sender=Sale)
+@receiver(post_delete, sender=Sale)
+def drop_invoice_pdf(sender, instance, created=False, **kwargs):
+    # The cached PDF shows what the sale was when it was rendered
+    if not created:
+        forget_invoice_pdf(instance.invoice_number)
+
+
+@receiver(post_save, sender=StockTransaction)
+def count_stock_movement(sender, instance, created, **kwargs):
+    if created:
+        metrics.inc('inventory_stock_movements_total', type=instance.transaction_type)
+        metrics.inc('inventory_stock_movement_units_total', instance.quantity,
+                    type=instance.transaction_type)
+
+
+@receiver(post_save, sender=Product)
+def open_stock_level(sender, instance, created, raw=False, **kwargs):
+    # A new product's opening quantity is stock at the default location, and
+    # goes in the ledger so reconcile_stock finds the level accounted for
+    if created and not raw:
+        location = Location.get_default()
+        if location is not None:
+            level, opened = StockLevel.objects.get_or_create(product=instance, location=location,
+                                                             defaults={'quantity': instance.quantity})
+            if opened and instance.quantity > 0:
+                StockTransaction.objects.create(
+                    product=instance, location=location, transaction_type='in', quantity=instance.quantity,
+                    reference='Opening stock', created_by=instance.created_by,
+                )
+
+
+@receiver(post_delete, sender=Product)
+def leave_tombstone(sender, instance, **kwargs):
+    # Catalogue clients and the scan index learn of deletes from these
+    ProductTombstone.objects.create(product_id=instance.pk, sku=instance.sku)
+
+
+# Monthly expense rollup. Expense.save keeps it on create and edit; deletes,
+# including QuerySet.delete(), come through here. Like save, this reads the
+# stored row: the instance being deleted may have been loaded before an edit
+@receiver(pre_delete, sender=Expense)
+def remove_from_expense_summary(sender, instance, **kwargs):
+    stored = Expense.objects.select_for_update().filter(pk=instance.pk).first()
+    if stored is not None:
+        ExpenseMonthlySummary.add(stored.summary_key(), -stored.amount, -1)
+
+
+@receiver(pre_delete, sender=ExpenseCategory)
+def uncategorize_expense_summary(sender, instance, **kwargs):
+    # The category's expenses become uncategorized, so its rollup rows move
+    # to the uncategorized ones before they cascade away
+    for row in instance.monthly_summaries.values('month', 'expense_type', 'payment_method', 'total', 'count'):
+        ExpenseMonthlySummary.add((row['month'], None, row['expense_type'], row['payment_method']),
+                                  row['total'], row['count'])
+
+
+# Per-user activity counters on UserProfile, updated inside the transaction
+# that saves or deletes the row. Bulk writes call count_activity themselves;
+# the archive's raw DELETE keeps archived rows counted.
+ACTIVITY_COUNTERS = {
+    Sale: 'sales_count', ArchivedSale: 'sales_count', Product: 'products_count',
+    StockTransaction: 'transactions_count', ArchivedStockTransaction: 'transactions_count',
+}
+
+
+def count_created_activity(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        count_activity(instance.created_by_id, **{ACTIVITY_COUNTERS[sender]: 1})
+
+
+def count_deleted_activity(sender, instance, **kwargs):
+    count_activity(instance.created_by_id, **{ACTIVITY_COUNTERS[sender]: -1})
+
+
+for model in ACTIVITY_COUNTERS:
+    post_save.connect(count_created_activity, sender=model, dispatch_uid=f'activity-save-{model._meta.label}')
+    post_delete.connect(count_deleted_activity, sender=model, dispatch_uid=f'activity-delete-{model._meta.label}')
+
+
+# Fragment cache versions. Creating a row adds a new cache key, so only
+# updates and deletes need to invalidate the model's cached fragments.
+# Related display values (category name, username) are part of the fragment
+# keys instead, so logins and category edits don't flush every row.
+VERSIONED_MODELS = (Product, StockTransaction, Sale)
+
+
+def bump_version_on_save(sender, instance, created, **kwargs):
+    if not created:
+        bump_model_version(sender._meta.model_name)
+
+
+def bump_version_on_delete(sender, instance, **kwargs):
+    bump_model_version(sender._meta.model_name)
+
+
+for model in VERSIONED_MODELS:
+    post_save.connect(bump_version_on_save, sender=model, dispatch_uid=f'version-save-{model._meta.label}')
+    post_delete.connect(bump_version_on_delete, sender=model, dispatch_uid=f'version-delete-{model._meta.label}')
+
+
+# Aggregates over the whole catalogue (e.g. the valuation report) change when
+# any product is added, edited or removed, or a category is renamed.
+def bump_inventory_version(sender, **kwargs):
+    bump_model_version('inventory')
+
+
+for model in (Product, Category):
+    post_save.connect(bump_inventory_version, sender=model, dispatch_uid=f'inventory-save-{model._meta.label}')
+    post_delete.connect(bump_inventory_version, sender=model, dispatch_uid=f'inventory-delete-{model._meta.label}')
+
+
+# Live dashboard deltas, computed once here and fanned out to every open
+# dashboard by the event hub. Bulk writes publish a snapshot instead.
+@receiver(post_save, sender=Sale)
+def publish_sale(sender, instance, created, **kwargs):
+    if created:
+        live.publish('sale', {
+            'sale_id': instance.id,
+            'invoice_number': instance.invoice_number,
+            'amount': float(instance.total_amount),
+            'date': timezone.localdate(instance.created_at).isoformat(),
+        })
+
+
+@receiver(post_save, sender=StockTransaction)
+def publish_stock_movement(sender, instance, created, **kwargs):
+    if created:
+        live.publish('stock', live.transaction_row(instance))
+
+
+@receiver(post_save, sender=LowStockAlert)
+def publish_low_stock_change(sender, instance, created, **kwargs):
+    if created:
+        live.publish('low_stock', {
+            'product_id': instance.product_id,
+            'name': instance.product.name,
+            'is_low': instance.is_low,
+            'quantity': instance.quantity,
+            'reorder_level': instance.reorder_level,
+        })
+
+
+def publish_expense_total(sender, instance, **kwargs):
+    live.publish_expense_total()
+
+
+post_save.connect(publish_expense_total, sender=Expense, dispatch_uid='live-expense-save')
+post_delete.connect(publish_expense_total, sender=Expense, dispatch_uid='live-expense-delete')
+
+
+# Cached request.user (apps/backends.py)
+def forget_cached_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+
+def forget_cached_user_access(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            forget_user(instance.pk)
+    elif action in ('post_add', 'post_remove'):
+        # Changed from the group or permission side: pk_set holds the users
+        for user_id in pk_set:
+            forget_user(user_id)
+    elif action == 'pre_clear':
+        side = 'group' if sender is User.groups.through else 'permission'
+        for user_id in sender.objects.filter(**{side: instance}).values_list('user_id', flat=True):
+            forget_user(user_id)
+
+
+post_save.connect(forget_cached_user, sender=User, dispatch_uid='auth-user-save')
+post_delete.connect(forget_cached_user, sender=User, dispatch_uid='auth-user-delete')
+for through in (User.groups.through, User.user_permissions.through):
+    m2m_changed.connect(forget_cached_user_access, sender=through, dispatch_uid=f'auth-user-m2m-{through._meta.label}')
@@ -0,0 +1,116 @@
+"""
+Upload handling for receipts, product images and profile pictures.
+
+SizeLimitUploadHandler runs ahead of Django's memory and temporary-file
+handlers and stops passing a file on once it is larger than MAX_UPLOAD_SIZE,
+so an oversized upload is neither held in memory nor spooled to disk; the
+form then rejects the OversizedUpload left in its place (see forms.py).
+
+ContentAddressedStorage streams each file in chunks to a temporary file next
+to its destination, hashing it on the way, and names it by the SHA-256 of
+its content. An identical file uploaded again maps to the same name and the
+copy is dropped, so it takes no further space. Files can be shared by
+several rows, so delete them only once nothing refers to them.
+"""
+import hashlib
+import os
+import posixpath
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.template.defaultfilters import filesizeformat
+
+
+def upload_limit():
+    return settings.MAX_UPLOAD_SIZE
+
+
+def too_large_message():
+    return f'The file is larger than the {filesizeformat(upload_limit())} limit.'
+
+
+class OversizedUpload(UploadedFile):
+    """Stands in for a file that was cut off at the size limit; holds no data."""
+
+    def __init__(self, name, content_type, size):
+        super().__init__(file=None, name=name, content_type=content_type, size=size)
+
+    def chunks(self, chunk_size=None):
+        raise ValueError(too_large_message())
+
+    def open(self, mode=None):
+        raise ValueError(too_large_message())
+
+
+class SizeLimitUploadHandler(FileUploadHandler):
+    """Cuts off each uploaded file as soon as it passes MAX_UPLOAD_SIZE."""
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.received = 0
+        self.oversized = content_length is not None and content_length > upload_limit()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.oversized:
+            self.received += len(raw_data)
+            self.oversized = self.received > upload_limit()
+        # None keeps the chunk from the handlers after this one
+        return None if self.oversized else raw_data
+
+    def file_complete(self, file_size):
+        if self.oversized:
+            return OversizedUpload(self.file_name, self.content_type, max(self.received, upload_limit() + 1))
+        return None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def get_available_name(self, name, max_length=None):
+        # _save names the file after its content, so a name is never taken by
+        # a different file
+        return name
+
+    def _save(self, name, content):
+        if isinstance(content, OversizedUpload):
+            raise ValueError(too_large_message())
+        directory = posixpath.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        self._make_directory(self.path(directory))
+
+        temp_path = self.path(posixpath.join(directory, f'.upload-{uuid.uuid4().hex}'))
+        digest = hashlib.sha256()
+        size = 0
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                for chunk in content.chunks():
+                    size += len(chunk)
+                    if size > upload_limit():
+                        raise ValueError(too_large_message())
+                    digest.update(chunk)
+                    temp.write(chunk)
+
+            file_hash = digest.hexdigest()
+            name = posixpath.join(directory, file_hash[:2], file_hash + extension)
+            full_path = self.path(name)
+            self._make_directory(os.path.dirname(full_path))
+            if os.path.exists(full_path):
+                # Already stored
+                os.remove(temp_path)
+            else:
+                os.replace(temp_path, full_path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(full_path, self.file_permissions_mode)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name.replace('\\', '/')
+
+    def _make_directory(self, path):
+        os.makedirs(path, exist_ok=True)
+        if self.directory_permissions_mode is not None:
+            os.chmod(path, self.directory_permissions_mode)
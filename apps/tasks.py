@@ -0,0 +1,126 @@
+"""
+A small database-backed queue for work that doesn't have to finish before
+the response: dashboard snapshots, invoice pre-rendering and the like.
+
+``enqueue(func, **kwargs)`` records a Task once the current transaction
+commits, so a request that rolls back leaves nothing behind and the task
+sees the rows it is about. ``python manage.py run_tasks`` claims due tasks
+one at a time, runs each in a transaction and retries failures with
+exponential backoff until ``max_attempts``; then it marks them failed.
+
+Only functions decorated with ``@task`` can be queued, and their keyword
+arguments must be JSON. With TASKS_EAGER (off unless opted in, for
+development and tests) tasks run right after the commit in the request
+instead, without retries, so no worker is needed.
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+RETRY_DELAY = timedelta(seconds=10)
+# A task running this long was left by a worker that died; it runs again
+STALE_AFTER = timedelta(minutes=15)
+DONE_RETENTION = timedelta(days=1)
+
+
+def task(func):
+    """Mark a module-level function as runnable by the queue."""
+    func.is_task = True
+    return func
+
+
+def task_name(func):
+    return f'{func.__module__}.{func.__qualname__}'
+
+
+def enqueue(func, max_attempts=MAX_ATTEMPTS, **kwargs):
+    """Queue ``func(**kwargs)`` to run once the current transaction commits."""
+    if not getattr(func, 'is_task', False):
+        raise ValueError(f'{task_name(func)} is not a @task')
+    if getattr(settings, 'TASKS_EAGER', False):
+        transaction.on_commit(lambda: _run_eagerly(func, kwargs))
+    else:
+        transaction.on_commit(lambda: Task.objects.create(name=task_name(func), kwargs=kwargs,
+                                                          max_attempts=max_attempts))
+
+
+def _run_eagerly(func, kwargs):
+    # Follow-up work must not fail the request it follows
+    try:
+        with transaction.atomic():
+            func(**kwargs)
+    except Exception:
+        logger.exception('Task %s failed', task_name(func))
+
+
+def claim_next():
+    """Mark the next due task running and return it, or None if none is due."""
+    now = timezone.now()
+    due = Task.objects.filter(status='pending', run_after__lte=now).order_by('run_after', 'id')
+    for pk in due.values_list('pk', flat=True)[:10]:
+        # Another worker may claim it first; the conditional update decides
+        if Task.objects.filter(pk=pk, status='pending').update(
+                status='running', started_at=now, attempts=F('attempts') + 1):
+            return Task.objects.get(pk=pk)
+    return None
+
+
+def run_task(queued):
+    """Run a claimed task and record the outcome; returns True if it succeeded."""
+    try:
+        func = import_string(queued.name)
+        if not getattr(func, 'is_task', False):
+            raise ValueError(f'{queued.name} is not a @task')
+        with transaction.atomic():
+            func(**queued.kwargs)
+    except Exception:
+        queued.last_error = traceback.format_exc()
+        if queued.attempts < queued.max_attempts:
+            queued.status = 'pending'
+            queued.run_after = timezone.now() + RETRY_DELAY * 2 ** (queued.attempts - 1)
+            logger.warning('Task %s #%d failed, retrying at %s', queued.name, queued.pk, queued.run_after)
+        else:
+            queued.status = 'failed'
+            queued.finished_at = timezone.now()
+            logger.error('Task %s #%d failed for good', queued.name, queued.pk)
+        queued.save(update_fields=['status', 'run_after', 'finished_at', 'last_error'])
+        return False
+    queued.status = 'done'
+    queued.finished_at = timezone.now()
+    queued.save(update_fields=['status', 'finished_at'])
+    return True
+
+
+def run_due_tasks(limit=None):
+    """Run due tasks until none is left (or ``limit`` ran); returns (succeeded, failed)."""
+    succeeded = failed = 0
+    while limit is None or succeeded + failed < limit:
+        queued = claim_next()
+        if queued is None:
+            break
+        if run_task(queued):
+            succeeded += 1
+        else:
+            failed += 1
+    return succeeded, failed
+
+
+def requeue_stale():
+    """Put tasks left running by a dead worker back in the queue; returns how many."""
+    return Task.objects.filter(status='running', started_at__lt=timezone.now() - STALE_AFTER).update(
+        status='pending', run_after=timezone.now())
+
+
+def prune_done():
+    return Task.objects.filter(status='done', finished_at__lt=timezone.now() - DONE_RETENTION).delete()[0]
@@ -0,0 +1,11 @@
+from django import template
+
+from ..caching import model_version as get_model_version
+
+register = template.Library()
+
+
+@register.simple_tag
+def model_version(label):
+    """Usage: {% model_version 'product' as product_version %}"""
+    return get_model_version(label)
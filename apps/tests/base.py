@@ -0,0 +1,35 @@
+import tempfile
+from decimal import Decimal
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from ..models import Product
+
+# Every alias in its own process-local cache, so tests neither read nor leave
+# anything under var/
+TEST_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'tests-{alias}'}
+    for alias in ('default', 'template_fragments', 'sessions', 'invoices')
+}
+
+
+def make_product(sku, quantity=10, **fields):
+    fields.setdefault('name', f'Product {sku}')
+    return Product.objects.create(sku=sku, price=Decimal('5.00'), cost_price=Decimal('3.00'),
+                                  quantity=quantity, **fields)
+
+
+class InventoryTestCase(TestCase):
+    """TestCase with in-memory caches, a temporary METRICS_DIR and eager tasks."""
+
+    @classmethod
+    def setUpClass(cls):
+        metrics_dir = cls.enterClassContext(tempfile.TemporaryDirectory())
+        cls.enterClassContext(override_settings(CACHES=TEST_CACHES, METRICS_DIR=metrics_dir, TASKS_EAGER=True))
+        super().setUpClass()
+
+    def setUp(self):
+        # Rolled-back rows must not leave cached model versions or pages behind
+        for cache in caches.all():
+            cache.clear()
@@ -0,0 +1,37 @@
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from ..archive import archive_before
+from ..models import StockTransaction, UserProfile
+from ..services import reconcile_activity, record_sales_batch, record_stock_movement
+from .base import InventoryTestCase, make_product
+
+
+class ActivityCounterTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('clerk')
+        self.product = make_product('U-1', created_by=self.user)
+        record_stock_movement(self.product, 'in', 5, user=self.user)
+        record_sales_batch([{'idempotency_key': 'u-1', 'items': [{'product_id': self.product.pk, 'quantity': 1}]}],
+                           user=self.user)
+
+    def counters(self):
+        return UserProfile.objects.filter(user=self.user).values_list(*UserProfile.ACTIVITY_FIELDS).get()
+
+    def test_writes_keep_the_counters(self):
+        # The opening stock, the delivery and the sale are all the clerk's movements
+        self.assertEqual(self.counters(), (1, 1, 3))
+        StockTransaction.objects.filter(created_by=self.user, transaction_type='in').latest('id').delete()
+        self.assertEqual(self.counters(), (1, 1, 2))
+
+    def test_archived_rows_still_count(self):
+        archive_before(timezone.now())
+        self.assertEqual(self.counters(), (1, 1, 3))
+        self.assertEqual(reconcile_activity(), 0)
+
+    def test_reconcile_corrects_drifted_counters(self):
+        UserProfile.objects.filter(user=self.user).update(sales_count=7, transactions_count=0)
+        self.assertEqual(reconcile_activity(), 1)
+        self.assertEqual(self.counters(), (1, 1, 3))
@@ -0,0 +1,61 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from ..classification import refresh_classification
+from ..models import Category, Expense, ExpenseCategory, Location, UserProfile
+from ..services import record_sales_batch, record_stock_movement
+from .base import InventoryTestCase, make_product
+
+PAGES = [
+    f'/admin/apps/{name}/' for name in (
+        'product', 'stocklevel', 'stocktransaction', 'sale', 'expense', 'expensecategory',
+        'expensemonthlysummary', 'lowstockalert', 'productclassification', 'userprofile',
+    )
+] + ['/admin/apps/stocktransaction/add/', '/admin/apps/expense/add/', '/admin/apps/stocktake/add/']
+
+
+class ChangelistQueryTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser('admin'))
+        self.branch = Location.objects.create(name='Branch', code='BR')
+        self.rows = 0
+
+    def grow(self, count):
+        for number in range(self.rows, self.rows + count):
+            user = User.objects.create_user(f'clerk-{number}')
+            UserProfile.objects.create(user=user, location=self.branch)
+            category = Category.objects.create(name=f'Category {number}')
+            product = make_product(f'Q-{number}', quantity=number % 15, category=category)
+            record_stock_movement(product, 'in', 3, user=user, location=self.branch)
+            record_sales_batch([{'idempotency_key': f'q-{number}', 'items': [{'product_id': product.pk, 'quantity': 1}]}],
+                               user=user, location=self.branch)
+            expense_category = ExpenseCategory.objects.create(name=f'Expenses {number}')
+            Expense.objects.create(category=expense_category, description='Shop', amount=Decimal('10'),
+                                   date=timezone.localdate(), created_by=user)
+        self.rows += count
+        refresh_classification()
+
+    def query_counts(self):
+        counts = {}
+        for page in PAGES:
+            # The first request also fills the session and user caches
+            self.assertEqual(self.client.get(page).status_code, 200)
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(page)
+            counts[page] = len(queries)
+        return counts
+
+    def test_query_counts_do_not_grow_with_the_data(self):
+        self.grow(3)
+        small = self.query_counts()
+        self.grow(60)
+
+        for page in PAGES:
+            with self.subTest(page=page), self.assertNumQueries(small[page]):
+                self.client.get(page)
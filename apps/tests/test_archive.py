@@ -0,0 +1,55 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from ..archive import archive_before
+from ..models import ArchivedSale, ArchivedStockTransaction, Sale, StockTransaction
+from ..reconciliation import find_drift
+from ..services import record_sales_batch, record_stock_movement
+from .base import InventoryTestCase, make_product
+
+
+class ArchiveTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.product = make_product('D-1', quantity=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            record_stock_movement(self.product, 'out', 4)
+
+    def test_archive_keeps_ledger_and_levels_in_step(self):
+        run = archive_before(timezone.now())
+
+        self.assertEqual(run.movements, 2)
+        self.assertFalse(StockTransaction.objects.exists())
+        self.assertEqual(ArchivedStockTransaction.objects.count(), 2)
+        self.assertEqual(find_drift(), {'levels': [], 'products': []})
+
+    def test_cutoff_cannot_move_back(self):
+        cutoff = timezone.now()
+        archive_before(cutoff)
+        # Running again with the same cutoff is safe
+        self.assertEqual(archive_before(cutoff).movements, 2)
+        with self.assertRaises(ValueError):
+            archive_before(cutoff - timedelta(days=1))
+
+    def test_sale_list_reads_the_archive_for_archived_dates(self):
+        user = User.objects.create_user('viewer', is_staff=True)
+        self.client.force_login(user)
+        result, = record_sales_batch([{'idempotency_key': 'a-1', 'items': [{'product_id': self.product.pk, 'quantity': 1}]}],
+                                     user=user)
+        archive_before(timezone.now())
+        self.assertEqual(ArchivedSale.objects.count(), 1)
+        self.assertFalse(Sale.objects.exists())
+
+        today = timezone.localdate().isoformat()
+        self.assertNotContains(self.client.get('/sales/'), result['invoice_number'])
+        self.assertContains(self.client.get(f'/sales/?start_date={today}&end_date={today}'), result['invoice_number'])
+
+    def test_date_filters_at_the_calendar_edges(self):
+        self.client.force_login(User.objects.create_user('viewer', is_staff=True))
+        for url in ('/sales/', '/stock/transactions/'):
+            for query in ('start_date=2024-01-01&end_date=9999-12-31', 'start_date=0001-01-01&end_date=2024-01-01'):
+                with self.subTest(url=url, query=query):
+                    self.assertEqual(self.client.get(f'{url}?{query}').status_code, 200)
@@ -0,0 +1,53 @@
+from django.contrib.auth.models import User
+
+from ..models import Location
+from ..services import record_stock_movement
+from .base import InventoryTestCase, make_product
+
+
+class AsyncViewTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user('viewer', is_staff=True))
+        self.product = make_product('AS-1', name='Tea', quantity=12)
+        make_product('AS-2', name='Teapot', quantity=3)
+        with self.captureOnCommitCallbacks(execute=True):
+            record_stock_movement(self.product, 'in', 2, location=Location.objects.create(name='Branch', code='BR'))
+
+    def assertSameAsSync(self, path, query=''):
+        sync = self.client.get(f'/api/{path}?{query}')
+        asynchronous = self.client.get(f'/api/async/{path}?{query}')
+        self.assertEqual(asynchronous.status_code, sync.status_code)
+        self.assertEqual(asynchronous.json(), sync.json())
+
+    def test_matches_the_sync_endpoints(self):
+        for path, query in (('products/search/', 'q=tea'), ('products/search/', 'q=tea&page=2'),
+                            ('stock/low-stock-alerts/', 'limit=1'), ('stock/valuation/', ''),
+                            ('stock/valuation/', f'product={self.product.pk}')):
+            with self.subTest(path=path, query=query):
+                self.assertSameAsSync(path, query)
+
+    def test_product_info(self):
+        info = self.client.get(f'/api/async/product/{self.product.pk}/').json()
+        self.assertEqual(info['stock'], 14)
+        self.assertEqual([(row['name'], row['stock']) for row in info['locations']], [('Branch', 2), ('Main Store', 12)])
+        self.assertEqual(self.client.get('/api/async/product/0/').status_code, 404)
+
+    def test_dashboard_stats(self):
+        stats = self.client.get('/api/async/dashboard/').json()
+        self.assertEqual(stats['total_products'], 2)
+        self.assertEqual([item['sku'] for item in stats['low_stock_items']], ['AS-2'])
+        self.assertEqual(len(stats['sales_chart']['data']), 7)
+
+    def test_bad_parameters(self):
+        for query in ('limit=x', 'since=x'):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(f'/api/async/stock/low-stock-alerts/?{query}').status_code, 400)
+        self.assertEqual(self.client.get('/api/async/stock/low-stock-alerts/?limit=-1').status_code, 200)
+        self.assertEqual(self.client.get('/api/async/stock/valuation/?date=2024-13-01').status_code, 400)
+        self.assertEqual(self.client.get('/api/async/stock/valuation/?product=x').status_code, 400)
+
+    def test_login_required(self):
+        self.client.logout()
+        self.assertEqual(self.client.get('/api/async/products/search/?q=tea').status_code, 302)
@@ -0,0 +1,59 @@
+from django.contrib.auth.models import Group, User
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from ..backends import USER_CACHE_KEY, CachedModelBackend, user_cache
+from .base import InventoryTestCase
+
+PAGE = '/api/products/search/?q=tea'
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class CachedUserTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('clerk', password='first secret')
+        self.assertTrue(self.client.login(username='clerk', password='first secret'))
+        # Fills the session and user caches
+        self.assertEqual(self.client.get(PAGE).status_code, 200)
+
+    def cached(self):
+        return user_cache().get(USER_CACHE_KEY.format(self.user.pk))
+
+    def test_requests_skip_the_session_and_user_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(PAGE).status_code, 200)
+        tables = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('auth_user', tables)
+        self.assertNotIn('django_session', tables)
+
+    def test_password_hash_is_not_cached(self):
+        self.assertIsNotNone(self.cached())
+        self.assertNotIn(self.user.password, repr(self.cached()))
+
+        user = CachedModelBackend().get_user(self.user.pk)
+        self.assertEqual(user.username, 'clerk')
+        self.assertIn('password', user.get_deferred_fields())
+        # Saving the cached user leaves the password alone
+        user.first_name = 'Ada'
+        user.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Ada')
+        self.assertTrue(self.user.check_password('first secret'))
+
+    def test_changes_drop_the_cached_user(self):
+        self.user.groups.add(Group.objects.create(name='Tills'))
+        self.assertIsNone(self.cached())
+
+        self.client.get(PAGE)
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(self.cached())
+        self.assertEqual(self.client.get(PAGE).status_code, 302)
+
+    def test_password_change_ends_the_session(self):
+        self.user.set_password('second secret')
+        self.user.save()
+        self.assertEqual(self.client.get(PAGE).status_code, 302)
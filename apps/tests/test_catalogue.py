@@ -0,0 +1,69 @@
+import gzip
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from ..catalogue import catalogue_changes
+from ..models import Location, Product, ProductTombstone
+from ..services import record_stock_movement
+from .base import InventoryTestCase, make_product
+
+
+class CatalogueFeedTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user('till'))
+        self.repriced = make_product('P-1', quantity=5)
+        self.sold = make_product('P-2', quantity=5)
+        deleted = make_product('P-3')
+        self.unchanged = make_product('P-4')
+        make_product('P-5').delete()
+        # Everything above happened an hour ago; the client synced half an hour ago
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        Product.objects.update(updated_at=an_hour_ago)
+        ProductTombstone.objects.update(deleted_at=an_hour_ago)
+        self.since = timezone.now() - timedelta(minutes=30)
+
+        self.repriced.price = Decimal('6.50')
+        self.repriced.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            record_stock_movement(self.sold, 'out', 2)
+        self.deleted_id = deleted.pk
+        deleted.delete()
+
+    def test_changes_since_the_cursor(self):
+        changes = catalogue_changes(self.since)
+
+        main = str(Location.get_default().pk)
+        self.assertEqual([(row['sku'], row['price'], row['stock']) for row in changes['products']],
+                         [('P-1', 6.5, {main: 5}), ('P-2', 5.0, {main: 3})])
+        self.assertEqual(changes['deleted'], [self.deleted_id])
+        self.assertGreater(changes['cursor'], self.since)
+
+    def test_changes_api(self):
+        url = f'/api/catalogue/changes/?since={self.since.isoformat()}'.replace('+', '%2B')
+
+        compressed = self.client.get(url, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        plain = self.client.get(url)
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertEqual(json.loads(gzip.decompress(compressed.content))['deleted'], plain.json()['deleted'])
+        self.assertEqual([row['sku'] for row in plain.json()['products']], ['P-1', 'P-2'])
+
+        self.assertEqual(self.client.get('/api/catalogue/changes/?since=yesterday').status_code, 400)
+
+    def test_snapshot_follows_the_inventory_version(self):
+        first = self.client.get('/api/catalogue/')
+        snapshot = first.json()
+        self.assertEqual([row['sku'] for row in snapshot['products']], ['P-1', 'P-2', 'P-4'])
+        self.assertEqual(self.client.get('/api/catalogue/', headers={'If-None-Match': first['ETag']}).status_code, 304)
+
+        self.unchanged.name = 'Renamed'
+        self.unchanged.save()
+        second = self.client.get('/api/catalogue/', headers={'If-None-Match': first['ETag']})
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json()['products'][-1]['name'], 'Renamed')
@@ -0,0 +1,58 @@
+import numpy as np
+from django.contrib.auth.models import User
+
+from ..classification import classify, refresh_classification
+from ..models import ProductClassification
+from ..services import record_sales_batch
+from .base import InventoryTestCase, make_product
+
+
+class ClassifyTests(InventoryTestCase):
+
+    def test_thresholds(self):
+        revenues = np.array([80.0, 500.0, 0.0, 100.0, 20.0, 250.0, 50.0])
+
+        ranks, shares, cumulative, classes = classify(revenues)
+
+        self.assertEqual(ranks.tolist(), [4, 1, 7, 3, 6, 2, 5])
+        self.assertAlmostEqual(shares.sum(), 1.0)
+        self.assertAlmostEqual(cumulative[3], 0.85)
+        # 100 crosses 80% but started below it, so it stays in A
+        self.assertEqual(classes.tolist(), ['B', 'A', 'C', 'A', 'C', 'A', 'B'])
+
+    def test_no_revenue(self):
+        ranks, shares, cumulative, classes = classify(np.zeros(3))
+        self.assertEqual(classes.tolist(), ['C', 'C', 'C'])
+        self.assertEqual(shares.tolist(), [0.0, 0.0, 0.0])
+
+
+class ClassificationTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user('viewer', is_staff=True))
+        self.top = make_product('K-1', name='Top seller')
+        self.slow = make_product('K-2', name='Slow seller')
+        self.idle = make_product('K-3', name='Idle')
+        record_sales_batch([
+            {'idempotency_key': 'k-1', 'items': [{'product_id': self.top.pk, 'quantity': 9}]},
+            {'idempotency_key': 'k-2', 'items': [{'product_id': self.slow.pk, 'quantity': 1}]},
+        ])
+
+    def test_refresh(self):
+        self.assertEqual(refresh_classification(days=30), {'A': 1, 'B': 1, 'C': 1})
+        self.assertEqual(
+            {row.product_id: (row.abc_class, row.rank, row.quantity_sold) for row in ProductClassification.objects.all()},
+            {self.top.pk: ('A', 1, 9), self.slow.pk: ('B', 2, 1), self.idle.pk: ('C', 3, 0)},
+        )
+
+    def test_product_list_filter_and_sort(self):
+        refresh_classification(days=30)
+
+        page = self.client.get('/products/?abc_class=B').content.decode()
+        self.assertIn('Slow seller', page)
+        self.assertNotIn('Top seller', page)
+
+        page = self.client.get('/products/?sort=abc').content.decode()
+        self.assertLess(page.index('Top seller'), page.index('Slow seller'))
+        self.assertLess(page.index('Slow seller'), page.index('Idle'))
@@ -0,0 +1,78 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+
+from .. import views
+from ..models import Sale, StockTransaction
+from ..services import record_sales_batch, record_stock_movement
+from .base import InventoryTestCase, make_product
+
+
+class ConditionalGetTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('clerk')
+        self.client.force_login(self.user)
+        self.product = make_product('H-1', name='Tea', quantity=20)
+        with self.captureOnCommitCallbacks(execute=True):
+            result, = record_sales_batch(
+                [{'idempotency_key': 'h-1', 'items': [{'product_id': self.product.pk, 'quantity': 1}]}], user=self.user)
+        self.sale = Sale.objects.get(pk=result['sale_id'])
+
+    def revalidate(self, url, response):
+        return self.client.get(url, headers={'If-None-Match': response['ETag'],
+                                             'If-Modified-Since': response['Last-Modified']})
+
+    def test_sale_detail_not_modified(self):
+        url = f'/sales/{self.sale.pk}/'
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('private', first['Cache-Control'])
+
+        with mock.patch.object(views, 'render', wraps=views.render) as render:
+            self.assertEqual(self.revalidate(url, first).status_code, 304)
+            # Without validators the body comes from the page cache
+            cached = self.client.get(url)
+            render.assert_not_called()
+        self.assertEqual(cached.content, first.content)
+        self.assertEqual(cached['ETag'], first['ETag'])
+
+    def test_edits_and_other_users_get_a_new_etag(self):
+        url = f'/sales/{self.sale.pk}/'
+        first = self.client.get(url)
+
+        self.sale.customer_name = 'Ada'
+        self.sale.save()
+        edited = self.revalidate(url, first)
+        self.assertEqual(edited.status_code, 200)
+        self.assertContains(edited, 'Ada')
+
+        self.client.force_login(User.objects.create_user('other'))
+        self.assertEqual(self.revalidate(url, edited).status_code, 200)
+
+    def test_transaction_detail_follows_its_product(self):
+        movement = StockTransaction.objects.filter(product=self.product).latest('id')
+        url = f'/stock/transactions/{movement.pk}/'
+        first = self.client.get(url)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+
+        # Renamed within the same second as the first response
+        self.product.name = 'Green tea'
+        self.product.save()
+        renamed = self.revalidate(url, first)
+        self.assertEqual(renamed.status_code, 200)
+        self.assertContains(renamed, 'Green tea')
+
+    def test_product_info_follows_stock_levels(self):
+        for url in (f'/api/product/{self.product.pk}/', f'/api/async/product/{self.product.pk}/'):
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                self.assertEqual(self.revalidate(url, first).status_code, 304)
+                with self.captureOnCommitCallbacks(execute=True):
+                    record_stock_movement(self.product, 'in', 1)
+                self.assertEqual(self.revalidate(url, first).json()['stock'], first.json()['stock'] + 1)
+
+    def test_missing_records_are_not_found(self):
+        self.assertEqual(self.client.get('/sales/0/').status_code, 404)
+        self.assertEqual(self.client.get('/api/async/product/0/').status_code, 404)
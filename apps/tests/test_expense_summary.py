@@ -0,0 +1,91 @@
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from ..expense_summary import expense_totals, rebuild_expense_summary
+from ..models import Expense, ExpenseCategory, ExpenseMonthlySummary
+from .base import InventoryTestCase
+
+
+class ExpenseSummaryTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.rent = ExpenseCategory.objects.create(name='Rent')
+        self.day = timezone.localdate().replace(day=15)
+
+    def summary(self):
+        return {
+            (row.month, row.category_id, row.payment_method): (row.total, row.count)
+            for row in ExpenseMonthlySummary.objects.all()
+        }
+
+    def add(self, amount, **fields):
+        fields.setdefault('date', self.day)
+        return Expense.objects.create(category=self.rent, description='Shop', amount=Decimal(amount), **fields)
+
+    def test_create_edit_and_delete(self):
+        month = self.day.replace(day=1)
+        expense = self.add('100')
+        self.add('50')
+        self.assertEqual(self.summary(), {(month, self.rent.pk, 'cash'): (Decimal('150'), 2)})
+
+        expense.amount = Decimal('70')
+        expense.save()
+        self.assertEqual(self.summary(), {(month, self.rent.pk, 'cash'): (Decimal('120'), 2)})
+
+        expense.payment_method = 'bank'
+        expense.save()
+        self.assertEqual(self.summary(), {
+            (month, self.rent.pk, 'cash'): (Decimal('50'), 1),
+            (month, self.rent.pk, 'bank'): (Decimal('70'), 1),
+        })
+
+        expense.delete()
+        Expense.objects.filter(amount=Decimal('50')).delete()
+        self.assertEqual(self.summary(), {})
+
+    def test_stale_instance_moves_the_stored_amount(self):
+        expense = self.add('100')
+        stale = Expense.objects.get(pk=expense.pk)
+        expense.amount = Decimal('30')
+        expense.save()
+
+        stale.delete()
+        self.assertEqual(self.summary(), {})
+
+    def test_totals_over_whole_and_partial_months(self):
+        for day, amount, method in (('2024-01-31', '5', 'cash'), ('2024-02-01', '10', 'cash'),
+                                    ('2024-02-29', '20', 'bank'), ('2024-03-15', '40', 'cash')):
+            self.add(amount, date=date.fromisoformat(day), payment_method=method)
+
+        for start, end in (('2024-01-01', '2024-03-31'), ('2024-01-31', '2024-03-14'), ('2024-02-10', '2024-02-20'),
+                           (None, '2024-02-29'), ('2024-02-01', None)):
+            start = start and date.fromisoformat(start)
+            end = end and date.fromisoformat(end)
+            with self.subTest(start=start, end=end):
+                expenses = Expense.objects.all()
+                if start:
+                    expenses = expenses.filter(date__gte=start)
+                if end:
+                    expenses = expenses.filter(date__lte=end)
+                expected = expenses.aggregate(total=Sum('amount'), count=Count('id'))
+                self.assertEqual(expense_totals(start_date=start, end_date=end),
+                                 {'total': expected['total'] or 0, 'count': expected['count']})
+
+        by_method = expense_totals(start_date=date(2024, 1, 15), end_date=date(2024, 2, 29), group_by='payment_method')
+        self.assertEqual(by_method['rows'], [
+            {'payment_method': 'bank', 'total': Decimal('20'), 'count': 1},
+            {'payment_method': 'cash', 'total': Decimal('15'), 'count': 2},
+        ])
+
+    def test_rebuild(self):
+        self.add('100')
+        self.add('50', payment_method='bank')
+        before = self.summary()
+        ExpenseMonthlySummary.objects.all().delete()
+
+        self.assertEqual(rebuild_expense_summary(), 2)
+        self.assertEqual(self.summary(), before)
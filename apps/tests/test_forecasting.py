@@ -0,0 +1,44 @@
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from ..forecasting import forecast_reorder, forecast_rows
+from ..models import StockTransaction
+from ..services import record_stock_movement
+from .base import InventoryTestCase, make_product
+
+
+class ForecastTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.selling = make_product('R-1', quantity=30)
+        make_product('R-2', quantity=5)
+        # Two sold a day for the last ten days
+        today = timezone.localdate()
+        for days_ago in range(10):
+            with self.captureOnCommitCallbacks(execute=True):
+                sale = record_stock_movement(self.selling, 'out', 2, reference=f'Sale:{days_ago}')
+            sold_at = timezone.make_aware(datetime.combine(today - timedelta(days=days_ago), time(10)))
+            StockTransaction.objects.filter(pk=sale.pk).update(created_at=sold_at)
+
+    def test_reorder_suggestions(self):
+        forecast = forecast_reorder(method='ma', history_days=10, window=10, lead_time_days=7, review_days=7)
+
+        rows = forecast_rows(forecast)
+        self.assertEqual([row['sku'] for row in rows], ['R-1'])
+        self.assertEqual(
+            {key: rows[0][key] for key in ('quantity', 'daily_demand', 'safety_stock', 'reorder_point',
+                                           'suggested_quantity', 'days_of_cover')},
+            {'quantity': 10, 'daily_demand': 2.0, 'safety_stock': 0, 'reorder_point': 14,
+             'suggested_quantity': 18, 'days_of_cover': 5.0},
+        )
+
+    def test_report_rejects_out_of_range_parameters(self):
+        self.client.force_login(User.objects.create_user('viewer', is_staff=True))
+        for query in ('service_level=1.5', 'service_level=0', 'lead_time_days=-1', 'review_days=-1',
+                      'alpha=2', 'history_days=100000000', 'window=100000', 'history_days=abc'):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(f'/reports/reorder/?{query}').status_code, 400)
+        self.assertEqual(self.client.get('/reports/reorder/?history_days=30&window=60').status_code, 200)
@@ -0,0 +1,59 @@
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+
+from .. import metrics
+from ..caching import bump_model_version, fragment_name
+from ..models import Product
+from .base import TEST_CACHES, InventoryTestCase, make_product
+
+
+class FragmentCacheTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user('clerk'))
+        self.product = make_product('F-1', name='Green tea')
+
+    def product_list(self):
+        return self.client.get('/products/').content.decode()
+
+    def test_rows_are_cached_until_the_model_version_changes(self):
+        self.assertIn('Green tea', self.product_list())
+
+        # update() sends no signal, so the cached row is still shown
+        Product.objects.filter(pk=self.product.pk).update(name='Black tea')
+        self.assertIn('Green tea', self.product_list())
+
+        bump_model_version('product')
+        self.assertIn('Black tea', self.product_list())
+
+        self.product.name = 'White tea'
+        self.product.save()
+        self.assertIn('White tea', self.product_list())
+
+    def test_new_rows_need_no_bump(self):
+        self.product_list()
+        make_product('F-2', name='Oolong')
+        page = self.product_list()
+        self.assertIn('Green tea', page)
+        self.assertIn('Oolong', page)
+
+    def test_hits_and_misses_are_counted_per_fragment(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        fragments = {'BACKEND': 'apps.caching.FragmentCache', 'LOCATION': directory}
+        self.enterContext(override_settings(CACHES={**TEST_CACHES, 'template_fragments': fragments}))
+        record_cache = self.enterContext(mock.patch.object(metrics, 'record_cache'))
+
+        self.product_list()
+        self.product_list()
+
+        rows = [call for call in record_cache.call_args_list if call.args[0] == 'product_row']
+        self.assertEqual(rows, [mock.call('product_row', False), mock.call('product_row', True)])
+
+    def test_fragment_name(self):
+        self.assertEqual(fragment_name('template.cache.product_row.0123abcd'), 'product_row')
+        self.assertEqual(fragment_name('template.cache.nohash'), 'other')
+        self.assertEqual(fragment_name('model-version:product'), 'other')
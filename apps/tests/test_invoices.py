@@ -0,0 +1,85 @@
+import io
+import zipfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .. import invoices
+from ..archive import archive_before
+from ..invoices import PDF_CACHE_KEY, invoice_cache, invoice_pdf, sales_between, write_invoice_zip
+from ..models import Sale
+from ..services import record_sales_batch
+from .base import InventoryTestCase, make_product
+
+
+class InvoiceTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('till')
+        self.product = make_product('I-1', quantity=50)
+
+    def sell(self, *keys):
+        with self.captureOnCommitCallbacks(execute=True):
+            results = record_sales_batch([
+                {'idempotency_key': key, 'items': [{'product_id': self.product.pk, 'quantity': 1}]} for key in keys
+            ], user=self.user)
+        return list(Sale.objects.filter(pk__in=[result['sale_id'] for result in results]).order_by('id'))
+
+    def cached(self, sale):
+        return invoice_cache().get(PDF_CACHE_KEY.format(sale.invoice_number))
+
+    def test_new_sales_are_prerendered(self):
+        sale, = self.sell('i-1')
+        self.assertTrue(self.cached(sale).startswith(b'%PDF'))
+
+    def test_pdf_is_rendered_once_until_the_sale_changes(self):
+        sale, = self.sell('i-2')
+        invoice_cache().clear()
+        with mock.patch.object(invoices, 'render_invoice', wraps=invoices.render_invoice) as render:
+            first = invoice_pdf(sale)
+            self.assertEqual(invoice_pdf(sale), first)
+            self.assertEqual(render.call_count, 1)
+
+            sale.customer_name = 'Ada'
+            sale.save()
+            self.assertIsNone(self.cached(sale))
+            invoice_pdf(sale)
+            self.assertEqual(render.call_count, 2)
+
+    def test_view(self):
+        sale, = self.sell('i-3')
+        self.client.force_login(self.user)
+
+        response = self.client.get(f'/sales/{sale.pk}/invoice.pdf?download=1')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="{sale.invoice_number}.pdf"')
+        self.assertEqual(response.content, self.cached(sale))
+
+    def zip_names(self, workers):
+        buffer = io.BytesIO()
+        today = timezone.localdate()
+        count = write_invoice_zip(sales_between(today, today), buffer, workers=workers)
+        with zipfile.ZipFile(buffer) as archive:
+            self.assertTrue(all(archive.read(name).startswith(b'%PDF') for name in archive.namelist()))
+            self.assertEqual(len(archive.namelist()), count)
+            return archive.namelist()
+
+    def test_zip_includes_archived_sales(self):
+        archived = self.sell('i-4', 'i-5')
+        archive_before(timezone.now())
+        recent = self.sell('i-6')
+        invoice_cache().clear()
+
+        self.assertEqual(self.zip_names(workers=1), [f'{sale.invoice_number}.pdf' for sale in archived + recent])
+
+    @mock.patch.object(invoices, 'POOL_THRESHOLD', 2)
+    def test_zip_rendered_across_a_process_pool(self):
+        sales = self.sell('i-7', 'i-8', 'i-9')
+        invoice_cache().clear()
+        with mock.patch.object(invoices, 'ProcessPoolExecutor', wraps=invoices.ProcessPoolExecutor) as pool:
+            names = self.zip_names(workers=2)
+        pool.assert_called_once()
+        self.assertEqual(names, [f'{sale.invoice_number}.pdf' for sale in sales])
+        self.assertTrue(all(self.cached(sale) for sale in sales))
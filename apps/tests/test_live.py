@@ -0,0 +1,59 @@
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+
+from .. import live
+from ..models import DashboardEvent
+from ..services import record_stock_movement
+from .base import InventoryTestCase, make_product
+
+
+class DashboardStreamTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user('viewer', is_staff=True))
+        self.product = make_product('E-1', quantity=20)
+        with self.captureOnCommitCallbacks(execute=True):
+            record_stock_movement(self.product, 'out', 1, reference='first')
+        self.seen = DashboardEvent.objects.latest('id').id
+        with self.captureOnCommitCallbacks(execute=True):
+            record_stock_movement(self.product, 'out', 2, reference='second')
+            record_stock_movement(self.product, 'in', 3, reference='third')
+        self.missed = list(DashboardEvent.objects.filter(id__gt=self.seen).order_by('id'))
+
+    def stream(self, **headers):
+        response = self.client.get('/dashboard/stream/', headers=headers)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return b''.join(response.streaming_content).decode()
+
+    def test_movements_are_published_once_committed(self):
+        self.assertEqual([(event.kind, event.payload['reference']) for event in self.missed],
+                         [('stock', 'second'), ('stock', 'third')])
+
+    def test_replay_after_last_event_id(self):
+        body = self.stream(**{'Last-Event-ID': str(self.seen)})
+
+        self.assertEqual(body, ''.join([f'retry: {live.RETRY_MS}\n\n']
+                                       + [live.format_event(event) for event in self.missed]
+                                       + [f'id: {self.missed[-1].id}\n\n']))
+
+    def test_new_clients_start_at_the_latest_event(self):
+        self.assertEqual(self.stream(), f'retry: {live.RETRY_MS}\n\nid: {self.missed[-1].id}\n\n')
+        self.assertEqual(self.stream(**{'Last-Event-ID': 'junk'}), self.stream())
+
+    @mock.patch.object(live, 'POLL_INTERVAL', 0.01)
+    async def test_asgi_stream_replays_then_follows(self):
+        stream = live.event_stream(str(self.seen))
+        try:
+            chunks = [await anext(stream) for _ in range(4)]
+            self.assertEqual(chunks[1:3], [live.format_event(event) for event in self.missed])
+            self.assertEqual(chunks[3], live.format_cursor(self.missed[-1].id))
+
+            await sync_to_async(live.record_event)('expense', {'today_expenses': 5.0})
+            event = await DashboardEvent.objects.alatest('id')
+            self.assertEqual(await anext(stream), live.format_event(event))
+        finally:
+            await stream.aclose()
+            live.get_hub().task.cancel()
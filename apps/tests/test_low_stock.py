@@ -0,0 +1,42 @@
+from django.contrib.auth.models import User
+
+from ..models import LowStockAlert
+from ..services import record_stock_movement
+from .base import InventoryTestCase, make_product
+
+
+class LowStockAlertTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user('viewer', is_staff=True))
+        self.product = make_product('L-1', quantity=12, reorder_level=10)
+
+    def move(self, transaction_type, quantity):
+        with self.captureOnCommitCallbacks(execute=True):
+            record_stock_movement(self.product, transaction_type, quantity)
+
+    def test_only_transitions_are_recorded(self):
+        self.move('out', 3)
+        self.move('out', 1)
+        self.move('in', 5)
+
+        self.assertEqual(list(LowStockAlert.objects.order_by('id').values_list('is_low', 'quantity')),
+                         [(True, 9), (False, 13)])
+
+    def test_feed_pages_by_cursor(self):
+        self.move('out', 3)
+        self.move('in', 5)
+
+        first = self.client.get('/api/stock/low-stock-alerts/?limit=1').json()
+        self.assertEqual([(alert['sku'], alert['is_low']) for alert in first['alerts']], [('L-1', True)])
+        self.assertEqual(first['low_stock_count'], 0)
+
+        second = self.client.get(f"/api/stock/low-stock-alerts/?since={first['next']}").json()
+        self.assertEqual([alert['is_low'] for alert in second['alerts']], [False])
+        third = self.client.get(f"/api/stock/low-stock-alerts/?since={second['next']}").json()
+        self.assertEqual((third['alerts'], third['next']), ([], second['next']))
+
+    def test_limit(self):
+        self.assertEqual(self.client.get('/api/stock/low-stock-alerts/?limit=-1').status_code, 200)
+        self.assertEqual(self.client.get('/api/stock/low-stock-alerts/?limit=x').status_code, 400)
@@ -0,0 +1,88 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+
+from .. import metrics
+from .base import InventoryTestCase
+
+
+def exited_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+class MetricsTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(METRICS_DIR=self.directory))
+        # This worker starts from zero
+        self.enterContext(mock.patch.object(metrics, '_values', {}))
+
+    def write_worker(self, pid, rows):
+        path = os.path.join(self.directory, f'{pid}-1.json')
+        with open(path, 'w') as fh:
+            json.dump(rows, fh)
+        return path
+
+    def test_workers_are_merged(self):
+        metrics.inc('inventory_sales_created_total')
+        metrics.observe('inventory_db_queries_per_request', 3, view='home')
+        other = [
+            ['inventory_sales_created_total', [], 2],
+            ['inventory_db_queries_per_request', [['view', 'home']], [0, 0, 0, 0, 0, 0, 1, 0, 0, 0, 0, 40.0, 1]],
+        ]
+        dead = self.write_worker(exited_pid(), other)
+
+        merged = metrics.collect()
+
+        self.assertEqual(merged[('inventory_sales_created_total', ())], 3)
+        self.assertEqual(merged[('inventory_db_queries_per_request', (('view', 'home'),))],
+                         [0, 0, 0, 1, 0, 0, 1, 0, 0, 0, 0, 43.0, 2])
+        # The exited worker was folded into the retired totals, once
+        self.assertFalse(os.path.exists(dead))
+        self.assertTrue(os.path.exists(os.path.join(self.directory, metrics.RETIRED_FILE)))
+        self.assertEqual(metrics.collect()[('inventory_sales_created_total', ())], 3)
+
+    def test_live_workers_are_kept(self):
+        live = self.write_worker(os.getppid(), [['inventory_sales_created_total', [], 4]])
+
+        self.assertEqual(metrics.collect()[('inventory_sales_created_total', ())], 4)
+        self.assertTrue(os.path.exists(live))
+
+    def test_render(self):
+        metrics.inc('inventory_stock_movements_total', type='in')
+        metrics.inc('inventory_cache_requests_total', cache='a "b"\\c', result='hit')
+        for seconds in (0.02, 3.0):
+            metrics.observe('inventory_http_request_duration_seconds', seconds, view='home')
+
+        lines = metrics.render().splitlines()
+
+        self.assertIn('# TYPE inventory_http_request_duration_seconds histogram', lines)
+        self.assertIn('inventory_http_request_duration_seconds_bucket{view="home",le="0.01"} 0', lines)
+        self.assertIn('inventory_http_request_duration_seconds_bucket{view="home",le="0.025"} 1', lines)
+        self.assertIn('inventory_http_request_duration_seconds_bucket{view="home",le="5"} 2', lines)
+        self.assertIn('inventory_http_request_duration_seconds_bucket{view="home",le="+Inf"} 2', lines)
+        self.assertIn('inventory_http_request_duration_seconds_sum{view="home"} 3.02', lines)
+        self.assertIn('inventory_http_request_duration_seconds_count{view="home"} 2', lines)
+        self.assertIn('inventory_stock_movements_total{type="in"} 1', lines)
+        self.assertIn('inventory_cache_requests_total{cache="a \\"b\\"\\\\c",result="hit"} 1', lines)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_endpoint_requires_token_or_staff(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'inventory_http_requests_total{method="GET",status="401",view="metrics"} 1', response.content)
+
+        self.client.force_login(User.objects.create_user('viewer', is_staff=True))
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
@@ -0,0 +1,49 @@
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import RequestFactory
+
+from ..views import search_products
+from .base import InventoryTestCase, make_product
+
+
+class ProductSearchTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user('clerk'))
+        for number in range(25):
+            make_product(f'T-{number:02}', name=f'Tea {number:02}')
+        make_product('ESP-1', name='Espresso')
+
+    def search(self, query):
+        return self.client.get(f'/api/products/search/?{query}').json()
+
+    def test_pages(self):
+        first = self.search('q=tea')
+        self.assertEqual(len(first['results']), 20)
+        self.assertEqual(first['results'][0]['text'], 'Tea 00 (T-00)')
+        self.assertTrue(first['has_more'])
+
+        second = self.search('q=tea&page=2')
+        self.assertEqual([row['sku'] for row in second['results']], ['T-20', 'T-21', 'T-22', 'T-23', 'T-24'])
+        self.assertFalse(second['has_more'])
+        self.assertEqual(self.search('q=tea&page=x')['page'], 1)
+
+    def test_prefix_of_name_or_sku(self):
+        self.assertEqual([row['sku'] for row in self.search('q=esp')['results']], ['ESP-1'])
+        self.assertEqual([row['sku'] for row in self.search('q=t-1')['results']], [f'T-1{n}' for n in range(10)])
+        # Prefix only: 'spresso' is not a match
+        self.assertEqual(self.search('q=spresso')['results'], [])
+
+    @skipUnless(connection.vendor == 'sqlite', 'NOCASE is a SQLite collation')
+    def test_prefix_search_uses_the_nocase_indexes(self):
+        page, rows = search_products(RequestFactory().get('/', {'q': 'tea'}))
+        plan = rows.explain()
+        self.assertIn('product_name_nocase_idx', plan)
+        self.assertIn('product_sku_nocase_idx', plan)
+
+    def test_login_required(self):
+        self.client.logout()
+        self.assertEqual(self.client.get('/api/products/search/?q=tea').status_code, 302)
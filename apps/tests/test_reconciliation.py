@@ -0,0 +1,70 @@
+from importlib import import_module
+from io import StringIO
+
+from django.apps import apps
+from django.core.management import call_command
+from django.utils import timezone
+
+from ..archive import archive_before
+from ..models import Location, StockLevel, StockTransaction
+from ..reconciliation import find_drift, fix_drift
+from ..services import record_stock_movement
+from .base import InventoryTestCase, make_product
+
+
+class ArchiveReconciliationTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.product = make_product('D-1', quantity=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            record_stock_movement(self.product, 'out', 4)
+
+    def test_drift_is_found_and_fixed(self):
+        archive_before(timezone.now())
+        with self.captureOnCommitCallbacks(execute=True):
+            record_stock_movement(self.product, 'in', 3)
+        StockLevel.objects.filter(product=self.product).update(quantity=20)
+
+        drift = find_drift()
+        location = Location.get_default()
+        self.assertEqual(drift['levels'], [(self.product.pk, location.pk, 20, 9)])
+        self.assertEqual(drift['products'], [(self.product.pk, 9, 20)])
+
+        self.assertEqual(fix_drift(drift), 1)
+        self.assertEqual(find_drift(), {'levels': [], 'products': []})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 9)
+
+    def test_backfilled_product_reconciles(self):
+        # A product from before the ledger: its stock was set directly and
+        # only a later sale was recorded
+        legacy = make_product('D-2', quantity=10)
+        StockTransaction.objects.filter(product=legacy).update(transaction_type='out', quantity=3,
+                                                                reference='Sale')
+        location = Location.get_default()
+        self.assertIn((legacy.pk, location.pk, 10, -3), find_drift()['levels'])
+
+        import_module('apps.migrations.0010_locations').record_opening_stock(apps, location)
+
+        opening = StockTransaction.objects.get(product=legacy, transaction_type='adjust')
+        self.assertEqual((opening.quantity, opening.created_at), (13, legacy.created_at))
+        self.assertEqual(find_drift(), {'levels': [], 'products': []})
+        with self.captureOnCommitCallbacks(execute=True):
+            record_stock_movement(legacy, 'out', 2)
+        self.assertEqual(fix_drift(find_drift()), 0)
+        legacy.refresh_from_db()
+        self.assertEqual(legacy.quantity, 8)
+
+    def test_command_reports_then_fixes(self):
+        StockLevel.objects.filter(product=self.product).update(quantity=8)
+
+        report = StringIO()
+        call_command('reconcile_stock', stdout=report)
+        self.assertIn('1 stock levels differ from the ledger (net +2 units)', report.getvalue())
+        self.assertIn('D-1 @ MAIN: stored 8, ledger 6 (+2)', report.getvalue())
+        self.assertEqual(StockLevel.objects.get(product=self.product).quantity, 8)
+
+        call_command('reconcile_stock', '--fix', stdout=StringIO())
+        self.assertEqual(StockLevel.objects.get(product=self.product).quantity, 6)
+        self.assertEqual(find_drift(), {'levels': [], 'products': []})
@@ -0,0 +1,75 @@
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.utils import timezone
+
+from ..archive import archive_before
+from ..models import ArchivedSale, Sale
+from ..services import record_sales_batch
+from .base import InventoryTestCase, make_product
+
+
+@override_settings(TASKS_EAGER=False)
+class SalesBatchTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('till')
+        self.product = make_product('B-1', quantity=5)
+
+    def record(self, sales):
+        with self.captureOnCommitCallbacks(execute=True):
+            return record_sales_batch(sales, user=self.user)
+
+    def test_replayed_keys_are_recorded_once(self):
+        sales = [
+            {'idempotency_key': 'till-1', 'items': [{'product_id': self.product.pk, 'quantity': 2}]},
+            {'idempotency_key': 'till-2', 'items': [{'product_id': self.product.pk, 'quantity': 1}]},
+        ]
+        first = self.record(sales)
+        replay = self.record(sales)
+
+        self.assertEqual([result['status'] for result in first], ['created', 'created'])
+        self.assertEqual([result['status'] for result in replay], ['duplicate', 'duplicate'])
+        self.assertEqual([result['sale_id'] for result in replay], [result['sale_id'] for result in first])
+        self.assertEqual(Sale.objects.count(), 2)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 2)
+
+    def test_repeated_key_within_a_batch_and_missing_stock(self):
+        results = self.record([
+            {'idempotency_key': 'till-3', 'items': [{'product_id': self.product.pk, 'quantity': 4}]},
+            {'idempotency_key': 'till-3', 'items': [{'product_id': self.product.pk, 'quantity': 4}]},
+            {'idempotency_key': 'till-4', 'items': [{'product_id': self.product.pk, 'quantity': 4}]},
+            {'items': [{'product_id': self.product.pk, 'quantity': 1}]},
+        ])
+
+        self.assertEqual([result['status'] for result in results], ['created', 'duplicate', 'rejected', 'rejected'])
+        self.assertEqual(results[1]['sale_id'], results[0]['sale_id'])
+        self.assertEqual(Sale.objects.count(), 1)
+
+    def test_replay_finds_archived_sales(self):
+        sales = [{'idempotency_key': 'till-5', 'items': [{'product_id': self.product.pk, 'quantity': 1}]}]
+        self.record(sales)
+        archive_before(timezone.now())
+
+        self.assertEqual(self.record(sales)[0]['status'], 'duplicate')
+        self.assertEqual(ArchivedSale.objects.count(), 1)
+        self.assertFalse(Sale.objects.exists())
+
+    def test_api(self):
+        self.client.force_login(self.user)
+        batch = {'location': 'MAIN', 'sales': [
+            {'idempotency_key': 'till-6', 'items': [{'product_id': self.product.pk, 'quantity': 1}]},
+            {'idempotency_key': 'till-7', 'items': [{'product_id': self.product.pk, 'quantity': 9}]},
+        ]}
+
+        response = self.client.post('/api/sales/batch/', batch, content_type='application/json')
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual(response.json()['rejected'], 1)
+        response = self.client.post('/api/sales/batch/', batch, content_type='application/json')
+        self.assertEqual(response.json()['duplicate'], 1)
+
+        for body in ('not json', '{"sales": []}', '{"sales": [{}], "location": "NOPE"}'):
+            with self.subTest(body=body):
+                response = self.client.post('/api/sales/batch/', body, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
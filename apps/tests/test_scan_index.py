@@ -0,0 +1,57 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+
+from .. import views
+from ..scan_index import ScanIndex
+from ..services import record_stock_movement
+from .base import InventoryTestCase, make_product
+
+
+class ScanIndexTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.product = make_product('S-1', name='Tea', barcode='4006381333931', quantity=8)
+        make_product('S-2', name='Coffee')
+        self.index = ScanIndex()
+        self.assertEqual(self.index.load(), 2)
+
+    def test_lookup_by_barcode_or_sku(self):
+        self.assertEqual(self.index.lookup('4006381333931')['sku'], 'S-1')
+        self.assertEqual(self.index.lookup(' S-2 ')['name'], 'Coffee')
+        self.assertIsNone(self.index.lookup('nothing'))
+        with self.assertNumQueries(0):
+            self.index.lookup('S-1')
+
+    def test_saved_products_are_reloaded(self):
+        self.product.price = Decimal('7.50')
+        self.product.barcode = '5012345678900'
+        self.product.save()
+
+        self.assertEqual(self.index.lookup('5012345678900')['price'], 7.5)
+        self.assertIsNone(self.index.lookup('4006381333931'))
+        self.assertEqual(self.index.lookup('S-1')['price'], 7.5)
+
+    def test_stock_changes_are_reloaded(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            record_stock_movement(self.product, 'out', 3)
+        self.assertEqual(self.index.lookup('S-1')['stock'], 5)
+
+    def test_deleted_products_are_dropped(self):
+        self.product.delete()
+        self.assertIsNone(self.index.lookup('4006381333931'))
+        self.assertIsNone(self.index.lookup('S-1'))
+        self.assertEqual(self.index.lookup('S-2')['name'], 'Coffee')
+
+    def test_new_products_are_added(self):
+        make_product('S-3', name='Cocoa', barcode='9780201379624')
+        self.assertEqual(self.index.lookup('9780201379624')['sku'], 'S-3')
+
+    def test_api(self):
+        self.client.force_login(User.objects.create_user('till'))
+        with mock.patch.object(views, 'scan_index', self.index):
+            self.assertEqual(self.client.get('/api/products/scan/?code=4006381333931').json()['stock'], 8)
+            self.assertEqual(self.client.get('/api/products/scan/?code=nothing').status_code, 404)
+            self.assertEqual(self.client.get('/api/products/scan/').status_code, 400)
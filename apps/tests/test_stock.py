@@ -0,0 +1,50 @@
+from django.contrib.auth.models import User
+
+from ..models import Location, Product, StockLevel, StockTransaction
+from ..services import InsufficientStock, record_stock_movement, sync_product_totals
+from .base import InventoryTestCase, make_product
+
+
+class StockServiceTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('clerk')
+        self.main = Location.get_default()
+        self.branch = Location.objects.create(name='Branch', code='BR')
+        self.product = make_product('A-1', quantity=10)
+
+    def levels(self):
+        return dict(StockLevel.objects.filter(product=self.product).values_list('location__code', 'quantity'))
+
+    def test_new_product_opens_stock_at_default_location(self):
+        self.assertEqual(self.levels(), {self.main.code: 10})
+        self.assertTrue(StockTransaction.objects.filter(product=self.product, reference='Opening stock').exists())
+
+    def test_movements_update_levels_and_totals(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            record_stock_movement(self.product, 'in', 5, user=self.user, location=self.branch)
+            record_stock_movement(self.product, 'out', 3, user=self.user)
+            record_stock_movement(self.product, 'adjust', -2, user=self.user, location=self.branch)
+
+        self.assertEqual(self.levels(), {self.main.code: 7, 'BR': 3})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 10)
+        self.assertEqual(StockTransaction.objects.filter(product=self.product).count(), 4)
+
+    def test_out_beyond_location_stock_is_refused(self):
+        with self.assertRaises(InsufficientStock):
+            record_stock_movement(self.product, 'out', 1, location=self.branch)
+        self.assertFalse(StockTransaction.objects.filter(product=self.product, transaction_type='out').exists())
+        self.assertEqual(self.levels(), {self.main.code: 10})
+
+    def test_sync_product_totals_recomputes_from_levels(self):
+        StockLevel.objects.filter(product=self.product).update(quantity=4)
+        Product.objects.filter(pk=self.product.pk).update(quantity=99)
+
+        sync_product_totals([self.product.pk])
+        sync_product_totals([self.product.pk])
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 4)
+        self.assertTrue(self.product.is_low_stock)
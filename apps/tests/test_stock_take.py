@@ -0,0 +1,39 @@
+from django.contrib.auth.models import User
+
+from ..models import Location, StockTransaction
+from ..services import apply_stock_take, create_stock_take, record_stock_movement
+from .base import InventoryTestCase, make_product
+
+
+class StockTakeTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('counter')
+        self.location = Location.get_default()
+        self.counted = make_product('C-1', quantity=10)
+        self.unchanged = make_product('C-2', quantity=4)
+
+    def test_apply_sets_counted_quantities(self):
+        take, unknown = create_stock_take({'C-1': 7, 'C-2': 4, 'NOPE': 1}, user=self.user)
+        self.assertEqual(unknown, ['NOPE'])
+        # A sale between counting and applying is taken into account
+        record_stock_movement(self.counted, 'out', 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            adjustments = apply_stock_take(take, user=self.user)
+
+        self.assertEqual(adjustments, 1)
+        self.assertEqual(take.status, 'applied')
+        self.assertEqual(take.lines.get(product=self.counted).variance, -2)
+        adjustment = StockTransaction.objects.get(product=self.counted, transaction_type='adjust')
+        self.assertEqual(adjustment.quantity, -2)
+        self.counted.refresh_from_db()
+        self.assertEqual(self.counted.quantity, 7)
+
+    def test_apply_twice_is_refused(self):
+        take, unknown = create_stock_take({'C-1': 8}, user=self.user)
+        apply_stock_take(take, user=self.user)
+        with self.assertRaises(ValueError):
+            apply_stock_take(take, user=self.user)
+        self.assertEqual(StockTransaction.objects.filter(transaction_type='adjust').count(), 1)
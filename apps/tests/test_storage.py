@@ -0,0 +1,66 @@
+import hashlib
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.utils import timezone
+
+from ..models import Expense, ExpenseCategory
+from ..storage import ContentAddressedStorage
+from .base import InventoryTestCase
+
+
+def stored_files(root):
+    return sorted(os.path.relpath(os.path.join(directory, name), root)
+                  for directory, subdirectories, names in os.walk(root) for name in names)
+
+
+@override_settings(MAX_UPLOAD_SIZE=64)
+class ContentAddressedStorageTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=self.root))
+        self.storage = ContentAddressedStorage()
+
+    def test_identical_files_are_stored_once(self):
+        digest = hashlib.sha256(b'receipt').hexdigest()
+
+        first = self.storage.save('expenses/receipts/march.PDF', ContentFile(b'receipt'))
+        second = self.storage.save('expenses/receipts/copy.pdf', ContentFile(b'receipt'))
+        other = self.storage.save('expenses/receipts/april.pdf', ContentFile(b'another receipt'))
+
+        self.assertEqual(first, f'expenses/receipts/{digest[:2]}/{digest}.pdf')
+        self.assertEqual(second, first)
+        self.assertNotEqual(other, first)
+        self.assertEqual(stored_files(self.root), sorted([first, other]))
+
+    def test_files_over_the_limit_are_refused(self):
+        with self.assertRaises(ValueError):
+            self.storage.save('expenses/receipts/big.pdf', ContentFile(b'x' * 65))
+        self.storage.save('expenses/receipts/limit.pdf', ContentFile(b'x' * 64))
+        # The temporary file of the refused upload is gone
+        self.assertEqual(len(stored_files(self.root)), 1)
+
+    def test_oversized_upload_is_a_form_error(self):
+        self.client.force_login(User.objects.create_user('clerk'))
+        category = ExpenseCategory.objects.create(name='Rent')
+
+        def post(receipt):
+            return self.client.post('/expenses/create/', {
+                'category': category.pk, 'expense_type': 'operational', 'description': 'Shop',
+                'amount': '10', 'payment_method': 'cash', 'date': timezone.localdate().isoformat(),
+                'receipt': SimpleUploadedFile('receipt.pdf', receipt, 'application/pdf'),
+            })
+
+        response = post(b'x' * 65)
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(response.context['form'], 'receipt', 'The file is larger than the 64\xa0bytes limit.')
+        self.assertEqual(stored_files(self.root), [])
+
+        self.assertEqual(post(b'x' * 64).status_code, 302)
+        self.assertEqual(Expense.objects.get().receipt.read(), b'x' * 64)
@@ -0,0 +1,91 @@
+from django.test import override_settings
+from django.utils import timezone
+
+from ..models import Task
+from ..tasks import RETRY_DELAY, enqueue, run_due_tasks, task
+from .base import InventoryTestCase
+
+
+calls = []
+
+
+@task
+def recording_task(**kwargs):
+    calls.append(kwargs)
+
+
+@task
+def failing_task():
+    raise RuntimeError('boom')
+
+
+@override_settings(TASKS_EAGER=False)
+class TaskQueueTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        calls.clear()
+
+    def test_queued_task_runs_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue(recording_task, sku='T-1')
+        self.assertEqual(calls, [])
+
+        self.assertEqual(run_due_tasks(), (1, 0))
+        self.assertEqual(calls, [{'sku': 'T-1'}])
+        self.assertEqual(Task.objects.get().status, 'done')
+        self.assertEqual(run_due_tasks(), (0, 0))
+
+    def test_failures_back_off_then_fail(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue(failing_task, max_attempts=2)
+        queued = Task.objects.get()
+        self.assertEqual((queued.name, queued.status), ('apps.tests.test_tasks.failing_task', 'pending'))
+
+        started = timezone.now()
+        self.assertEqual(run_due_tasks(), (0, 1))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('pending', 1))
+        self.assertGreaterEqual(queued.run_after, started + RETRY_DELAY)
+        self.assertIn('RuntimeError: boom', queued.last_error)
+        # Not due yet
+        self.assertEqual(run_due_tasks(), (0, 0))
+
+        Task.objects.update(run_after=timezone.now())
+        self.assertEqual(run_due_tasks(), (0, 1))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('failed', 2))
+        self.assertIsNotNone(queued.finished_at)
+
+    def test_only_tasks_run(self):
+        with self.assertRaises(ValueError):
+            enqueue(print)
+        Task.objects.create(name='os.getcwd', max_attempts=1)
+        self.assertEqual(run_due_tasks(), (0, 1))
+        self.assertIn('not a @task', Task.objects.get().last_error)
+
+    def test_rolled_back_work_queues_nothing(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            enqueue(failing_task)
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(Task.objects.exists())
+
+
+class EagerTaskTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        calls.clear()
+
+    def test_tasks_run_after_the_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue(recording_task, sku='T-2')
+            self.assertEqual(calls, [])
+        self.assertEqual(calls, [{'sku': 'T-2'}])
+        self.assertFalse(Task.objects.exists())
+
+    def test_failures_are_logged_not_raised(self):
+        with self.assertLogs('apps.tasks', 'ERROR') as logs, self.captureOnCommitCallbacks(execute=True):
+            enqueue(failing_task)
+        self.assertIn('Task apps.tests.test_tasks.failing_task failed', logs.output[0])
+        self.assertFalse(Task.objects.exists())
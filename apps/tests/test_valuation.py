@@ -0,0 +1,125 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from ..models import Category, Location, Product, StockSnapshot, StockTransaction
+from ..services import record_stock_movement
+from ..valuation import current_valuation, inventory_value_at, stock_levels_at, take_snapshot
+from .base import InventoryTestCase, make_product
+
+
+class PointInTimeValuationTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.localdate()
+        # 10 on hand from 10 days ago, 4 sold 5 days ago, 3 received 2 days ago
+        self.product = make_product('V-1', quantity=10)
+        Product.objects.filter(pk=self.product.pk).update(created_at=self.at(10))
+        StockTransaction.objects.filter(product=self.product).update(created_at=self.at(10))
+        self.move('out', 4, days_ago=5)
+        self.move('in', 3, days_ago=2)
+
+    def at(self, days_ago):
+        return timezone.make_aware(datetime.combine(self.today - timedelta(days=days_ago), time(12)))
+
+    def move(self, transaction_type, quantity, days_ago):
+        with self.captureOnCommitCallbacks(execute=True):
+            movement = record_stock_movement(self.product, transaction_type, quantity)
+        StockTransaction.objects.filter(pk=movement.pk).update(created_at=self.at(days_ago))
+
+    def levels(self):
+        return {days_ago: stock_levels_at(self.today - timedelta(days=days_ago))[self.product.pk][0]
+                for days_ago in (8, 4, 1)}
+
+    def test_levels_are_replayed_from_today(self):
+        self.assertEqual(self.levels(), {8: 10, 4: 6, 1: 9})
+        self.assertNotIn(self.product.pk, stock_levels_at(self.today - timedelta(days=11)))
+
+    def test_levels_are_replayed_from_the_nearest_snapshot(self):
+        self.assertEqual(take_snapshot(self.today - timedelta(days=6)), 1)
+        self.assertEqual(StockSnapshot.objects.get().quantity, 10)
+        # Every level is now rebuilt from the snapshot, not from the product
+        Product.objects.filter(pk=self.product.pk).update(quantity=0)
+
+        self.assertEqual(stock_levels_at(self.today - timedelta(days=8))[self.product.pk][0], 10)
+        self.assertEqual(stock_levels_at(self.today - timedelta(days=4))[self.product.pk][0], 6)
+
+    def test_open_days_are_not_snapshotted(self):
+        for day in (self.today, self.today + timedelta(days=1)):
+            with self.subTest(day=day), self.assertRaises(ValueError):
+                take_snapshot(day)
+        self.assertFalse(StockSnapshot.objects.exists())
+
+    def test_value_at(self):
+        valuation = inventory_value_at(self.today - timedelta(days=4))
+        self.assertEqual(valuation['total_quantity'], 6)
+        self.assertEqual(valuation['total_value'], Decimal('18.00'))
+        self.assertEqual(valuation['by_category'], {'Uncategorized': Decimal('18.00')})
+
+    def test_api(self):
+        self.client.force_login(User.objects.create_user('viewer', is_staff=True))
+        day = (self.today - timedelta(days=4)).isoformat()
+
+        response = self.client.get(f'/api/stock/valuation/?date={day}&product={self.product.pk}')
+        self.assertEqual(response.json()['quantity'], 6)
+        self.assertEqual(self.client.get(f'/api/stock/valuation/?date={day}').json()['total_value'], 18.0)
+        self.assertEqual(self.client.get('/api/stock/valuation/?date=2024-13-01').status_code, 400)
+        self.assertEqual(self.client.get('/api/stock/valuation/?product=x').status_code, 400)
+
+
+class CategoryValuationTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        tea = Category.objects.create(name='Tea')
+        self.green = make_product('V-2', quantity=10, reorder_level=2, category=tea)
+        make_product('V-3', quantity=0, category=tea)
+        make_product('V-4', quantity=20, reorder_level=2)
+        self.branch = Location.objects.create(name='Branch', code='BR')
+        with self.captureOnCommitCallbacks(execute=True):
+            record_stock_movement(self.green, 'out', 4)
+            record_stock_movement(self.green, 'in', 4, location=self.branch)
+
+    def categories(self, report):
+        return {row['category']: (row['product_count'], row['total_quantity'], row['total_value'],
+                                  row['out_of_stock'], row['low_stock'])
+                for row in report['categories']}
+
+    def test_categories_and_locations(self):
+        report = current_valuation()
+
+        self.assertEqual(self.categories(report), {
+            'Tea': (2, 10, Decimal('30.00'), 1, 1),
+            'Uncategorized': (1, 20, Decimal('60.00'), 0, 0),
+        })
+        self.assertEqual(report['totals']['total_value'], Decimal('90.00'))
+        self.assertEqual(report['totals']['retail_value'], Decimal('150.00'))
+        self.assertEqual(
+            {row['location_name']: (row['product_count'], row['total_quantity'], row['total_value'])
+             for row in report['locations']},
+            {'Main Store': (2, 26, Decimal('78.00')), 'Branch': (1, 4, Decimal('12.00'))},
+        )
+
+    def test_one_location(self):
+        report = current_valuation(self.branch)
+        self.assertEqual(self.categories(report), {'Tea': (1, 4, Decimal('12.00'), 0, 0)})
+
+    def test_cached_until_the_inventory_changes(self):
+        current_valuation()
+        with self.assertNumQueries(0):
+            current_valuation()
+
+        self.green.cost_price = Decimal('4.00')
+        self.green.save()
+        self.assertEqual(current_valuation()['totals']['total_value'], Decimal('100.00'))
+
+    def test_csv_export(self):
+        self.client.force_login(User.objects.create_user('viewer', is_staff=True))
+        response = self.client.get('/reports/inventory-valuation/?export=csv')
+
+        rows = response.content.decode().splitlines()
+        self.assertEqual(rows[0], 'Category,Products,Units,Cost Value,Retail Value,Low Stock,Out of Stock')
+        self.assertEqual(rows[-1], 'TOTAL,3,30,90.00,150.00,1,1')
@@ -1,6 +1,6 @@
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     # Authentication
@@ -24,11 +24,18 @@ urlpatterns = [
     path('stock/in/', views.stock_in, name='stock_in'),
     path('stock/out/', views.stock_out, name='stock_out'),
     path('stock/transactions/', views.stock_transactions, name='stock_transactions'),
+    path('stock/transactions/<int:pk>/', views.stock_transaction_detail, name='stock_transaction_detail'),
+    path('stock/takes/', views.stock_take_list, name='stock_take_list'),
+    path('stock/takes/new/', views.stock_take_create, name='stock_take_create'),
+    path('stock/takes/<int:pk>/', views.stock_take_detail, name='stock_take_detail'),
+    path('stock/takes/<int:pk>/apply/', views.stock_take_apply, name='stock_take_apply'),
     
     # Sales
     path('sales/create/', views.create_sale, name='create_sale'),
     path('sales/', views.sale_list, name='sale_list'),
     path('sales/<int:pk>/', views.sale_detail, name='sale_detail'),
+    path('sales/<int:pk>/invoice.pdf', views.sale_invoice_pdf, name='sale_invoice_pdf'),
+    path('api/sales/batch/', views.sale_batch_api, name='sale_batch_api'),
     
     # Reports
     path('reports/', views.reports, name='reports'),
@@ -38,6 +45,21 @@ urlpatterns = [
     
     # AJAX endpoints
     path('api/product/<int:product_id>/', views.get_product_info, name='get_product_info'),
+    path('api/products/search/', views.product_search_api, name='product_search_api'),
+    path('api/products/scan/', views.scan_product_api, name='scan_product_api'),
+    path('api/catalogue/', views.catalogue_snapshot_api, name='catalogue_snapshot_api'),
+    path('api/catalogue/changes/', views.catalogue_changes_api, name='catalogue_changes_api'),
+    path('api/stock/valuation/', views.stock_valuation_api, name='stock_valuation_api'),
+    path('api/stock/low-stock-alerts/', views.low_stock_alerts_api, name='low_stock_alerts_api'),
+    
+    # Async (ASGI) versions of the read-only feeds
+    path('api/async/product/<int:product_id>/', async_views.product_info, name='async_product_info'),
+    path('api/async/products/search/', async_views.product_search, name='async_product_search'),
+    path('api/async/stock/valuation/', async_views.stock_valuation, name='async_stock_valuation'),
+    path('api/async/stock/low-stock-alerts/', async_views.low_stock_alerts, name='async_low_stock_alerts'),
+    path('api/async/dashboard/', async_views.dashboard_stats, name='async_dashboard_stats'),
+    path('dashboard/stream/', async_views.dashboard_stream, name='dashboard_stream'),
+    
     path('expenses/', views.expense_list, name='expense_list'),
     path('expenses/create/', views.expense_create, name='expense_create'),
     path('expenses/edit/<int:pk>/', views.expense_edit, name='expense_edit'),
@@ -47,4 +69,9 @@ urlpatterns = [
 
     # Reports URLs
     path('reports/profit-loss/', views.profit_loss_report, name='profit_loss_report'),
+    path('reports/inventory-valuation/', views.inventory_valuation_report, name='inventory_valuation_report'),
+    path('reports/reorder/', views.reorder_report, name='reorder_report'),
+
+    # Monitoring
+    path('metrics', views.metrics_view, name='metrics'),
 ]
\ No newline at end of file
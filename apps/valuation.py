@@ -0,0 +1,240 @@
+"""
+Point-in-time stock levels and valuation.
+
+Closing quantities are snapshotted per product (``snapshot_stock`` command).
+To answer "what was in stock on day D" we start from the snapshot nearest to
+D and apply only the ledger rows between the snapshot and D, so the work is
+bounded by the snapshot interval rather than by the age of the data.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, Max, Min, Q, Sum, When
+from django.utils import timezone
+
+from . import metrics
+from .archive import ledger_sources
+from .caching import model_version
+from .models import Product, StockLevel, StockSnapshot
+
+VALUATION_CACHE_KEY = 'inventory-valuation:{}'
+
+
+def signed_quantity():
+    """Ledger quantity with stock-out rows negated ('adjust' rows are stored signed)."""
+    return Case(
+        When(transaction_type='out', then=-F('quantity')),
+        default=F('quantity'),
+    )
+
+
+def end_of_day(day):
+    """First instant after ``day`` in the current timezone."""
+    return timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def ledger_deltas(after, until=None, product_ids=None):
+    """Net quantity change per product for ledger rows created in [after, until)."""
+    deltas = defaultdict(int)
+    # Includes the archive only when ``after`` reaches back into it
+    for ledger in ledger_sources(after):
+        ledger = ledger.filter(created_at__gte=after)
+        if until is not None:
+            ledger = ledger.filter(created_at__lt=until)
+        if product_ids is not None:
+            ledger = ledger.filter(product_id__in=product_ids)
+        for row in ledger.values('product_id').annotate(delta=Sum(signed_quantity())).order_by():
+            deltas[row['product_id']] += row['delta']
+    return dict(deltas)
+
+
+def take_snapshot(day=None):
+    """
+    Store the closing quantity of every product for ``day`` (default: yesterday).
+
+    The closing quantity is today's quantity minus the ledger movements after
+    ``day``, so a snapshot taken shortly after midnight only replays a few rows.
+    Raises ValueError for today or a later day, which has not closed yet.
+    """
+    today = timezone.localdate()
+    if day is None:
+        day = today - timedelta(days=1)
+    if day >= today:
+        raise ValueError(f'{day} has not closed yet')
+    after = end_of_day(day)
+    deltas = ledger_deltas(after)
+
+    snapshots = []
+    products = Product.objects.filter(created_at__lt=after).values_list('id', 'quantity', 'cost_price')
+    for product_id, quantity, cost_price in products.iterator(chunk_size=2000):
+        snapshots.append(StockSnapshot(
+            product_id=product_id,
+            date=day,
+            quantity=quantity - deltas.get(product_id, 0),
+            cost_price=cost_price,
+        ))
+
+    with transaction.atomic():
+        StockSnapshot.objects.bulk_create(
+            snapshots,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['product', 'date'],
+            update_fields=['quantity', 'cost_price'],
+        )
+    return len(snapshots)
+
+
+def _nearest_snapshot_date(day):
+    before = StockSnapshot.objects.filter(date__lte=day).aggregate(date=Max('date'))['date']
+    if before == day:
+        return before
+    after = StockSnapshot.objects.filter(date__gt=day).aggregate(date=Min('date'))['date']
+    if before is None:
+        return after
+    if after is None:
+        return before
+    return before if (day - before) <= (after - day) else after
+
+
+def stock_levels_at(day, product_ids=None):
+    """
+    Closing quantity and cost price of each product at the end of ``day``.
+
+    Returns ``{product_id: (quantity, cost_price)}``. Products created after
+    the base snapshot only contribute their ledger movements.
+    """
+    today = timezone.localdate()
+    snapshot_date = _nearest_snapshot_date(day)
+
+    # Replaying back from today is cheaper than from a snapshot further away
+    if snapshot_date is None or abs((today - day).days) < abs((snapshot_date - day).days):
+        base = Product.objects.filter(created_at__lt=end_of_day(day))
+        if product_ids is not None:
+            base = base.filter(pk__in=product_ids)
+        levels = {pk: (quantity, cost) for pk, quantity, cost in base.values_list('id', 'quantity', 'cost_price')}
+        if day >= today:
+            return levels
+        deltas = ledger_deltas(end_of_day(day), product_ids=product_ids)
+        return {pk: (quantity - deltas.get(pk, 0), cost) for pk, (quantity, cost) in levels.items()}
+
+    base = StockSnapshot.objects.filter(date=snapshot_date)
+    if snapshot_date > day:
+        base = base.filter(product__created_at__lt=end_of_day(day))
+    if product_ids is not None:
+        base = base.filter(product_id__in=product_ids)
+    levels = {pk: (quantity, cost) for pk, quantity, cost in base.values_list('product_id', 'quantity', 'cost_price')}
+    if snapshot_date == day:
+        return levels
+
+    if snapshot_date < day:
+        deltas = ledger_deltas(end_of_day(snapshot_date), end_of_day(day), product_ids)
+        missing = set(deltas) - set(levels)
+        if missing:
+            # Created after the snapshot: value new stock at the current cost price
+            for pk, cost in Product.objects.filter(pk__in=missing).values_list('id', 'cost_price'):
+                levels[pk] = (0, cost)
+        return {pk: (quantity + deltas.get(pk, 0), cost) for pk, (quantity, cost) in levels.items()}
+
+    deltas = ledger_deltas(end_of_day(day), end_of_day(snapshot_date), product_ids)
+    return {pk: (quantity - deltas.get(pk, 0), cost) for pk, (quantity, cost) in levels.items()}
+
+
+def inventory_value_at(day):
+    """Total and per-category stock value at the end of ``day``."""
+    levels = stock_levels_at(day)
+    categories = dict(Product.objects.values_list('id', 'category__name'))
+
+    total_quantity = 0
+    total_value = Decimal('0')
+    by_category = defaultdict(Decimal)
+    for pk, (quantity, cost) in levels.items():
+        value = quantity * cost
+        total_quantity += quantity
+        total_value += value
+        by_category[categories.get(pk) or 'Uncategorized'] += value
+
+    return {
+        'date': day,
+        'total_quantity': total_quantity,
+        'total_value': total_value,
+        'by_category': dict(by_category),
+    }
+
+
+def current_valuation(location=None):
+    """
+    Current stock value per category, computed in one aggregate query, plus
+    the value held at each location.
+
+    With ``location`` the categories are aggregated over that location's stock
+    levels only. Cached until the 'inventory' version is bumped by a stock,
+    product or category change.
+    """
+    key = VALUATION_CACHE_KEY.format(model_version('inventory'))
+    if location is not None:
+        key += f':{location.pk}'
+    report = cache.get(key)
+    metrics.record_cache('inventory_valuation', report is not None)
+    if report is not None:
+        return report
+
+    money = DecimalField(max_digits=14, decimal_places=2)
+    if location is None:
+        rows = Product.objects.values(category_name=F('category__name')).annotate(
+            product_count=Count('id'),
+            total_quantity=Sum('quantity'),
+            total_value=Sum(F('quantity') * F('cost_price'), output_field=money),
+            retail_value=Sum(F('quantity') * F('price'), output_field=money),
+            out_of_stock=Count('id', filter=Q(quantity__lte=0)),
+            low_stock=Count('id', filter=Q(is_low_stock=True)),
+        )
+    else:
+        rows = StockLevel.objects.filter(location=location).values(category_name=F('product__category__name')).annotate(
+            product_count=Count('id'),
+            total_quantity=Sum('quantity'),
+            total_value=Sum(F('quantity') * F('product__cost_price'), output_field=money),
+            retail_value=Sum(F('quantity') * F('product__price'), output_field=money),
+            out_of_stock=Count('id', filter=Q(quantity__lte=0)),
+            low_stock=Count('id', filter=Q(quantity__lte=F('product__reorder_level'))),
+        )
+    rows = list(rows.order_by('category_name'))
+
+    totals = {
+        'product_count': 0,
+        'total_quantity': 0,
+        'total_value': Decimal('0'),
+        'retail_value': Decimal('0'),
+        'out_of_stock': 0,
+        'low_stock': 0,
+    }
+    for row in rows:
+        row['category'] = row.pop('category_name') or 'Uncategorized'
+        row['total_value'] = row['total_value'] or Decimal('0')
+        row['retail_value'] = row['retail_value'] or Decimal('0')
+        for field in totals:
+            totals[field] += row[field] or 0
+
+    locations = list(
+        StockLevel.objects.values('location_id', location_name=F('location__name'))
+        .annotate(
+            product_count=Count('id', filter=Q(quantity__gt=0)),
+            total_quantity=Sum('quantity'),
+            total_value=Sum(F('quantity') * F('product__cost_price'), output_field=money),
+            retail_value=Sum(F('quantity') * F('product__price'), output_field=money),
+        )
+        .order_by('location_name')
+    )
+
+    report = {
+        'categories': rows,
+        'totals': totals,
+        'locations': locations,
+        'location': location,
+        'generated_at': timezone.now(),
+    }
+    cache.set(key, report)
+    return report
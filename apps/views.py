@@ -2,13 +2,40 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum, Count, Q, Avg, F
-from django.http import JsonResponse
+from django.db import transaction, IntegrityError
+from django.db.models import Sum, Count, Q, Avg, F, Max, DecimalField
+from django.db.models.functions import TruncDate
+from django.core.paginator import Paginator
+from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest
+from django.urls import reverse
+from django.conf import settings
 from django.utils import timezone
-from datetime import datetime, timedelta
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_datetime
+from django.utils.http import quote_etag
+from datetime import date, datetime, timedelta
+import csv
+import gzip
+import heapq
+import json
+import uuid
 from .models import *
 from .forms import *
 from .decorators import admin_required
+from . import metrics
+from .services import record_stock_movement, InsufficientStock, create_stock_take, apply_stock_take, user_location
+from .services import record_sales_batch, invoice_numbers, MAX_SALES_BATCH
+from .valuation import stock_levels_at, inventory_value_at, current_valuation
+from .valuation import end_of_day
+from .live import latest_event_id, today_expenses
+from .expense_summary import expense_totals, next_month
+from .invoices import invoice_pdf, prerender_invoices
+from .tasks import enqueue
+from .archive import ChainedRows, archive_cutoff, archived_totals, combined_aggregate, ledger_sources, sale_sources
+from .conditional import conditional_record
+from .scan_index import scan_index
+from .catalogue import catalogue_changes, catalogue_snapshot, gzip_json
 
 def login_view(request):
     if request.user.is_authenticated:
@@ -41,14 +68,16 @@ def logout_view(request):
 def dashboard(request):
     # Get statistics
     total_products = Product.objects.count()
-    low_stock_products = Product.objects.filter(quantity__lte=F('reorder_level')).count()
+    low_stock_products = Product.objects.filter(is_low_stock=True).count()
     total_categories = Category.objects.count()
     total_suppliers = Supplier.objects.count()
     
-    # User activity counts
-    user_sales_count = Sale.objects.filter(created_by=request.user).count()
-    user_products_count = Product.objects.filter(created_by=request.user).count()
-    user_transactions_count = StockTransaction.objects.filter(created_by=request.user).count()
+    # User activity counts, kept on the profile by the writes
+    activity = UserProfile.objects.filter(user=request.user).values(
+        'sales_count', 'products_count', 'transactions_count').first() or {}
+    user_sales_count = activity.get('sales_count', 0)
+    user_products_count = activity.get('products_count', 0)
+    user_transactions_count = activity.get('transactions_count', 0)
     
     # Today's sales
     today = timezone.now().date()
@@ -60,7 +89,7 @@ def dashboard(request):
     recent_transactions = StockTransaction.objects.select_related('product', 'created_by').order_by('-created_at')[:10]
     
     # Low stock items
-    low_stock_items = Product.objects.filter(quantity__lte=F('reorder_level')).order_by('quantity')[:5]
+    low_stock_items = Product.objects.filter(is_low_stock=True).order_by('quantity')[:5]
     
     # Sales chart data (last 7 days)
     sales_data = []
@@ -86,6 +115,10 @@ def dashboard(request):
         'user_sales_count': user_sales_count,
         'user_products_count': user_products_count,
         'user_transactions_count': user_transactions_count,
+        'today': timezone.localdate(),
+        'today_expenses': today_expenses(),
+        # Live updates (see apps/live.py) continue from this event
+        'last_event_id': latest_event_id(),
     }
     return render(request, 'apps/dashboard.html', context)
 
@@ -125,16 +158,24 @@ def user_list(request):
 
 @login_required
 def product_list(request):
-    products = Product.objects.select_related('category').all()
-    form = SearchForm(request.GET or None)
+    products = Product.objects.select_related('category', 'classification').all()
+    form = ProductFilterForm(request.GET or None)
     
-    if form.is_valid() and form.cleaned_data['query']:
+    if form.is_valid():
         query = form.cleaned_data['query']
-        products = products.filter(
-            Q(name__icontains=query) |
-            Q(sku__icontains=query) |
-            Q(description__icontains=query)
-        )
+        if query:
+            products = products.filter(
+                Q(name__icontains=query) |
+                Q(sku__icontains=query) |
+                Q(description__icontains=query)
+            )
+        if form.cleaned_data['abc_class']:
+            products = products.filter(classification__abc_class=form.cleaned_data['abc_class'])
+        sort = form.cleaned_data['sort']
+        if sort == 'abc':
+            products = products.order_by(F('classification__rank').asc(nulls_last=True))
+        elif sort:
+            products = products.order_by(sort)
     
     return render(request, 'apps/products/list.html', {
         'products': products,
@@ -156,7 +197,7 @@ def product_create(request):
     
     # Add statistics to context
     total_products = Product.objects.count()
-    low_stock_count = Product.objects.filter(quantity__lte=F('reorder_level')).count()
+    low_stock_count = Product.objects.filter(is_low_stock=True).count()
     out_of_stock = Product.objects.filter(quantity=0).count()
     
     context = {
@@ -184,7 +225,7 @@ def product_edit(request, pk):
     
     # Add statistics to context
     total_products = Product.objects.count()
-    low_stock_count = Product.objects.filter(quantity__lte=F('reorder_level')).count()
+    low_stock_count = Product.objects.filter(is_low_stock=True).count()
     out_of_stock = Product.objects.filter(quantity=0).count()
     
     context = {
@@ -214,20 +255,17 @@ def stock_in(request):
     if request.method == 'POST':
         form = StockTransactionForm(request.POST)
         if form.is_valid():
-            transaction = form.save(commit=False)
-            transaction.created_by = request.user
-            transaction.transaction_type = 'in'
-            transaction.save()
-            
-            # Update product quantity
-            product = transaction.product
-            product.quantity += transaction.quantity
-            product.save()
-            
-            messages.success(request, f'Stock added for {product.name}')
+            movement = record_stock_movement(
+                form.cleaned_data['product'], 'in', form.cleaned_data['quantity'],
+                user=request.user,
+                reference=form.cleaned_data['reference'],
+                notes=form.cleaned_data['notes'],
+                location=form.cleaned_data['location'],
+            )
+            messages.success(request, f'Stock added for {movement.product.name} at {movement.location}')
             return redirect('stock_transactions')
     else:
-        form = StockTransactionForm()
+        form = StockTransactionForm(initial={'product': request.GET.get('product'), 'location': user_location(request.user)})
         form.fields['transaction_type'].initial = 'in'
     
     # Add recent transactions to context
@@ -246,23 +284,22 @@ def stock_out(request):
     if request.method == 'POST':
         form = StockTransactionForm(request.POST)
         if form.is_valid():
-            transaction = form.save(commit=False)
-            transaction.created_by = request.user
-            transaction.transaction_type = 'out'
-            
-            # Check if enough stock is available
-            if transaction.product.quantity >= transaction.quantity:
-                transaction.save()
-                product = transaction.product
-                product.quantity -= transaction.quantity
-                product.save()
-                messages.success(request, f'Stock removed for {product.name}')
-                return redirect('stock_transactions')
+            try:
+                movement = record_stock_movement(
+                    form.cleaned_data['product'], 'out', form.cleaned_data['quantity'],
+                    user=request.user,
+                    reference=form.cleaned_data['reference'],
+                    notes=form.cleaned_data['notes'],
+                    location=form.cleaned_data['location'],
+                )
+            except InsufficientStock as e:
+                messages.error(request, f'Insufficient stock at {e.location}: {e.available} available.')
             else:
-                messages.error(request, 'Insufficient stock available!')
+                messages.success(request, f'Stock removed for {movement.product.name} at {movement.location}')
+                return redirect('stock_transactions')
     
     else:
-        form = StockTransactionForm()
+        form = StockTransactionForm(initial={'product': request.GET.get('product'), 'location': user_location(request.user)})
         form.fields['transaction_type'].initial = 'out'
     
     # Add recent transactions to context
@@ -276,49 +313,202 @@ def stock_out(request):
     
     return render(request, 'apps/stock/transaction_form.html', context)
 
+def selected_location(request):
+    # ?location=<id> scopes a list or report to one branch
+    location_id = request.GET.get('location', '')
+    if location_id.isdigit():
+        return Location.objects.filter(pk=location_id).first()
+    return None
+
+def page_filters(request):
+    # The current query string without the page, for pagination links
+    filters = request.GET.copy()
+    filters.pop('page', None)
+    return filters.urlencode()
+
+def date_range(request):
+    # ?start_date=&end_date= as local datetimes bounding the whole days, or
+    # None when either is missing or malformed
+    try:
+        start = datetime.strptime(request.GET.get('start_date', ''), '%Y-%m-%d').date()
+        end = datetime.strptime(request.GET.get('end_date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return None
+    # Keep the day before the start and the day after the end representable
+    start = max(start, date.min + timedelta(days=1))
+    end = min(end, date.max - timedelta(days=1))
+    return end_of_day(start - timedelta(days=1)), end_of_day(end)
+
 @login_required
 def stock_transactions(request):
-    transactions = StockTransaction.objects.select_related('product', 'created_by').order_by('-created_at')
-    
-    # Filter by date if provided
     start_date = request.GET.get('start_date')
     end_date = request.GET.get('end_date')
     trans_type = request.GET.get('type')
-    
-    if start_date and end_date:
-        transactions = transactions.filter(created_at__date__range=[start_date, end_date])
-    
-    if trans_type:
-        transactions = transactions.filter(transaction_type=trans_type)
-    
-    # Calculate totals
-    total_in = StockTransaction.objects.filter(transaction_type='in').aggregate(Sum('quantity'))['quantity__sum'] or 0
-    total_out = StockTransaction.objects.filter(transaction_type='out').aggregate(Sum('quantity'))['quantity__sum'] or 0
-    total_transactions = transactions.count()
+    location = selected_location(request)
+    
+    # Recent movements only, unless the date range reaches into the archive
+    period = date_range(request)
+    ledgers = ledger_sources(period[0]) if period else [StockTransaction.objects.all()]
+    rows = []
+    for ledger in ledgers:
+        ledger = ledger.select_related('product', 'location', 'created_by').order_by('-created_at', '-id')
+        if period:
+            ledger = ledger.filter(created_at__gte=period[0], created_at__lt=period[1])
+        if trans_type:
+            ledger = ledger.filter(transaction_type=trans_type)
+        if location:
+            ledger = ledger.filter(location=location)
+        rows.append(ledger)
+    transactions = Paginator(ChainedRows(*rows), 100).get_page(request.GET.get('page'))
+    
+    # All-time totals: the hot rows plus the stored totals of the archive
+    hot = StockTransaction.objects.filter(location=location) if location else StockTransaction.objects.all()
+    totals = hot.aggregate(
+        total_in=Sum('quantity', filter=Q(transaction_type='in')),
+        total_out=Sum('quantity', filter=Q(transaction_type='out')),
+    )
+    total_in = (totals['total_in'] or 0) + archived_totals('in', location)['quantity']
+    total_out = (totals['total_out'] or 0) + archived_totals('out', location)['quantity']
     
     context = {
         'transactions': transactions,
         'total_in': total_in,
         'total_out': total_out,
-        'total_transactions': total_transactions,
+        'total_transactions': transactions.paginator.count,
         'start_date': start_date,
         'end_date': end_date,
         'type': trans_type,
+        'locations': Location.objects.all(),
+        'location': location,
+        'archive_cutoff': archive_cutoff(),
+        'filters': page_filters(request),
     }
     
     return render(request, 'apps/stock/transactions.html', context)
 
+def transaction_changed_at(pk):
+    # A movement is fixed once written, but the page shows its product's name
+    for ledger in (StockTransaction, ArchivedStockTransaction):
+        stamps = ledger.objects.filter(pk=pk).values_list('created_at', 'product__updated_at').first()
+        if stamps:
+            return max(stamps)
+    return None
+
+@login_required
+@conditional_record(transaction_changed_at, versions=('stocktransaction',))
+def stock_transaction_detail(request, pk):
+    related = ('product', 'location', 'created_by')
+    movement = (StockTransaction.objects.select_related(*related).filter(pk=pk).first()
+                or get_object_or_404(ArchivedStockTransaction.objects.select_related(*related), pk=pk))
+    return render(request, 'apps/stock/transaction_detail.html', {'transaction': movement})
+
+@login_required
+def stock_take_list(request):
+    stock_takes = StockTake.objects.select_related('location', 'created_by', 'applied_by').annotate(
+        line_count=Count('lines'),
+        variance_lines=Count('lines', filter=~Q(lines__variance=0)),
+    )[:50]
+    return render(request, 'apps/stock/stocktake_list.html', {'stock_takes': stock_takes})
+
+@login_required
+def stock_take_create(request):
+    if request.method == 'POST':
+        form = StockTakeForm(request.POST, request.FILES)
+        if form.is_valid():
+            take, unknown = create_stock_take(
+                form.cleaned_data['counts'],
+                user=request.user,
+                reference=form.cleaned_data['reference'],
+                notes=form.cleaned_data['notes'],
+                location=form.cleaned_data['location'],
+            )
+            if unknown:
+                shown = ', '.join(unknown[:20]) + (' ...' if len(unknown) > 20 else '')
+                messages.warning(request, f'{len(unknown)} unknown SKU(s) were skipped: {shown}')
+            messages.success(request, 'Stock take saved. Review the variances before applying it.')
+            return redirect('stock_take_detail', pk=take.pk)
+    else:
+        form = StockTakeForm(initial={'location': user_location(request.user)})
+    
+    return render(request, 'apps/stock/stocktake_form.html', {'form': form})
+
+@login_required
+def stock_take_detail(request, pk):
+    take = get_object_or_404(StockTake.objects.select_related('location', 'created_by', 'applied_by'), pk=pk)
+    lines = take.lines.select_related('product').order_by('product__name')
+    if request.GET.get('variance') == '1':
+        lines = lines.exclude(variance=0)
+    
+    money = DecimalField(max_digits=14, decimal_places=2)
+    totals = take.lines.aggregate(
+        line_count=Count('id'),
+        variance_lines=Count('id', filter=~Q(variance=0)),
+        counted=Sum('counted_quantity'),
+        expected=Sum('expected_quantity'),
+        net_variance=Sum('variance'),
+        variance_value=Sum(F('variance') * F('cost_price'), output_field=money),
+        shrinkage_value=Sum(F('variance') * F('cost_price'), filter=Q(variance__lt=0), output_field=money),
+    )
+    
+    if request.GET.get('export') == 'csv':
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="stock-take-{take.pk}.csv"'
+        writer = csv.writer(response)
+        writer.writerow(['SKU', 'Product', 'Expected', 'Counted', 'Variance', 'Unit Cost', 'Variance Value'])
+        for line in lines.iterator(chunk_size=2000):
+            writer.writerow([
+                line.product.sku, line.product.name, line.expected_quantity, line.counted_quantity,
+                line.variance, f"{line.cost_price:.2f}", f"{line.variance_value:.2f}",
+            ])
+        return response
+    
+    page = Paginator(lines, 100).get_page(request.GET.get('page'))
+    context = {
+        'take': take,
+        'lines': page,
+        'totals': totals,
+        'variance_only': request.GET.get('variance') == '1',
+    }
+    return render(request, 'apps/stock/stocktake_detail.html', context)
+
+@admin_required
+def stock_take_apply(request, pk):
+    take = get_object_or_404(StockTake, pk=pk)
+    if request.method != 'POST':
+        return redirect('stock_take_detail', pk=pk)
+    
+    try:
+        adjusted = apply_stock_take(take, user=request.user)
+    except ValueError as exc:
+        messages.error(request, str(exc))
+    else:
+        messages.success(request, f'Stock take applied: {adjusted} product(s) adjusted.')
+    return redirect('stock_take_detail', pk=pk)
+
 @login_required
 def create_sale(request):
     if request.method == 'POST':
         items = request.POST.getlist('items[]')
         quantities = request.POST.getlist('quantities[]')
         
+        # A double-clicked or retried submit carries the same key as the original
+        idempotency_key = request.POST.get('idempotency_key') or None
+        if idempotency_key:
+            existing = Sale.objects.filter(idempotency_key=idempotency_key).first()
+            if existing:
+                messages.info(request, f'Sale #{existing.invoice_number} was already recorded.')
+                return redirect('sale_detail', pk=existing.id)
+        
         if not items or not quantities:
             messages.error(request, 'Please add at least one item to the sale.')
             return redirect('create_sale')
         
+        location_id = request.POST.get('location', '')
+        location = Location.objects.filter(pk=location_id, is_active=True).first() if location_id.isdigit() else None
+        location = location or user_location(request.user)
+        
         sale_items = []
+        sold_products = {}
         total_amount = 0
         
         for item_id, quantity in zip(items, quantities):
@@ -328,9 +518,11 @@ def create_sale(request):
                 if quantity <= 0:
                     continue
                 
-                if product.quantity < quantity:
-                    messages.error(request, f'Insufficient stock for {product.name}')
-                    return redirect('create_sale')
+                level = product.stock_levels.filter(location=location).first()
+                if level is None or level.quantity < quantity:
+                    messages.error(request, f'Insufficient stock for {product.name} at {location}')
+                    return redirect(f"{reverse('create_sale')}?location={location.pk}")
+                sold_products[product.id] = product
                 
                 item_total = quantity * product.price
                 total_amount += item_total
@@ -350,73 +542,141 @@ def create_sale(request):
             messages.error(request, 'No valid items in the sale.')
             return redirect('create_sale')
         
-        # Generate invoice number
-        invoice_number = f"INV-{timezone.now().strftime('%Y%m%d')}-{Sale.objects.count() + 1:04d}"
-        
-        sale = Sale.objects.create(
-            invoice_number=invoice_number,
-            customer_name=request.POST.get('customer_name', ''),
-            customer_phone=request.POST.get('customer_phone', ''),
-            items=sale_items,
-            total_amount=total_amount,
-            payment_method=request.POST.get('payment_method', 'cash'),
-            payment_status=True if request.POST.get('payment_status') == 'true' else False,
-            created_by=request.user
-        )
-        
-        # Update stock quantities
-        for item in sale_items:
-            product = Product.objects.get(pk=item['product_id'])
-            product.quantity -= item['quantity']
-            product.save()
-            
-            # Record stock transaction
-            StockTransaction.objects.create(
-                product=product,
-                transaction_type='out',
-                quantity=item['quantity'],
-                reference=f"Sale: {invoice_number}",
-                notes=f"Sold to {sale.customer_name}",
-                created_by=request.user
-            )
+        try:
+            with transaction.atomic():
+                invoice_number = invoice_numbers(1)[0]
+                sale = Sale.objects.create(
+                    invoice_number=invoice_number,
+                    customer_name=request.POST.get('customer_name', ''),
+                    customer_phone=request.POST.get('customer_phone', ''),
+                    items=sale_items,
+                    total_amount=total_amount,
+                    payment_method=request.POST.get('payment_method', 'cash'),
+                    payment_status=True if request.POST.get('payment_status') == 'true' else False,
+                    idempotency_key=idempotency_key,
+                    location=location,
+                    created_by=request.user
+                )
+                
+                # Update stock quantities and record stock transactions
+                for item in sale_items:
+                    record_stock_movement(
+                        sold_products[item['product_id']], 'out', item['quantity'],
+                        user=request.user,
+                        reference=f"Sale: {invoice_number}",
+                        notes=f"Sold to {sale.customer_name}",
+                        location=location,
+                    )
+                enqueue(prerender_invoices, invoice_numbers=[invoice_number])
+        except InsufficientStock as e:
+            messages.error(request, f'Insufficient stock for {e.product.name} at {location}')
+            return redirect(f"{reverse('create_sale')}?location={location.pk}")
+        except IntegrityError:
+            existing = Sale.objects.filter(idempotency_key=idempotency_key).first() if idempotency_key else None
+            if existing is None:
+                raise
+            messages.info(request, f'Sale #{existing.invoice_number} was already recorded.')
+            return redirect('sale_detail', pk=existing.id)
         
         messages.success(request, f'Sale #{invoice_number} created successfully!')
         return redirect('sale_detail', pk=sale.id)
     
-    products = Product.objects.filter(quantity__gt=0).order_by('name')
-    return render(request, 'apps/sales/create.html', {'products': products})
+    location = selected_location(request)
+    if location is None or not location.is_active:
+        location = user_location(request.user)
+    # Products come from the client's local catalogue (catalogue_snapshot_api)
+    return render(request, 'apps/sales/create.html', {
+        'locations': Location.objects.filter(is_active=True),
+        'location': location,
+        'idempotency_key': uuid.uuid4().hex,
+    })
 
 @login_required
-def sale_list(request):
-    sales = Sale.objects.select_related('created_by').order_by('-created_at')
+def sale_batch_api(request):
+    # Offline POS clients replay their queue here; every sale carries its own
+    # idempotency key, so resubmitting a batch only reports the earlier results
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    
+    sales = payload.get('sales') if isinstance(payload, dict) else None
+    if not isinstance(sales, list) or not sales:
+        return JsonResponse({'error': 'sales must be a non-empty list'}, status=400)
+    if len(sales) > MAX_SALES_BATCH:
+        return JsonResponse({'error': f'At most {MAX_SALES_BATCH} sales per batch'}, status=400)
+    
+    # The till's branch, by id or code; defaults to the user's location
+    location = None
+    if payload.get('location') is not None:
+        wanted = str(payload['location'])
+        lookup = Q(code=wanted)
+        if wanted.isdigit():
+            lookup |= Q(pk=wanted)
+        location = Location.objects.filter(lookup, is_active=True).first()
+        if location is None:
+            return JsonResponse({'error': f'Unknown location {wanted}'}, status=400)
     
-    # Filter by date if provided
+    try:
+        results = record_sales_batch(sales, user=request.user, location=location)
+    except IntegrityError:
+        # A concurrent submission of the same keys won; retrying returns its results
+        return JsonResponse({'error': 'Conflicting submission, retry the batch'}, status=409)
+    
+    summary = {'created': 0, 'duplicate': 0, 'rejected': 0}
+    for result in results:
+        summary[result['status']] += 1
+    return JsonResponse({'results': results, **summary})
+
+@login_required
+def sale_list(request):
     start_date = request.GET.get('start_date')
     end_date = request.GET.get('end_date')
     search_query = request.GET.get('search')
-    
-    if start_date and end_date:
-        sales = sales.filter(created_at__date__range=[start_date, end_date])
-    
-    if search_query:
-        sales = sales.filter(
-            Q(invoice_number__icontains=search_query) |
-            Q(customer_name__icontains=search_query) |
-            Q(customer_phone__icontains=search_query)
-        )
+    location = selected_location(request)
+    
+    # Recent sales only, unless the date range reaches into the archive
+    period = date_range(request)
+    sources = sale_sources(period[0]) if period else [Sale.objects.all()]
+    rows = []
+    for sales in sources:
+        sales = sales.select_related('location', 'created_by').order_by('-created_at', '-id')
+        if period:
+            sales = sales.filter(created_at__gte=period[0], created_at__lt=period[1])
+        if location:
+            sales = sales.filter(location=location)
+        if search_query:
+            sales = sales.filter(
+                Q(invoice_number__icontains=search_query) |
+                Q(customer_name__icontains=search_query) |
+                Q(customer_phone__icontains=search_query)
+            )
+        rows.append(sales)
     
     context = {
-        'sales': sales,
+        'sales': Paginator(ChainedRows(*rows), 100).get_page(request.GET.get('page')),
         'start_date': start_date,
         'end_date': end_date,
         'search': search_query,
+        'locations': Location.objects.all(),
+        'location': location,
+        'archive_cutoff': archive_cutoff(),
+        'filters': page_filters(request),
     }
     
     return render(request, 'apps/sales/list.html', context)
 
+def sale_created_at(pk):
+    # Sales never change once recorded; the archive keeps the original time
+    return (Sale.objects.filter(pk=pk).values_list('created_at', flat=True).first()
+            or ArchivedSale.objects.filter(pk=pk).values_list('created_at', flat=True).first())
+
 @login_required
+@conditional_record(sale_created_at, versions=('sale',))
 def sale_detail(request, pk):
-    sale = get_object_or_404(Sale, pk=pk)
+    sale = Sale.objects.filter(pk=pk).first() or get_object_or_404(ArchivedSale, pk=pk)
     
     # Calculate item totals for display
     items_with_total = []
@@ -433,9 +693,18 @@ def sale_detail(request, pk):
     
     return render(request, 'apps/sales/detail.html', context)
 
+@login_required
+def sale_invoice_pdf(request, pk):
+    sale = (Sale.objects.select_related('location', 'created_by').filter(pk=pk).first()
+            or get_object_or_404(ArchivedSale.objects.select_related('location', 'created_by'), pk=pk))
+    response = HttpResponse(invoice_pdf(sale), content_type='application/pdf')
+    disposition = 'attachment' if request.GET.get('download') else 'inline'
+    response['Content-Disposition'] = f'{disposition}; filename="{sale.invoice_number}.pdf"'
+    return response
+
 @login_required
 def reports(request):
-    sales = Sale.objects.all()
+    location = selected_location(request)
     
     # Default date range: last 30 days
     end_date_str = request.GET.get('end_date')
@@ -457,82 +726,92 @@ def reports(request):
     else:
         start_date = end_date - timedelta(days=30)
     
-    # Apply date filter
-    sales = sales.filter(created_at__date__range=[start_date, end_date])
+    previous_start = start_date - timedelta(days=30)
+    previous_end = end_date - timedelta(days=30)
+
+    # Hot sales, plus the archive when the previous period reaches back
+    # before the archive cutoff
+    sources = []
+    for queryset in sale_sources(end_of_day(previous_start - timedelta(days=1))):
+        if location:
+            # The (location, created_at) index keeps a branch report to its own rows
+            queryset = queryset.filter(location=location)
+        sources.append(queryset)
+    sales = [queryset.filter(created_at__date__range=[start_date, end_date]) for queryset in sources]
     
     # Calculate statistics
-    total_sales = sales.aggregate(total=Sum('total_amount'))['total'] or 0
-    total_transactions = sales.count()
-    average_sale = sales.aggregate(avg=Avg('total_amount'))['avg'] or 0
+    totals = combined_aggregate(sales, total=Sum('total_amount'), count=Count('id'))
+    total_sales = totals['total']
+    total_transactions = totals['count']
+    average_sale = total_sales / total_transactions if total_transactions else 0
     
     # Calculate growth rate
-    previous_start = start_date - timedelta(days=30)
-    previous_end = end_date - timedelta(days=30)
-    previous_sales = Sale.objects.filter(
-        created_at__date__range=[previous_start, previous_end]
-    ).aggregate(total=Sum('total_amount'))['total'] or 0
+    previous_sales = combined_aggregate(
+        [queryset.filter(created_at__date__range=[previous_start, previous_end]) for queryset in sources],
+        total=Sum('total_amount'),
+    )['total']
     
     growth_rate = 0
     if previous_sales > 0:
         growth_rate = ((total_sales - previous_sales) / previous_sales) * 100
     
-    # Top selling products
-    top_products = []
-    for sale in sales:
-        for item in sale.items:
-            product_name = item['product_name']
-            quantity = item['quantity']
-            
-            found = False
-            for top_product in top_products:
-                if top_product['name'] == product_name:
-                    top_product['quantity'] += quantity
+    # Top selling products, aggregated by name in one pass over the sale items
+    top_products = {}
+    for queryset in sales:
+        for items in queryset.values_list('items', flat=True):
+            for item in items:
+                product_name = item['product_name']
+                top_product = top_products.get(product_name)
+                if top_product is None:
+                    top_products[product_name] = {
+                        'name': product_name,
+                        'quantity': item['quantity'],
+                        'revenue': item['total'],
+                        'avg_price': item['price']
+                    }
+                else:
+                    top_product['quantity'] += item['quantity']
                     top_product['revenue'] += item['total']
-                    found = True
-                    break
-            
-            if not found:
-                top_products.append({
-                    'name': product_name,
-                    'quantity': quantity,
-                    'revenue': item['total'],
-                    'avg_price': item['price']
-                })
     
     # Sort by quantity and limit to top 10
-    top_products = sorted(top_products, key=lambda x: x['quantity'], reverse=True)[:10]
+    top_products = heapq.nlargest(10, top_products.values(), key=lambda x: x['quantity'])
     
-    # Prepare chart data
+    # Prepare chart data: one grouped query per source instead of one per day
+    daily_totals = {}
+    for queryset in sales:
+        for row in queryset.annotate(day=TruncDate('created_at')).values('day').annotate(
+            total=Sum('total_amount')
+        ).order_by():
+            daily_totals[row['day']] = daily_totals.get(row['day'], 0) + row['total']
     chart_dates = []
     chart_sales = []
     current_date = start_date
     while current_date <= end_date:
-        daily_sales = Sale.objects.filter(created_at__date=current_date).aggregate(
-            total=Sum('total_amount')
-        )['total'] or 0
-        
         chart_dates.append(current_date.strftime('%b %d'))
-        chart_sales.append(float(daily_sales))
+        chart_sales.append(float(daily_totals.get(current_date, 0)))
         current_date += timedelta(days=1)
     
     # Payment method distribution
-    payment_methods = ['cash', 'card', 'transfer', 'credit']
-    payment_counts = {}
-    for method in payment_methods:
-        payment_counts[method] = sales.filter(payment_method=method).count()
+    payment_counts = dict.fromkeys(['cash', 'card', 'transfer', 'credit'], 0)
+    for queryset in sales:
+        for row in queryset.values('payment_method').annotate(count=Count('id')).order_by():
+            if row['payment_method'] in payment_counts:
+                payment_counts[row['payment_method']] += row['count']
     
     context = {
         'total_sales': total_sales,
         'total_transactions': total_transactions,
         'average_sale': average_sale,
         'growth_rate': round(growth_rate, 2),
-        'sales': sales[:50],
+        'sales': ChainedRows(*[queryset.order_by('-created_at', '-id') for queryset in sales])[:50],
         'top_products': top_products,
         'start_date': start_date.strftime('%Y-%m-%d'),
         'end_date': end_date.strftime('%Y-%m-%d'),
         'chart_dates': chart_dates,
         'chart_sales': chart_sales,
         'payment_counts': payment_counts,
+        'locations': Location.objects.all(),
+        'location': location,
     }
     
     return render(request, 'apps/reports/index.html', context)
@@ -542,9 +821,9 @@ def profile(request):
     user_profile, created = UserProfile.objects.get_or_create(user=request.user)
     
     # User activity statistics
-    user_sales_count = Sale.objects.filter(created_by=request.user).count()
-    user_products_count = Product.objects.filter(created_by=request.user).count()
-    user_transactions_count = StockTransaction.objects.filter(created_by=request.user).count()
+    user_sales_count = user_profile.sales_count
+    user_products_count = user_profile.products_count
+    user_transactions_count = user_profile.transactions_count
     
     if request.method == 'POST':
         form = UserProfileForm(request.POST, request.FILES, instance=user_profile)
@@ -564,6 +843,14 @@ def profile(request):
     
     return render(request, 'apps/profile.html', context)
 
+def product_updated_at(product_id):
+    stamps = Product.objects.filter(pk=product_id).aggregate(
+        product=Max('updated_at'), levels=Max('stock_levels__updated_at'))
+    if stamps['product'] is None:
+        return None
+    return max(stamp for stamp in stamps.values() if stamp is not None)
+
+@conditional_record(product_updated_at)
 def get_product_info(request, product_id):
     try:
         product = Product.objects.get(pk=product_id)
@@ -573,10 +860,243 @@ def get_product_info(request, product_id):
             'price': float(product.price),
             'stock': product.quantity,
             'unit': product.unit,
+            'locations': [
+                {'id': pk, 'name': name, 'stock': quantity}
+                for pk, name, quantity in product.stock_levels.order_by('location__name')
+                .values_list('location_id', 'location__name', 'quantity')
+            ],
         })
     except Product.DoesNotExist:
         return JsonResponse({'error': 'Product not found'}, status=404)
 
+@login_required
+def inventory_valuation_report(request):
+    location = selected_location(request)
+    report = current_valuation(location)
+
+    if request.GET.get('export') == 'csv':
+        response = HttpResponse(content_type='text/csv')
+        suffix = f'-{location.code}' if location else ''
+        filename = f"inventory-valuation{suffix}-{timezone.localdate().strftime('%Y%m%d')}.csv"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        writer = csv.writer(response)
+        writer.writerow(['Category', 'Products', 'Units', 'Cost Value', 'Retail Value', 'Low Stock', 'Out of Stock'])
+        rows = report['categories'] + [dict(report['totals'], category='TOTAL')]
+        for row in rows:
+            writer.writerow([
+                row['category'], row['product_count'], row['total_quantity'] or 0,
+                f"{row['total_value']:.2f}", f"{row['retail_value']:.2f}", row['low_stock'], row['out_of_stock'],
+            ])
+        return response
+
+    return render(request, 'apps/reports/inventory_valuation.html', dict(report, all_locations=Location.objects.all()))
+
+@login_required
+def reorder_report(request):
+    # numpy is only needed here, so the rest of the app works without it
+    from .forecasting import forecast_reorder, forecast_rows
+    
+    options = {}
+    for name, cast in (('history_days', int), ('window', int), ('alpha', float), ('lead_time_days', float),
+                       ('review_days', float), ('service_level', float)):
+        try:
+            options[name] = cast(request.GET[name]) if request.GET.get(name) else None
+        except ValueError:
+            return HttpResponseBadRequest(f'{name} must be a number')
+    options['method'] = request.GET.get('method') if request.GET.get('method') in ('ses', 'ma') else None
+    
+    try:
+        forecast = forecast_reorder(**options)
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+    rows = forecast_rows(forecast)
+    
+    if request.GET.get('export') == 'csv':
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="reorder-{timezone.localdate().strftime("%Y%m%d")}.csv"'
+        writer = csv.writer(response)
+        writer.writerow(['SKU', 'Product', 'Stock', 'Reorder Level', 'Daily Demand', 'Safety Stock',
+                         'Reorder Point', 'Suggested Order', 'Days of Cover'])
+        for row in rows:
+            writer.writerow([row['sku'], row['name'], row['quantity'], row['current_reorder_level'],
+                             row['daily_demand'], row['safety_stock'], row['reorder_point'],
+                             row['suggested_quantity'], row['days_of_cover']])
+        return response
+    
+    context = {
+        'rows': rows[:500],
+        'total_rows': len(rows),
+        'params': forecast['params'],
+        'total_products': len(forecast['product_ids']),
+    }
+    return render(request, 'apps/reports/reorder.html', context)
+
+@login_required
+def stock_valuation_api(request):
+    # Stock value (and optionally one product's level) at the end of a given day
+    date_str = request.GET.get('date')
+    try:
+        day = datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else timezone.localdate()
+    except ValueError:
+        return JsonResponse({'error': 'date must be YYYY-MM-DD'}, status=400)
+
+    product_id = request.GET.get('product')
+    if product_id:
+        try:
+            product_id = int(product_id)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid product id'}, status=400)
+        level = stock_levels_at(day, product_ids=[product_id]).get(product_id)
+        if level is None:
+            return JsonResponse({'error': 'Product not found at this date'}, status=404)
+        quantity, cost_price = level
+        return JsonResponse({
+            'date': day.strftime('%Y-%m-%d'),
+            'product_id': product_id,
+            'quantity': quantity,
+            'cost_price': float(cost_price),
+            'value': float(quantity * cost_price),
+        })
+
+    valuation = inventory_value_at(day)
+    return JsonResponse({
+        'date': day.strftime('%Y-%m-%d'),
+        'total_quantity': valuation['total_quantity'],
+        'total_value': float(valuation['total_value']),
+        'by_category': {name: float(value) for name, value in valuation['by_category'].items()},
+    })
+
+@login_required
+def scan_product_api(request):
+    # Barcode scanner lookups, answered from the in-process index
+    code = request.GET.get('code', '').strip()
+    if not code:
+        return JsonResponse({'error': 'code is required'}, status=400)
+    product = scan_index.lookup(code)
+    if product is None:
+        return JsonResponse({'error': 'Product not found', 'code': code}, status=404)
+    return JsonResponse(product)
+
+def gzip_json_response(request, body):
+    # ``body`` is gzipped JSON; sent as is to clients that accept gzip
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = HttpResponse(body, content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(gzip.decompress(body), content_type='application/json')
+    patch_vary_headers(response, ('Accept-Encoding',))
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+@login_required
+def catalogue_snapshot_api(request):
+    # Every product for a POS client's local catalogue; see catalogue.py
+    version, body = catalogue_snapshot()
+    etag = quote_etag(version)
+    response = get_conditional_response(request, etag=etag) or gzip_json_response(request, body)
+    response['ETag'] = etag
+    return response
+
+@login_required
+def catalogue_changes_api(request):
+    try:
+        since = parse_datetime(request.GET.get('since', ''))
+    except ValueError:
+        since = None
+    if since is None:
+        return JsonResponse({'error': 'since must be a cursor from the catalogue feed'}, status=400)
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return gzip_json_response(request, gzip_json(catalogue_changes(since)))
+
+PRODUCT_SEARCH_PAGE_SIZE = 20
+
+def search_products(request):
+    """
+    (page, rows) of a product lookup for autocomplete widgets; rows is an
+    unevaluated queryset, so the async view can iterate it too.
+
+    Prefix matches on SKU and name so their NOCASE indexes can serve them; no
+    COUNT(*) - one extra row tells us whether there is a next page.
+    """
+    query = request.GET.get('q', '').strip()
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    
+    products = Product.objects.all()
+    if query:
+        products = products.filter(Q(sku__istartswith=query) | Q(name__istartswith=query))
+    offset = (page - 1) * PRODUCT_SEARCH_PAGE_SIZE
+    rows = (products.order_by('name', 'id')
+            .values('id', 'name', 'sku', 'quantity', 'unit', 'price')[offset:offset + PRODUCT_SEARCH_PAGE_SIZE + 1])
+    return page, rows
+
+def product_search_response(page, rows):
+    return JsonResponse({
+        'results': [{
+            'id': row['id'],
+            'text': f"{row['name']} ({row['sku']})",
+            'sku': row['sku'],
+            'stock': row['quantity'],
+            'unit': row['unit'],
+            'price': float(row['price']),
+        } for row in rows[:PRODUCT_SEARCH_PAGE_SIZE]],
+        'page': page,
+        'has_more': len(rows) > PRODUCT_SEARCH_PAGE_SIZE,
+    })
+
+@login_required
+def product_search_api(request):
+    page, rows = search_products(request)
+    return product_search_response(page, list(rows))
+
+def alert_feed_params(request):
+    """(since, limit) of a low-stock alert poll, limit clamped to 1-500; ValueError if not integers."""
+    since = int(request.GET.get('since', 0))
+    limit = int(request.GET.get('limit', 100))
+    return since, max(1, min(limit, 500))
+
+@login_required
+def low_stock_alerts_api(request):
+    # Poll with ?since=<last id seen>; only transitions newer than the cursor are returned
+    try:
+        since, limit = alert_feed_params(request)
+    except ValueError:
+        return JsonResponse({'error': 'since and limit must be integers'}, status=400)
+
+    alerts = list(
+        LowStockAlert.objects.filter(id__gt=since)
+        .select_related('product')
+        .order_by('id')[:limit]
+    )
+    return JsonResponse({
+        'alerts': [{
+            'id': alert.id,
+            'product_id': alert.product_id,
+            'product_name': alert.product.name,
+            'sku': alert.product.sku,
+            'is_low': alert.is_low,
+            'quantity': alert.quantity,
+            'reorder_level': alert.reorder_level,
+            'created_at': alert.created_at.isoformat(),
+        } for alert in alerts],
+        'next': alerts[-1].id if alerts else since,
+        'low_stock_count': Product.objects.filter(is_low_stock=True).count(),
+    })
+
+def metrics_view(request):
+    # Scrapers authenticate with METRICS_TOKEN; people use their staff session
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    if not (token and constant_time_compare(authorization, f'Bearer {token}')):
+        if not (request.user.is_authenticated and request.user.is_staff):
+            response = HttpResponse('Authentication required.\n', status=401, content_type='text/plain')
+            response['WWW-Authenticate'] = 'Bearer'
+            return response
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 
 # Add these imports at the top
 from django.db.models import Sum, Count, Q, Avg, F
@@ -589,6 +1109,7 @@ def expense_list(request):
     expenses = Expense.objects.select_related('category', 'created_by').order_by('-date', '-created_at')
     categories = ExpenseCategory.objects.all()
     form = ExpenseFilterForm(request.GET or None)
+    filters = {}
     
     if form.is_valid():
         category = form.cleaned_data.get('category')
@@ -609,12 +1130,13 @@ def expense_list(request):
             expenses = expenses.filter(date__lte=end_date)
         if payment_method:
             expenses = expenses.filter(payment_method=payment_method)
+        filters = {name: form.cleaned_data.get(name) for name in
+                   ('category', 'expense_type', 'payment_method', 'start_date', 'end_date')}
     
-    # Calculate totals
-    total_expenses = expenses.aggregate(total=Sum('amount'))['total'] or 0
-    category_totals = Expense.objects.values('category__name').annotate(
-        total=Sum('amount')
-    ).order_by('-total')
+    # Calculate totals for the same filters from the monthly rollup
+    totals = expense_totals(group_by='category__name', **filters)
+    total_expenses = totals['total']
+    category_totals = totals['rows']
     
     context = {
         'expenses': expenses,
@@ -711,23 +1233,27 @@ def profit_loss_report(request):
     if isinstance(end_date, str):
         end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
     
-    # Calculate sales revenue
-    sales = Sale.objects.filter(created_at__date__range=[start_date, end_date])
-    total_sales = sales.aggregate(total=Sum('total_amount'))['total'] or 0
+    # Calculate sales revenue, from the archive as well when the trend's first
+    # month starts before the archive cutoff
+    sources = sale_sources(end_of_day(start_date.replace(day=1) - timedelta(days=1)))
+    sales = [queryset.filter(created_at__date__range=[start_date, end_date]) for queryset in sources]
+    total_sales = combined_aggregate(sales, total=Sum('total_amount'))['total']
     
     # Calculate cost of goods sold (COGS)
     cogs = 0
-    for sale in sales:
-        for item in sale.items:
-            try:
-                product = Product.objects.get(id=item['product_id'])
-                cogs += item['quantity'] * product.cost_price
-            except Product.DoesNotExist:
-                continue
+    for queryset in sales:
+        for items in queryset.values_list('items', flat=True):
+            for item in items:
+                try:
+                    product = Product.objects.get(id=item['product_id'])
+                    cogs += item['quantity'] * product.cost_price
+                except Product.DoesNotExist:
+                    continue
     
-    # Calculate expenses
+    # Calculate expenses; totals and breakdowns come from the monthly rollup
     expenses = Expense.objects.filter(date__range=[start_date, end_date])
-    total_expenses = expenses.aggregate(total=Sum('amount'))['total'] or 0
+    expense_breakdown = expense_totals(start_date=start_date, end_date=end_date, group_by='category__name')
+    total_expenses = expense_breakdown['total']
     
     # Calculate other income (if any)
     other_income = 0  # Can be expanded later
@@ -737,31 +1263,31 @@ def profit_loss_report(request):
     net_profit = gross_profit - total_expenses + other_income
     
     # Expense breakdown by category
-    expense_breakdown = expenses.values('category__name').annotate(
-        total=Sum('amount')
-    ).order_by('-total')
+    expense_breakdown = expense_breakdown['rows']
     
     # Expense breakdown by type
-    expense_by_type = expenses.values('expense_type').annotate(
-        total=Sum('amount')
-    ).order_by('-total')
+    expense_by_type = expense_totals(start_date=start_date, end_date=end_date, group_by='expense_type')['rows']
     
     # Monthly trend data
+    month_expenses = {
+        row['month']: row['total']
+        for row in expense_totals(start_date=start_date.replace(day=1), end_date=next_month(end_date) - timedelta(days=1),
+                                  group_by='month')['rows']
+    }
     monthly_data = []
     current_date = start_date
     while current_date <= end_date:
-        month_sales = Sale.objects.filter(created_at__date__month=current_date.month,
-                                         created_at__date__year=current_date.year).aggregate(
-            total=Sum('total_amount'))['total'] or 0
-        month_expenses = Expense.objects.filter(date__month=current_date.month,
-                                               date__year=current_date.year).aggregate(
-            total=Sum('amount'))['total'] or 0
-        month_profit = month_sales - month_expenses
+        month_sales = combined_aggregate(
+            [queryset.filter(created_at__date__month=current_date.month,
+                             created_at__date__year=current_date.year) for queryset in sources],
+            total=Sum('total_amount'))['total']
+        expenses_in_month = month_expenses.get(current_date.replace(day=1), 0)
+        month_profit = month_sales - expenses_in_month
         
         monthly_data.append({
             'month': current_date.strftime('%b %Y'),
             'sales': month_sales,
-            'expenses': month_expenses,
+            'expenses': expenses_in_month,
             'profit': month_profit
         })
         
@@ -782,7 +1308,7 @@ def profit_loss_report(request):
         'other_income': other_income,
         'gross_profit': gross_profit,
         'net_profit': net_profit,
-        'sales': sales[:50] if include_details else [],
+        'sales': ChainedRows(*[queryset.order_by('-created_at', '-id') for queryset in sales])[:50] if include_details else [],
         'expenses': expenses[:50] if include_details else [],
         'expense_breakdown': expense_breakdown,
         'expense_by_type': expense_by_type,
@@ -799,7 +1325,7 @@ def expense_summary_context(request):
         
         return {
             'today_expenses': Expense.objects.filter(date=today).aggregate(Sum('amount'))['amount__sum'] or 0,
-            'month_expenses': Expense.objects.filter(date__gte=month_start).aggregate(Sum('amount'))['amount__sum'] or 0,
+            'month_expenses': expense_totals(start_date=month_start)['total'],
             'recent_expenses': Expense.objects.order_by('-date')[:5],
         }
     return {}
\ No newline at end of file
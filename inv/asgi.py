@@ -3,6 +3,32 @@ ASGI config for inv project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serving modes
+-------------
+WSGI (``inv.wsgi``) gives every request its own worker thread for as long as
+the client takes, which is fine for the back-office pages.
+
+ASGI runs the same project on an event loop. The async JSON feeds in
+``apps/async_views.py`` (``/api/async/...``) then wait on the database
+without holding a thread, so many idle POS terminals and dashboards polling
+them don't exhaust the worker pool. Sync views keep working under ASGI; each
+one runs in a thread as before.
+
+Run with any ASGI server, e.g.::
+
+    pip install uvicorn
+    uvicorn inv.asgi:application --host 0.0.0.0 --port 8000 --workers 4
+
+or under gunicorn's process management::
+
+    gunicorn inv.asgi:application -k uvicorn.workers.UvicornWorker -w 4
+
+Keep ``CONN_MAX_AGE`` at 0 under ASGI: every request's ORM calls run in a
+fresh thread, so persistent connections would never be reused. Serve static
+and media files from the front-end web server as with WSGI.
+
+``python manage.py loadtest`` compares the sync and async endpoints.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -14,3 +40,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'inv.settings')
 
 application = get_asgi_application()
+
+# Load the scanner lookup index before the first request (apps/scan_index.py)
+from apps.scan_index import warm_scan_index  # noqa: E402
+
+warm_scan_index()
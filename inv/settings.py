@@ -47,6 +47,7 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 
 
 MIDDLEWARE = [
+    'apps.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -89,6 +90,63 @@ DATABASES = {
 }
 
 
+# Cache
+# File based so fragment cache versions are shared by every worker process.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', os.path.join(BASE_DIR, 'var', 'cache')),
+        'TIMEOUT': 60 * 60 * 24,
+    },
+    # {% cache %} row fragments, used by the template tag under this name.
+    # Hits and misses are counted per fragment in /metrics.
+    'template_fragments': {
+        'BACKEND': 'apps.caching.FragmentCache',
+        'LOCATION': os.environ.get('FRAGMENT_CACHE_LOCATION', os.path.join(BASE_DIR, 'var', 'fragments')),
+        'TIMEOUT': 60 * 60 * 24,
+    },
+    # Sessions and logged-in users. 'file' is shared by every process on the
+    # host; 'locmem' is faster but only safe with a single server process,
+    # since a logout or user change in one process doesn't reach the others.
+    'sessions': {
+        'BACKEND': {
+            'file': 'django.core.cache.backends.filebased.FileBasedCache',
+            'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+        }[os.environ.get('SESSION_CACHE', 'file')],
+        'LOCATION': os.environ.get('SESSION_CACHE_LOCATION', os.path.join(BASE_DIR, 'var', 'sessions')),
+        'TIMEOUT': 60 * 60 * 24 * 14,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # Rendered invoice PDFs (apps/invoices.py). Entries don't expire: a sale's
+    # PDF is dropped when the sale is edited. Kept apart so they can't push
+    # out the page cache.
+    'invoices': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('INVOICE_CACHE_LOCATION', os.path.join(BASE_DIR, 'var', 'invoices')),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 200000},
+    },
+}
+
+
+# Sessions
+# 'cached_db': reads come from the sessions cache, writes go to both (default)
+# 'signed_cookies': no server-side storage; sessions can't be revoked before they expire
+# 'db': every request reads django_session
+SESSION_MODE = os.environ.get('SESSION_MODE', 'cached_db')
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}[SESSION_MODE]
+SESSION_CACHE_ALIAS = 'sessions'
+
+# request.user is loaded from the sessions cache too; entries are dropped
+# when the user, their groups or permissions change (apps/signals.py).
+AUTHENTICATION_BACKENDS = ['apps.backends.CachedModelBackend']
+AUTH_USER_CACHE_TIMEOUT = 300
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -132,12 +190,48 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploads (apps/storage.py): each distinct file is stored once, named by its
+# SHA-256. Files are cut off at MAX_UPLOAD_SIZE while they arrive, and those
+# over FILE_UPLOAD_MAX_MEMORY_SIZE stream to a temporary file, not memory.
+STORAGES = {
+    'default': {'BACKEND': 'apps.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+MAX_UPLOAD_SIZE = int(os.environ.get('MAX_UPLOAD_SIZE', 10 * 1024 * 1024))
+FILE_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024
+FILE_UPLOAD_HANDLERS = [
+    'apps.storage.SizeLimitUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
 # Login/Logout URLs
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'login'
 
 
+# Metrics (/metrics, Prometheus text format)
+# Each worker writes its numbers to METRICS_DIR; point every gunicorn worker at the same directory.
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(BASE_DIR, 'var', 'metrics'))
+METRICS_FLUSH_INTERVAL = 1.0
+# Bearer token for scrapers; staff users can also view the endpoint with their session.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Live dashboard (Server-Sent Events, apps/live.py)
+# Seconds between checks for new events, once per process however many dashboards are open.
+DASHBOARD_POLL_INTERVAL = 1.0
+# Streams are closed after this long and the browser reconnects; needs ASGI (see inv/asgi.py).
+DASHBOARD_STREAM_SECONDS = 300
+
+# Task queue (apps/tasks.py)
+# Follow-up work such as dashboard snapshots and invoice pre-rendering is run by
+# `python manage.py run_tasks`. TASKS_EAGER=1 opts in to running it in the
+# request right after the commit instead, without retries, so a development
+# machine needs no worker; the tests turn it on too.
+TASKS_EAGER = os.environ.get('TASKS_EAGER') == '1'
+
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'inv.settings')
 
 application = get_wsgi_application()
+
+# Load the scanner lookup index before the first request (apps/scan_index.py)
+from apps.scan_index import warm_scan_index  # noqa: E402
+
+warm_scan_index()